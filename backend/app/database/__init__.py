@@ -1,2 +1,6 @@
-# Database module - placeholder for future coin reference database
+"""Persistence layer: scan history, stored images and (future) coin reference data."""
 
+from .image_store import ImageStore
+from .scan_history import ScanHistoryStore
+
+__all__ = ["ImageStore", "ScanHistoryStore"]
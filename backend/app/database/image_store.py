@@ -0,0 +1,140 @@
+"""
+Content-addressed on-disk store for uploaded coin images.
+
+Each upload is written once under its SHA-256 digest in sharded directories
+(``ab/cd/abcd...``) using write-to-temp + atomic rename, so concurrent or
+repeated uploads of the same image deduplicate to a single file.  A
+downscaled JPEG derivative is kept alongside the original.  Reads are served
+from read-only memory maps.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+from ..services.image_processor import ImageProcessor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOT = "data/images"
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+VARIANTS = ("original", "thumbnail")
+
+
+class ImageStore:
+    """Deduplicating image store keyed by SHA-256."""
+
+    THUMBNAIL_MAX_SIZE = 512
+    CHUNK_SIZE = 256 * 1024
+
+    def __init__(self, root: str = DEFAULT_ROOT) -> None:
+        self.root = Path(root)
+
+    @classmethod
+    def from_env(cls) -> "ImageStore":
+        """Build a store rooted at ``IMAGE_STORE_DIR``."""
+        return cls(os.getenv("IMAGE_STORE_DIR", DEFAULT_ROOT))
+
+    # ------------------------------------------------------------------
+    # Addressing
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def digest(image_bytes: bytes) -> str:
+        """Return the SHA-256 hex digest used as the storage key."""
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    @staticmethod
+    def is_valid_digest(digest: str) -> bool:
+        return bool(_DIGEST_RE.match(digest))
+
+    def path_for(self, digest: str, variant: str = "original") -> Path:
+        """Return the on-disk path of *digest* / *variant*.
+
+        Raises ValueError for malformed digests or unknown variants, which
+        also rules out path traversal through user-supplied digests.
+        """
+        if not self.is_valid_digest(digest):
+            raise ValueError(f"Invalid image digest: {digest!r}")
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown image variant: {variant!r}")
+        name = digest if variant == "original" else f"{digest}.thumb.jpg"
+        return self.root / digest[:2] / digest[2:4] / name
+
+    def exists(self, digest: str, variant: str = "original") -> bool:
+        try:
+            return self.path_for(digest, variant).is_file()
+        except ValueError:
+            return False
+
+    # ------------------------------------------------------------------
+    # Write path (runs off the request path, e.g. as a background task)
+    # ------------------------------------------------------------------
+
+    def save(self, image_bytes: bytes, digest: Optional[str] = None) -> str:
+        """Store *image_bytes* and its thumbnail; return the digest.
+
+        Already-stored images are skipped, so repeat uploads cost one
+        ``stat`` call.
+        """
+        digest = digest or self.digest(image_bytes)
+        original = self.path_for(digest)
+        if not original.is_file():
+            self._atomic_write(original, image_bytes)
+            logger.debug("Stored image %s (%d bytes)", digest, len(image_bytes))
+
+        thumbnail = self.path_for(digest, "thumbnail")
+        if not thumbnail.is_file():
+            try:
+                derived = ImageProcessor.resize_image(image_bytes, max_size=self.THUMBNAIL_MAX_SIZE)
+            except Exception:
+                logger.warning("Could not build thumbnail for %s", digest)
+            else:
+                self._atomic_write(thumbnail, derived)
+        return digest
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    # ------------------------------------------------------------------
+    # Read path
+    # ------------------------------------------------------------------
+
+    def open(self, digest: str, variant: str = "original") -> mmap.mmap:
+        """Memory-map a stored image read-only.
+
+        Raises FileNotFoundError if the image is not stored and ValueError
+        for malformed digests.  The caller owns (and must close) the map.
+        """
+        path = self.path_for(digest, variant)
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def iter_chunks(self, mapped: mmap.mmap) -> Iterator[bytes]:
+        """Yield *mapped* in chunks, closing the map when exhausted."""
+        try:
+            for offset in range(0, len(mapped), self.CHUNK_SIZE):
+                yield mapped[offset:offset + self.CHUNK_SIZE]
+        finally:
+            mapped.close()
@@ -0,0 +1,225 @@
+"""
+SQLite (WAL) rate-limit storage shared by every worker on a host.
+
+Registers the ``sqlite://`` scheme with the ``limits`` library so slowapi can
+use it through ``storage_uri``.  Counters live in one WAL-mode database file;
+each check-and-increment runs inside a ``BEGIN IMMEDIATE`` transaction, which
+makes sliding-window hits atomic across processes without an external
+service.  Multi-host deployments can point ``RATE_LIMIT_STORAGE_URI`` at a
+Redis-compatible server (``redis://...``, needs the optional ``redis``
+package) instead.
+
+slowapi consults the storage synchronously on the event loop, so the write
+lock is only waited for ``BUSY_TIMEOUT_SECONDS``; when another worker holds it
+longer the hit is let through (fail open) rather than stalling every request
+in this worker.
+
+URI forms: ``sqlite:///relative/path.db`` and ``sqlite:////absolute/path.db``.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from math import floor
+from typing import Optional
+
+from limits.storage import SlidingWindowCounterSupport, Storage
+from limits.storage.base import TimestampedSlidingWindow
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rate_limits_expires ON rate_limits (expires_at);
+"""
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """Cross-process fixed- and sliding-window counters in SQLite."""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    PURGE_EVERY = 1000
+    # Longest wait for another process's write lock before failing open
+    BUSY_TIMEOUT_SECONDS = 0.05
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options) -> None:
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = self.path_from_uri(uri)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._ops = 0
+        self._conn().executescript(_SCHEMA)
+
+    @staticmethod
+    def path_from_uri(uri: str) -> str:
+        """``sqlite:///a.db`` -> ``a.db``; ``sqlite:////x/a.db`` -> ``/x/a.db``."""
+        path = urllib.parse.urlparse(uri).path
+        if not path or path == "/":
+            raise ValueError(f"sqlite rate-limit URI needs a database path: {uri!r}")
+        return path[1:]
+
+    @property
+    def base_exceptions(self) -> type[Exception]:
+        return sqlite3.Error
+
+    # ------------------------------------------------------------------
+    # Connection handling (one connection per thread)
+    # ------------------------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=self.BUSY_TIMEOUT_SECONDS, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self) -> Optional[sqlite3.Connection]:
+        """Start a write transaction that serialises against other processes.
+
+        Returns None when the lock is still held after the busy timeout.
+        """
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as exc:
+            logger.warning("Rate-limit storage busy (%s); allowing request", exc)
+            return None
+        return conn
+
+    @staticmethod
+    def _read(conn: sqlite3.Connection, key: str, now: float) -> tuple[int, float]:
+        row = conn.execute(
+            "SELECT value, expires_at FROM rate_limits WHERE key = ? AND expires_at > ?",
+            (key, now),
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, 0.0)
+
+    @staticmethod
+    def _add(conn: sqlite3.Connection, key: str, amount: int, expiry: float, now: float) -> int:
+        """Increment *key* inside an open transaction; (re)start expired windows."""
+        value, _ = SQLiteStorage._read(conn, key, now)
+        if value:
+            conn.execute("UPDATE rate_limits SET value = value + ? WHERE key = ?", (amount, key))
+        else:
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, amount, now + expiry),
+            )
+        return value + amount
+
+    def _maybe_purge(self, conn: sqlite3.Connection, now: float) -> None:
+        self._ops += 1
+        if self._ops % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+
+    # ------------------------------------------------------------------
+    # Storage (fixed window)
+    # ------------------------------------------------------------------
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        conn = self._transaction()
+        if conn is None:
+            return amount
+        try:
+            value = self._add(conn, key, amount, expiry, now)
+            self._maybe_purge(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def get(self, key: str) -> int:
+        return self._read(self._conn(), key, time.time())[0]
+
+    def get_expiry(self, key: str) -> float:
+        expires_at = self._read(self._conn(), key, time.time())[1]
+        return expires_at or time.time()
+
+    def check(self) -> bool:
+        try:
+            self._conn().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        conn = self._conn()
+        count = conn.execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+        conn.execute("DELETE FROM rate_limits")
+        return count
+
+    def clear(self, key: str) -> None:
+        self._conn().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+    # ------------------------------------------------------------------
+    # SlidingWindowCounterSupport
+    # ------------------------------------------------------------------
+
+    def acquire_sliding_window_entry(
+        self, key: str, limit: int, expiry: int, amount: int = 1
+    ) -> bool:
+        """Atomically test the weighted window count and record the hit."""
+        if amount > limit:
+            return False
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        conn = self._transaction()
+        if conn is None:
+            return True
+        try:
+            previous_count, previous_ttl, current_count, _ = self._window(
+                conn, previous_key, current_key, expiry, now
+            )
+            weighted = previous_count * previous_ttl / expiry + current_count
+            allowed = floor(weighted) + amount <= limit
+            if allowed:
+                self._add(conn, current_key, amount, 2 * expiry, now)
+            self._maybe_purge(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def get_sliding_window(self, key: str, expiry: int) -> tuple[int, float, int, float]:
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        return self._window(self._conn(), previous_key, current_key, expiry, now)
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self.clear(previous_key)
+        self.clear(current_key)
+
+    def _window(
+        self,
+        conn: sqlite3.Connection,
+        previous_key: str,
+        current_key: str,
+        expiry: int,
+        now: float,
+    ) -> tuple[int, float, int, float]:
+        previous_count = self._read(conn, previous_key, now)[0]
+        current_count = self._read(conn, current_key, now)[0]
+        if previous_count == 0:
+            previous_ttl = 0.0
+        else:
+            previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
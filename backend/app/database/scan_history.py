@@ -0,0 +1,264 @@
+"""
+Write-behind scan history store backed by SQLite.
+
+Request handlers enqueue finished identifications with a non-blocking
+``record`` call; a background task drains the bounded in-memory queue and
+writes the records in batched transactions, so the ``/identify`` path never
+waits on disk I/O.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from ..models.history import ScanRecord
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = "data/scan_history.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    client_id TEXT NOT NULL,
+    image_digest TEXT NOT NULL,
+    model TEXT NOT NULL,
+    coins TEXT NOT NULL,
+    timings TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scans_created ON scans (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_scans_client_created
+    ON scans (client_id, created_at DESC, id DESC);
+"""
+
+
+class ScanHistoryStore:
+    """Buffered, batched persistence of identification results."""
+
+    BATCH_SIZE = 200
+    FLUSH_INTERVAL_SECONDS = 1.0
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, max_buffer: int = 5000) -> None:
+        self.db_path = db_path
+        self.dropped = 0
+        self._queue: asyncio.Queue[ScanRecord] = asyncio.Queue(maxsize=max_buffer)
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "ScanHistoryStore":
+        """Build a store from ``SCAN_HISTORY_DB`` / ``SCAN_HISTORY_BUFFER``."""
+        return cls(
+            db_path=os.getenv("SCAN_HISTORY_DB", DEFAULT_DB_PATH),
+            max_buffer=int(os.getenv("SCAN_HISTORY_BUFFER", "5000")),
+        )
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Create the schema and launch the background flusher."""
+        await asyncio.to_thread(self._init_schema)
+        self._task = asyncio.create_task(self._run(), name="scan-history-flusher")
+
+    async def stop(self) -> None:
+        """Stop the flusher and persist everything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    # ------------------------------------------------------------------
+    # Write path
+    # ------------------------------------------------------------------
+
+    def record(self, record: ScanRecord) -> bool:
+        """Enqueue *record* without blocking.
+
+        Returns False (and counts a drop) when the buffer is full, so a slow
+        disk can never back up into request latency.
+        """
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Scan history buffer full; dropped record (%d total)", self.dropped)
+            return False
+        return True
+
+    async def flush(self) -> int:
+        """Write every buffered record now and return how many were written."""
+        written = 0
+        while not self._queue.empty():
+            batch = self._drain(self.BATCH_SIZE)
+            await asyncio.to_thread(self._write_batch, batch)
+            written += len(batch)
+        return written
+
+    async def _run(self) -> None:
+        """Flush loop: wait for a record, linger briefly to fill a batch, write."""
+        batch: list[ScanRecord] = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = time.monotonic() + self.FLUSH_INTERVAL_SECONDS
+                while len(batch) < self.BATCH_SIZE:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+
+                write = asyncio.ensure_future(asyncio.to_thread(self._write_batch, batch))
+                batch = []
+                try:
+                    await asyncio.shield(write)
+                except asyncio.CancelledError:
+                    # Let the in-flight transaction finish before shutting down.
+                    await asyncio.wait([write])
+                    raise
+                except Exception:
+                    logger.exception("Failed to persist scan history batch")
+        except asyncio.CancelledError:
+            # Hand a half-collected batch back so stop() can flush it.
+            for record in batch:
+                self.record(record)
+            raise
+
+    def _drain(self, limit: int) -> list[ScanRecord]:
+        batch: list[ScanRecord] = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    # ------------------------------------------------------------------
+    # Read path
+    # ------------------------------------------------------------------
+
+    async def recent(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        client_id: Optional[str] = None,
+    ) -> tuple[list[ScanRecord], Optional[str]]:
+        """Return up to *limit* records older than *cursor*, newest first.
+
+        Pagination is keyset-based on ``(created_at, id)`` so deep pages stay
+        as cheap as the first one.  Returns ``(records, next_cursor)``.
+        """
+        return await asyncio.to_thread(self._query, limit, cursor, client_id)
+
+    @staticmethod
+    def encode_cursor(record: ScanRecord) -> str:
+        return f"{record.created_at!r}:{record.id}"
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[float, int]:
+        """Parse a cursor produced by :meth:`encode_cursor`.
+
+        Raises ValueError on malformed input.
+        """
+        created_at, _, row_id = cursor.partition(":")
+        return float(created_at), int(row_id)
+
+    # ------------------------------------------------------------------
+    # SQLite (runs in worker threads)
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_schema(self) -> None:
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _write_batch(self, batch: list[ScanRecord]) -> None:
+        if not batch:
+            return
+        rows = [
+            (
+                r.created_at,
+                r.client_id,
+                r.image_digest,
+                r.model,
+                json.dumps(r.coins),
+                json.dumps(r.timings),
+            )
+            for r in batch
+        ]
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO scans (created_at, client_id, image_digest, model, coins, timings) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        finally:
+            conn.close()
+        logger.debug("Persisted %d scan history records", len(rows))
+
+    def _query(
+        self,
+        limit: int,
+        cursor: Optional[str],
+        client_id: Optional[str],
+    ) -> tuple[list[ScanRecord], Optional[str]]:
+        clauses: list[str] = []
+        params: list = []
+        if client_id is not None:
+            clauses.append("client_id = ?")
+            params.append(client_id)
+        if cursor is not None:
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend(self.decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (
+            "SELECT id, created_at, client_id, image_digest, model, coins, timings "
+            f"FROM scans {where} ORDER BY created_at DESC, id DESC LIMIT ?"
+        )
+        params.append(limit + 1)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        records = [
+            ScanRecord(
+                id=row[0],
+                created_at=row[1],
+                client_id=row[2],
+                image_digest=row[3],
+                model=row[4],
+                coins=json.loads(row[5]),
+                timings=json.loads(row[6]),
+            )
+            for row in rows[:limit]
+        ]
+        next_cursor = self.encode_cursor(records[-1]) if len(rows) > limit else None
+        return records, next_cursor
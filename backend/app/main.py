@@ -5,20 +5,38 @@ A FastAPI backend that uses Vision Language Models to identify coins from
 photos and return detailed information about each coin.
 """
 
+import asyncio
 import logging
 import os
 import time
 from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Optional
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
-from .routers import coins_router
+from .database.image_store import ImageStore
+from .database.scan_history import ScanHistoryStore
+from .middleware import RequestProfilingMiddleware, UploadLimitMiddleware
+from .routers import admin_router, coins_router, history_router, images_router
+from .services import metrics
+from .services.admission import AdmissionController
+from .services.coin_detector import CoinDetector
+from .services.decode_sandbox import DecodeSandbox
+from .services.feature_index import FeatureIndex
+from .services.model_router import ModelRouter
+from .services.profiling import Profiler
+from .services.providers import registry as provider_registry
+from .services.vlm_service import VLMService
 from .routers.coins import limiter
 
+if TYPE_CHECKING:
+    from .services.http_pool import HttpPool
+
 # ---------------------------------------------------------------------------
 # Environment & Logging
 # ---------------------------------------------------------------------------
@@ -37,13 +55,117 @@ logger = logging.getLogger(__name__)
 # Lifespan
 # ---------------------------------------------------------------------------
 
+def _prepare_providers(provider: Optional[str], http_pool: Optional["HttpPool"]) -> None:
+    """Import *provider*'s SDK, then route LiteLLM's shared session through *http_pool*."""
+    if provider is not None:
+        provider_registry.warm_up(provider)
+    if http_pool is not None:
+        http_pool.attach_litellm()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     logger.info("CoinScope API starting...")
-    logger.info("VLM Model: %s", os.getenv("VLM_MODEL", "gemini/gemini-flash-latest"))
+    vlm_model = os.getenv("VLM_MODEL", "gemini/gemini-flash-latest")
+    logger.info("VLM Model: %s", vlm_model)
+
+    scan_history = None
+    if os.getenv("SCAN_HISTORY_ENABLED", "false").lower() == "true":
+        scan_history = ScanHistoryStore.from_env()
+        await scan_history.start()
+        logger.info("Scan history: %s", scan_history.db_path)
+    app.state.scan_history = scan_history
+
+    image_store = None
+    if os.getenv("IMAGE_STORE_ENABLED", "false").lower() == "true":
+        image_store = ImageStore.from_env()
+        logger.info("Image store: %s", image_store.root)
+    app.state.image_store = image_store
+
+    feature_index = None
+    if os.getenv("FEATURE_INDEX_ENABLED", "false").lower() == "true":
+        feature_index = FeatureIndex.from_env()
+        feature_index.load()
+        logger.info("Feature index: %d entries", len(feature_index))
+    app.state.feature_index = feature_index
+
+    admission = None
+    if os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true":
+        admission = AdmissionController.from_env()
+        logger.info(
+            "Admission control: %d in flight, queues %s",
+            admission.max_in_flight, admission.max_queue,
+        )
+    app.state.admission = admission
+
+    decode_sandbox = None
+    if os.getenv("IMAGE_DECODE_SUBPROCESS", "false").lower() == "true":
+        decode_sandbox = DecodeSandbox.from_env()
+        logger.info(
+            "Subprocess decoding: %d workers, %d MB each",
+            decode_sandbox.workers, decode_sandbox.budget_bytes // (1024 * 1024),
+        )
+    app.state.decode_sandbox = decode_sandbox
+
+    coin_detector = None
+    if os.getenv("COIN_DETECTOR_ENABLED", "false").lower() == "true":
+        coin_detector = CoinDetector.from_env()
+        logger.info("Local coin detector enabled (skip empty: %s)", coin_detector.skip_empty)
+    app.state.coin_detector = coin_detector
+
+    http_pool = None
+    if os.getenv("HTTP_POOL_ENABLED", "true").lower() == "true":
+        # Imported here: httpx is not needed until the app starts serving
+        from .services.http_pool import HttpPool
+
+        http_pool = HttpPool.from_env()
+        logger.info(
+            "Provider HTTP pool: %s connections, HTTP/2 %s",
+            http_pool.max_connections, "on" if http_pool.http2 else "off",
+        )
+    app.state.http_pool = http_pool
+
+    # Import the default model's provider SDK in the background so the
+    # server accepts requests immediately and the first scan is not delayed;
+    # the same thread hands LiteLLM the pool, a process-wide setting made
+    # once here (HttpPool.aclose clears it)
+    warm_up = os.getenv("PROVIDER_WARMUP", "true").lower() == "true"
+    warmup = None
+    if warm_up or http_pool is not None:
+        warmup = asyncio.create_task(asyncio.to_thread(
+            _prepare_providers, VLMService.provider_name(vlm_model) if warm_up else None, http_pool
+        ))
+
+    model_router = ModelRouter.from_env()
+    if model_router is not None:
+        logger.info(
+            "Model routing (%s) across %s", model_router.config.policy, ", ".join(model_router.stats)
+        )
+    app.state.model_router = model_router
+
+    app.state.admin_token = os.getenv("ADMIN_TOKEN") or None
+    profiler = Profiler.from_env()
+    if profiler is not None:
+        logger.info("Admin profiling API enabled")
+    app.state.profiler = profiler
+
     yield
+
     logger.info("CoinScope API shutting down...")
+    if warmup is not None:
+        # The import runs in a thread that cannot be cancelled; let it finish
+        # before the loop (and, under test clients, the interpreter state it
+        # imports into) goes away
+        await warmup
+    if scan_history is not None:
+        await scan_history.stop()
+    if feature_index is not None:
+        feature_index.save()
+    if decode_sandbox is not None:
+        decode_sandbox.shutdown()
+    if http_pool is not None:
+        await http_pool.aclose()
 
 
 # ---------------------------------------------------------------------------
@@ -61,6 +183,11 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# Oversized bodies are refused (413) from Content-Length or as they stream
+# in.  Multipart file parts spill from memory to a temp file past
+# UPLOAD_SPOOL_KB, a process-wide threshold set when upload_limit is imported.
+app.add_middleware(UploadLimitMiddleware)
+
 # ---------------------------------------------------------------------------
 # CORS -- configurable via CORS_ORIGINS env var
 # ---------------------------------------------------------------------------
@@ -73,9 +200,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
 )
 
 
+# Admin-triggered per-request profiles (X-Profile + X-Admin-Token)
+app.add_middleware(RequestProfilingMiddleware)
+
+
 # ---------------------------------------------------------------------------
 # Request logging middleware
 # ---------------------------------------------------------------------------
@@ -85,7 +217,16 @@ async def request_logging_middleware(request: Request, call_next):
     """Log method, path, status code, and duration for every request."""
     start = time.perf_counter()
     response = await call_next(request)
-    duration_ms = (time.perf_counter() - start) * 1000
+    duration = time.perf_counter() - start
+    duration_ms = duration * 1000
+    # Label by route template, not raw path, to keep series bounded
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.observe(
+        duration,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=str(response.status_code),
+    )
     logger.info(
         "%s %s -> %d (%.1fms)",
         request.method,
@@ -101,6 +242,15 @@ async def request_logging_middleware(request: Request, call_next):
 # ---------------------------------------------------------------------------
 
 app.include_router(coins_router)
+app.include_router(history_router)
+app.include_router(images_router)
+app.include_router(admin_router)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (per-process registry)."""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @app.get("/")
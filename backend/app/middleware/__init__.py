@@ -0,0 +1,6 @@
+"""ASGI middleware for CoinScope backend."""
+
+from .profiling import RequestProfilingMiddleware
+from .upload_limit import UploadLimitMiddleware
+
+__all__ = ["RequestProfilingMiddleware", "UploadLimitMiddleware"]
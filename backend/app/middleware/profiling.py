@@ -0,0 +1,61 @@
+"""
+Per-request sampling profiles triggered by a header.
+
+A request carrying ``X-Profile: 1`` and a valid ``X-Admin-Token`` is sampled
+for its whole lifetime; the stored report's id is returned in
+``X-Profile-Id``.  Written as plain ASGI so that requests without the header
+cost a header lookup and nothing else.
+"""
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..services.profiling import (
+    ADMIN_TOKEN_HEADER,
+    PROFILE_HEADER,
+    PROFILE_ID_HEADER,
+    Profiler,
+)
+
+
+class RequestProfilingMiddleware:
+    """Wraps admin-requested requests in a SamplingProfiler."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profiler: Profiler | None = None
+        if scope["type"] == "http":
+            profiler = getattr(scope["app"].state, "profiler", None)
+        if profiler is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if headers.get(PROFILE_HEADER) not in ("1", "true") or not profiler.authorized(
+            headers.get(ADMIN_TOKEN_HEADER)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = profiler.sampler()
+        label = f"{scope['method']} {scope['path']}"
+        # Sampling stops when the response starts so the report id can go out
+        # with its headers; streamed bodies and background tasks are excluded.
+        report_id = None
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal report_id
+            if message["type"] == "http.response.start":
+                report = profiler.finish(sampler, "request", label)
+                report_id = report.id
+                MutableHeaders(scope=message)[PROFILE_ID_HEADER] = report_id
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            if report_id is None:
+                profiler.finish(sampler, "request", label)
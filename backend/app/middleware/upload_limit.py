@@ -0,0 +1,83 @@
+"""
+Request body size limits enforced while the body streams in.
+
+A declared ``Content-Length`` above the limit is refused with ``413`` before
+any of the body is read.  Chunked or under-declared bodies are counted as
+they arrive, and reading stops with ``413`` as soon as the limit is passed,
+so an oversized upload never reaches the multipart parser's spool in full.
+That spool's threshold (``UPLOAD_SPOOL_KB``) is set here too, on import:
+Starlette keeps it on the ``MultiPartParser`` class, so it is process-wide
+rather than per middleware or per app.
+"""
+
+import json
+import os
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.formparsers import MultiPartParser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "20")) * 1024 * 1024
+
+# File parts larger than this spill from memory to a temp file while parsing.
+# FastAPI parses forms through request.form(), which takes no spool size;
+# Starlette only reads it from this class attribute, so it is set once, for
+# every app in the process.
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_KB", "1024")) * 1024
+MultiPartParser.max_file_size = UPLOAD_SPOOL_BYTES
+
+# Allowance for multipart boundaries, part headers and small form fields
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+TOO_LARGE_DETAIL = f"Image too large. Maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)}MB."
+
+
+class UploadLimitMiddleware:
+    """Rejects request bodies larger than ``max_body_bytes`` with 413."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_body_bytes: int = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    ) -> None:
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        declared = Headers(scope=scope).get("content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_body_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+
+        async def counting_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Propagates out of request.form(); FastAPI re-raises it.
+                    raise HTTPException(status_code=413, detail=TOO_LARGE_DETAIL)
+            return message
+
+        await self.app(scope, counting_receive, send)
+
+    @staticmethod
+    async def _reject(send: Send) -> None:
+        body = json.dumps({"detail": TOO_LARGE_DETAIL}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
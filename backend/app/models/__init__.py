@@ -1,4 +1,4 @@
 from .coin import Coin, CoinIdentificationResponse
+from .history import ScanHistoryPage, ScanRecord
 
-__all__ = ["Coin", "CoinIdentificationResponse"]
-
+__all__ = ["Coin", "CoinIdentificationResponse", "ScanHistoryPage", "ScanRecord"]
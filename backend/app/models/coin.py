@@ -25,9 +25,32 @@ class Coin(BaseModel):
     )
 
 
+class ImageQuality(BaseModel):
+    """Local sharpness and exposure scores of an uploaded image."""
+
+    usable: bool = Field(..., description="False when any quality issue was found")
+    issues: list[str] = Field(
+        default_factory=list,
+        description="Detected problems: blurry, underexposed, overexposed, low_contrast",
+    )
+    sharpness: float = Field(..., description="Variance of the Laplacian (higher is sharper)")
+    brightness: float = Field(..., description="Mean grey level, 0-255")
+    contrast: float = Field(..., description="Standard deviation of grey levels")
+    clipped_dark: float = Field(..., description="Fraction of near-black pixels")
+    clipped_bright: float = Field(..., description="Fraction of near-white pixels")
+
+
 class CoinIdentificationResponse(BaseModel):
     """Response from coin identification endpoint."""
 
     coins: list[Coin] = Field(default_factory=list, description="List of identified coins")
     total_coins_detected: int = Field(..., description="Total number of coins detected")
     model_used: str = Field(..., description="VLM model used for identification")
+    quality: Optional[ImageQuality] = Field(
+        None,
+        description="Image quality scores (unless QUALITY_GATE is off)",
+    )
+    timings: Optional[dict] = Field(
+        None,
+        description="Per-stage timing breakdown (only when DEBUG_TIMINGS is enabled)",
+    )
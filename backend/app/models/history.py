@@ -0,0 +1,34 @@
+"""Pydantic models for persisted scan history."""
+
+import time
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class ScanRecord(BaseModel):
+    """A single identification recorded for analytics."""
+
+    id: Optional[int] = Field(None, description="Row id assigned once persisted")
+    created_at: float = Field(
+        default_factory=time.time,
+        description="Unix timestamp of the identification",
+    )
+    client_id: str = Field(..., description="Client identifier (header or remote address)")
+    image_digest: str = Field(..., description="SHA-256 hex digest of the uploaded image")
+    model: str = Field(..., description="VLM model used for identification")
+    coins: list[dict] = Field(default_factory=list, description="Identified coins as dicts")
+    timings: dict[str, float] = Field(
+        default_factory=dict,
+        description="Stage durations in milliseconds",
+    )
+
+
+class ScanHistoryPage(BaseModel):
+    """One page of scan history, newest first."""
+
+    items: list[ScanRecord] = Field(default_factory=list)
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Opaque cursor for the next (older) page, or null at the end",
+    )
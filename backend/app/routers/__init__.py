@@ -1,4 +1,6 @@
+from .admin import router as admin_router
 from .coins import router as coins_router
+from .history import router as history_router
+from .images import router as images_router
 
-__all__ = ["coins_router"]
-
+__all__ = ["admin_router", "coins_router", "history_router", "images_router"]
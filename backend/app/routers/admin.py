@@ -0,0 +1,116 @@
+"""
+Admin API endpoints for on-demand profiling.
+
+Every route requires the ``X-Admin-Token`` header to match ``ADMIN_TOKEN``;
+without that variable the admin API is disabled and answers 404.  The token
+check itself, ``verify_admin_token``, does not depend on the profiler and
+also gates the history and stored-image APIs.  Reports
+are downloadable text files: folded stacks for CPU profiles and ranked
+allocation diffs for tracemalloc runs.
+"""
+
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from ..services.profiling import ADMIN_TOKEN_HEADER, ProfileReport, Profiler, allocations
+
+router = APIRouter(prefix="/api/v1/admin", tags=["admin"])
+
+
+# ---------------------------------------------------------------------------
+# Dependency injection
+# ---------------------------------------------------------------------------
+
+async def get_admin_token(request: Request) -> Optional[str]:
+    """Provide the configured ADMIN_TOKEN, or None when the admin API is disabled."""
+    return getattr(request.app.state, "admin_token", None)
+
+
+async def get_profiler(request: Request) -> Optional[Profiler]:
+    """Provide the app-scoped Profiler, or None when ADMIN_TOKEN is unset."""
+    return getattr(request.app.state, "profiler", None)
+
+
+async def verify_admin_token(
+    expected: Optional[str] = Depends(get_admin_token),
+    token: Optional[str] = Header(None, alias=ADMIN_TOKEN_HEADER),
+) -> None:
+    """Reject callers without the admin token; 404 while ADMIN_TOKEN is unset."""
+    if expected is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token is None or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+async def require_admin(
+    _: None = Depends(verify_admin_token),
+    profiler: Optional[Profiler] = Depends(get_profiler),
+) -> Profiler:
+    """Reject callers without the admin token and provide the Profiler."""
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return profiler
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _download(report: ProfileReport) -> PlainTextResponse:
+    return PlainTextResponse(
+        report.content,
+        headers={
+            "Content-Disposition": f'attachment; filename="{report.filename}"',
+            "X-Profile-Id": report.id,
+        },
+    )
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+@router.get("/profiles")
+async def list_profiles(profiler: Profiler = Depends(require_admin)):
+    """List stored profile reports, newest first."""
+    return {
+        "profiles": [report.summary() for report in profiler.reports()],
+        "allocations_active": allocations.active,
+    }
+
+
+@router.get("/profiles/{report_id}")
+async def download_profile(report_id: str, profiler: Profiler = Depends(require_admin)):
+    """Download a stored report."""
+    report = profiler.get(report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return _download(report)
+
+
+@router.post("/profile")
+async def capture_profile(
+    seconds: float = Query(10.0, gt=0, le=120, description="Capture duration"),
+    profiler: Profiler = Depends(require_admin),
+):
+    """Sample every thread of this worker for *seconds* and return the report."""
+    return _download(await profiler.capture(seconds))
+
+
+@router.post("/allocations/start")
+async def start_allocation_trace(
+    max_calls: int = Query(50, ge=1, le=1000, description="Traced calls before auto-stop"),
+    profiler: Profiler = Depends(require_admin),
+):
+    """Start diffing tracemalloc snapshots around ImageProcessor/ResponseParser calls."""
+    allocations.start(max_calls=max_calls)
+    return {"allocations_active": True, "max_calls": max_calls}
+
+
+@router.post("/allocations/stop")
+async def stop_allocation_trace(profiler: Profiler = Depends(require_admin)):
+    """Stop allocation tracing and return the report."""
+    return _download(profiler.add(allocations.stop()))
@@ -1,33 +1,142 @@
 """
 Coin identification API endpoints.
 
-Provides the /identify endpoint for image-based coin detection, a /providers
+Provides the /identify endpoint for image-based coin detection, the /stream
+WebSocket for continuous identification from a live camera, a /providers
 endpoint for introspecting available VLM backends, and a /health check.
 """
 
+import asyncio
 import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Optional, TypeVar
 
-from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    WebSocket,
+    WebSocketException,
+    status,
+)
+from fastapi.responses import JSONResponse
+from starlette.requests import HTTPConnection
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
+from ..database import rate_limit_storage  # noqa: F401  (registers sqlite://)
+from ..database.image_store import ImageStore
+from ..database.scan_history import ScanHistoryStore
+from ..middleware.upload_limit import MAX_UPLOAD_BYTES, TOO_LARGE_DETAIL
 from ..models.coin import CoinIdentificationResponse
+from ..models.history import ScanRecord
+from ..services import deadline as request_deadline
+from ..services import metrics, request_timing
+from ..services.admission import PRIORITY_HEADER, AdmissionRejected, lane_for
+from ..services.deadline import DEADLINE_HEADER, DEADLINES, Deadline, DeadlineExceededError
+from ..services.frame_gate import READY, FrameGate
+from ..services.image_processor import ImagePipeline, ImageTooLargeError
+from ..services.image_quality import QualityGate
+from ..services.quota import (
+    ClientIdentity,
+    InvalidAPIKeyError,
+    QuotaExceededError,
+    QuotaManager,
+)
+from ..services.request_timing import RequestTimings
 from ..services.vlm_service import VLMService, SUPPORTED_PROVIDERS
+from .history import get_scan_history
+from .images import get_image_store
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 router = APIRouter(prefix="/api/v1/coins", tags=["coins"])
 
-limiter = Limiter(key_func=get_remote_address)
+# Counters live in RATE_LIMIT_STORAGE_URI so every worker shares them:
+# memory:// (single process), sqlite:///data/ratelimit.db (one host), or
+# redis://host:6379 (any Redis-compatible server, multi-host).
+# Per-API-key tiers; anonymous clients are keyed by remote address.
+quotas = QuotaManager.from_env()
+
+limiter = Limiter(
+    key_func=quotas.client_key,
+    storage_uri=os.getenv("RATE_LIMIT_STORAGE_URI", "memory://"),
+    strategy=os.getenv("RATE_LIMIT_STRATEGY", "sliding-window-counter"),
+)
+
+# Blur/exposure scoring before any provider call (QUALITY_GATE=off|flag|reject)
+quality_gate = QualityGate.from_env()
+
+
+# Bytes read to validate magic numbers before the rest of an upload
+UPLOAD_PROBE_BYTES = 64 * 1024
+
+# Include the per-stage timing block in /identify responses
+DEBUG_TIMINGS = os.getenv("DEBUG_TIMINGS", "false").lower() == "true"
+# Let browser frontends on the CORS origins read Server-Timing entries
+TIMING_ALLOW_ORIGIN = os.getenv("CORS_ORIGINS", "*")
+
+# Largest accepted /stream frame; clients should send low-res JPEGs
+STREAM_MAX_FRAME_BYTES = int(os.getenv("STREAM_MAX_FRAME_KB", "512")) * 1024
+
+# How often an identification checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+# nginx's "client closed request"; logged, never seen by the client
+CLIENT_CLOSED_REQUEST = 499
+
+DEADLINE_DETAIL = "Coin identification did not finish within the request deadline."
+
+BUSY_DETAIL = "Server is busy. Please retry shortly."
 
 
 # ---------------------------------------------------------------------------
 # Dependency injection
 # ---------------------------------------------------------------------------
 
-async def get_vlm_service() -> VLMService:
+def _attach_shared(service: VLMService, request: HTTPConnection) -> VLMService:
+    """Give a per-request VLMService access to app-scoped collaborators."""
+    service.feature_index = getattr(request.app.state, "feature_index", None)
+    service.decode_sandbox = getattr(request.app.state, "decode_sandbox", None)
+    service.coin_detector = getattr(request.app.state, "coin_detector", None)
+    service.http_pool = getattr(request.app.state, "http_pool", None)
+    service.model_router = getattr(request.app.state, "model_router", None)
+    return service
+
+
+async def get_vlm_service(request: HTTPConnection) -> VLMService:
     """Provide a VLMService instance to endpoint handlers."""
-    return VLMService()
+    return _attach_shared(VLMService(), request)
+
+
+async def get_request_timings() -> AsyncIterator[RequestTimings]:
+    """Collect stage timings for the duration of the request."""
+    with request_timing.collect() as timings:
+        yield timings
+
+
+async def get_deadline(request: Request) -> AsyncIterator[Optional[Deadline]]:
+    """Bind the request's deadline, from X-Request-Timeout or the default."""
+    with request_deadline.bind(DEADLINES.start(request.headers.get(DEADLINE_HEADER))) as deadline:
+        yield deadline
+
+
+async def get_client_identity(request: Request) -> ClientIdentity:
+    """Resolve the caller's API key tier (anonymous without a key)."""
+    try:
+        return quotas.identify(request)
+    except InvalidAPIKeyError:
+        raise HTTPException(status_code=401, detail="Invalid API key.")
 
 
 # ---------------------------------------------------------------------------
@@ -51,75 +160,368 @@ def _is_valid_image(content_type: str | None, image_bytes: bytes) -> bool:
     return False
 
 
+async def _read_upload(image: UploadFile) -> bytes:
+    """Validate an upload from its first chunk and spooled size, then read it.
+
+    The multipart parser has already spooled the part (to disk past the
+    spool threshold), so rejected uploads are never copied into memory.
+    """
+    try:
+        head = await image.read(UPLOAD_PROBE_BYTES)
+        # Validate file type
+        if not _is_valid_image(image.content_type, head):
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid file type. Please upload an image (JPEG, PNG, GIF, or WebP).",
+            )
+
+        # Validate image size
+        if image.size is not None and image.size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=400, detail=TOO_LARGE_DETAIL)
+
+        await image.seek(0)
+        return await image.read()
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Failed to read uploaded image")
+        raise HTTPException(
+            status_code=400,
+            detail="Failed to read image. Please try again.",
+        )
+
+
+@asynccontextmanager
+async def _admitted(request: Request) -> AsyncIterator[None]:
+    """Hold an admission slot for the block; ``503`` when the worker is saturated.
+
+    Entered once the upload has been read, so slow uploads hold no slot and
+    do not inflate the service times behind Retry-After.
+    """
+    admission = getattr(request.app.state, "admission", None)
+    if admission is None:
+        yield
+        return
+    try:
+        admitted_at = await admission.acquire(lane_for(request.headers.get(PRIORITY_HEADER)))
+    except AdmissionRejected as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=BUSY_DETAIL,
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    try:
+        yield
+    finally:
+        admission.release(admitted_at)
+
+
+async def _until_disconnected(request: Request, work: Awaitable[T]) -> T:
+    """Await *work*, cancelling it (and its provider calls) if the client leaves."""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                metrics.CLIENT_DISCONNECTS.inc()
+                logger.info("Client disconnected; cancelling identification")
+                raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request.")
+    finally:
+        task.cancel()
+
+
+def _client_id(request: Request) -> str:
+    """Identify the calling client for analytics (header, else remote address)."""
+    return request.headers.get("X-Client-Id") or get_remote_address(request)
+
+
+async def _identify_frame(
+    websocket: WebSocket,
+    vlm_service: VLMService,
+    gate: FrameGate,
+    frame: int,
+    frame_bytes: bytes,
+    lane: str,
+) -> None:
+    """Identify one settled /stream frame and push the result to the socket."""
+    admission = getattr(websocket.app.state, "admission", None)
+    admitted_at = None
+    try:
+        if admission is not None:
+            admitted_at = await admission.acquire(lane)
+        with request_deadline.bind(DEADLINES.start()):
+            coins, model_used = await vlm_service.identify_coins(frame_bytes)
+    except AdmissionRejected as exc:
+        gate.forget()  # not identified; try again once the scene is steady
+        await websocket.send_json({"type": "busy", "frame": frame, "retry_after": exc.retry_after})
+        return
+    except QuotaExceededError as exc:
+        gate.forget()
+        await websocket.send_json({
+            "type": "error",
+            "frame": frame,
+            "detail": "Quota exceeded. Please retry later or use a higher tier API key.",
+            "retry_after": exc.retry_after,
+        })
+        return
+    except ImageTooLargeError as exc:
+        gate.forget()
+        await websocket.send_json({"type": "error", "frame": frame, "detail": str(exc)})
+        return
+    except DeadlineExceededError:
+        gate.forget()
+        await websocket.send_json({"type": "error", "frame": frame, "detail": DEADLINE_DETAIL})
+        return
+    except Exception:
+        gate.forget()
+        logger.exception("Stream identification failed")
+        await websocket.send_json({
+            "type": "error",
+            "frame": frame,
+            "detail": "Coin identification failed. Please try again.",
+        })
+        return
+    finally:
+        if admitted_at is not None:
+            admission.release(admitted_at)
+
+    result = CoinIdentificationResponse(
+        coins=coins, total_coins_detected=len(coins), model_used=model_used
+    )
+    await websocket.send_json({
+        "type": "result",
+        "frame": frame,
+        **result.model_dump(mode="json", exclude={"timings"}),
+    })
+
+
 # ---------------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------------
 
-@router.post("/identify", response_model=CoinIdentificationResponse)
-@limiter.limit("10/minute")
+@router.post(
+    "/identify",
+    response_model=CoinIdentificationResponse,
+    dependencies=[Depends(get_deadline)],
+)
+@limiter.limit(quotas.request_limit)
 async def identify_coins(
     request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     image: UploadFile = File(...),
     model: str | None = Query(None, description="Optional VLM model override"),
+    tiled: bool | None = Query(
+        None, description="Identify overlapping tiles separately (large coin lots)"
+    ),
     vlm_service: VLMService = Depends(get_vlm_service),
+    client: ClientIdentity = Depends(get_client_identity),
+    scan_history: Optional[ScanHistoryStore] = Depends(get_scan_history),
+    image_store: Optional[ImageStore] = Depends(get_image_store),
+    timings: RequestTimings = Depends(get_request_timings),
 ):
     """Identify coins in an uploaded image.
 
     Accepts JPEG, PNG, GIF, or WebP images.
     Returns identified coins with country, year, denomination, and more.
     An optional ``model`` query parameter can override the default VLM model.
+    ``tiled=true`` splits large coin-lot photos into overlapping tiles that
+    are identified concurrently and merged.
+    Each provider attempt is charged against the client's cost budget.
+    Sharpness and exposure are scored locally first and returned as
+    ``quality``; with QUALITY_GATE=reject unusable images get a ``422``.
+    Stage durations are returned in a ``Server-Timing`` header, and in the
+    body's ``timings`` block when DEBUG_TIMINGS is enabled.
+    Identification must finish within ``X-Request-Timeout`` seconds
+    (REQUEST_DEADLINE_SECONDS by default) or a ``504`` is returned, and is
+    cancelled if the client disconnects.
+    A saturated worker sheds the request with ``503`` and ``Retry-After``;
+    ``X-Priority: batch`` queues it behind interactive requests.
     """
     if model:
-        vlm_service = VLMService(model=model)
-    # Read image bytes
-    try:
-        image_bytes = await image.read()
-    except Exception:
-        logger.exception("Failed to read uploaded image")
-        raise HTTPException(
-            status_code=400,
-            detail="Failed to read image. Please try again.",
-        )
+        vlm_service = _attach_shared(VLMService(model=model), request)
+    vlm_service.quota = quotas.account(client)
+    started = time.perf_counter()
+    # Read image bytes, validating type and size before the full read
+    with metrics.stage("read"):
+        image_bytes = await _read_upload(image)
+    # Admitted only now: queued requests hold their bytes, not a slot
+    async with _admitted(request):
+        # Decoded once, shared by the quality gate and every identification stage
+        # (in the decode sandbox's workers, when enabled)
+        sandbox = getattr(request.app.state, "decode_sandbox", None)
+        pipeline = ImagePipeline(image_bytes, decoder=sandbox.decode if sandbox else None)
 
-    # Validate file type
-    if not _is_valid_image(image.content_type, image_bytes):
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid file type. Please upload an image (JPEG, PNG, GIF, or WebP).",
-        )
+        # Score blur/exposure locally; unusable images never reach the provider
+        quality = None
+        if quality_gate.enabled:
+            try:
+                # Full decode plus NumPy scoring; off the loop like the detector
+                quality = await asyncio.to_thread(quality_gate.assess, pipeline)
+            except ImageTooLargeError as exc:
+                raise HTTPException(status_code=413, detail=f"Image too large to process. {exc}")
+            except Exception:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Invalid file type. Please upload an image (JPEG, PNG, GIF, or WebP).",
+                )
+            if quality_gate.rejects(quality):
+                return JSONResponse(
+                    status_code=422,
+                    content={
+                        "detail": f"Image quality too low. {quality_gate.retake_hint(quality)}",
+                        "quality": quality.model_dump(),
+                    },
+                )
 
-    # Validate image size (max 20 MB)
-    if len(image_bytes) > 20 * 1024 * 1024:
-        raise HTTPException(
-            status_code=400,
-            detail="Image too large. Maximum size is 20MB.",
+        # Identify coins
+        identify_started = time.perf_counter()
+        try:
+            coins, model_used = await _until_disconnected(
+                request, vlm_service.identify_coins(pipeline, tiled=tiled)
+            )
+        except HTTPException:
+            raise
+        except QuotaExceededError as exc:
+            raise HTTPException(
+                status_code=429,
+                detail="Quota exceeded. Please retry later or use a higher tier API key.",
+                headers={"Retry-After": str(exc.retry_after)},
+            )
+        except ImageTooLargeError as exc:
+            raise HTTPException(status_code=413, detail=f"Image too large to process. {exc}")
+        except DeadlineExceededError as exc:
+            logger.warning("Coin identification stopped: %s", exc)
+            raise HTTPException(status_code=504, detail=DEADLINE_DETAIL)
+        except Exception:
+            logger.exception("Coin identification failed")
+            raise HTTPException(
+                status_code=500,
+                detail="Coin identification failed. Please try again.",
+            )
+        finished = time.perf_counter()
+        image_digest = pipeline.digest
+
+        # Persist the upload after the response has been sent
+        if image_store is not None:
+            background_tasks.add_task(image_store.save, image_bytes, image_digest)
+
+        # Write-behind: enqueue only, the store flushes in the background
+        if scan_history is not None:
+            scan_history.record(
+                ScanRecord(
+                    client_id=_client_id(request),
+                    image_digest=image_digest,
+                    model=model_used,
+                    coins=[coin.model_dump() for coin in coins],
+                    timings={
+                        "read_ms": (identify_started - started) * 1000,
+                        "identify_ms": (finished - identify_started) * 1000,
+                        "total_ms": (finished - started) * 1000,
+                    },
+                )
+            )
+
+        response.headers["Server-Timing"] = timings.server_timing()
+        response.headers["Timing-Allow-Origin"] = TIMING_ALLOW_ORIGIN
+        return CoinIdentificationResponse(
+            coins=coins,
+            total_coins_detected=len(coins),
+            model_used=model_used,
+            quality=quality,
+            timings=timings.breakdown() if DEBUG_TIMINGS else None,
         )
 
-    # Identify coins
+
+@router.websocket("/stream")
+async def stream_coins(
+    websocket: WebSocket,
+    model: str | None = Query(None, description="Optional VLM model override"),
+    vlm_service: VLMService = Depends(get_vlm_service),
+):
+    """Identify coins continuously from a live camera.
+
+    The client sends low-resolution frames (JPEG, PNG or WebP) as binary
+    messages.  Blurry frames, frames taken while the camera moves, and
+    frames showing the same scene as the last identification are dropped
+    locally; a settled, changed frame is identified in the background while
+    later frames keep flowing.  The server pushes JSON messages:
+
+    * ``{"type": "status", "frame": n, "state": ...}`` when the gate state
+      changes (``blurry``, ``moving``, ``unchanged`` or ``ready``),
+    * ``{"type": "result", "frame": n, "coins": [...], ...}`` per identification,
+    * ``{"type": "busy" | "error", "frame": n, ...}`` on shed or failed frames.
+    """
     try:
-        coins, model_used = await vlm_service.identify_coins(image_bytes)
-    except Exception:
-        logger.exception("Coin identification failed")
-        raise HTTPException(
-            status_code=500,
-            detail="Coin identification failed. Please try again.",
-        )
+        client = quotas.identify(websocket)
+    except InvalidAPIKeyError:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid API key.")
+    if model:
+        vlm_service = _attach_shared(VLMService(model=model), websocket)
+    vlm_service.quota = quotas.account(client)
+    lane = lane_for(websocket.headers.get(PRIORITY_HEADER))
+    gate = FrameGate.from_env()
+    await websocket.accept()
 
-    return CoinIdentificationResponse(
-        coins=coins,
-        total_coins_detected=len(coins),
-        model_used=model_used,
-    )
+    pending: Optional[asyncio.Task] = None
+    last_state: Optional[str] = None
+    frame = 0
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            frame += 1
+            frame_bytes = message.get("bytes")
+            if frame_bytes is None:
+                await websocket.send_json({
+                    "type": "error", "frame": frame, "detail": "Send frames as binary messages.",
+                })
+                continue
+            if len(frame_bytes) > STREAM_MAX_FRAME_BYTES:
+                await websocket.close(
+                    code=status.WS_1009_MESSAGE_TOO_BIG, reason="Frame too large."
+                )
+                break
+
+            try:
+                verdict = await asyncio.to_thread(gate.analyse, frame_bytes)
+            except ImageTooLargeError as exc:
+                await websocket.send_json({"type": "error", "frame": frame, "detail": str(exc)})
+                continue
+            except Exception:
+                await websocket.send_json({"type": "error", "frame": frame, "detail": "Invalid frame."})
+                continue
+            metrics.STREAM_FRAMES.inc(state=verdict.state)
+
+            # One identification in flight per stream; later frames only
+            # update the gate until it finishes.
+            if verdict.state == READY and (pending is None or pending.done()):
+                gate.mark_identified()
+                pending = asyncio.create_task(
+                    _identify_frame(websocket, vlm_service, gate, frame, frame_bytes, lane)
+                )
+            if verdict.state != last_state:
+                last_state = verdict.state
+                await websocket.send_json({"type": "status", "frame": frame, "state": verdict.state})
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
 
 
 @router.get("/providers")
 async def list_providers(
+    request: Request,
     vlm_service: VLMService = Depends(get_vlm_service),
 ):
-    """Return the active model and list of supported providers."""
+    """Return the active model, supported providers and model routing scores."""
+    router = getattr(request.app.state, "model_router", None)
     return {
         "active_model": vlm_service.model,
         "supported_providers": SUPPORTED_PROVIDERS,
+        "routing": router.snapshot() if router is not None else None,
     }
 
 
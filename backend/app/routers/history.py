@@ -0,0 +1,47 @@
+"""
+Scan history API endpoints.
+
+Exposes the persisted identification history, newest first, with keyset
+pagination and an optional per-client filter.  Records identify clients
+and the stored uploads, so the API is admin-only (``X-Admin-Token``).
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from ..database.scan_history import ScanHistoryStore
+from ..models.history import ScanHistoryPage
+from .admin import verify_admin_token
+
+router = APIRouter(prefix="/api/v1/history", tags=["history"])
+
+
+# ---------------------------------------------------------------------------
+# Dependency injection
+# ---------------------------------------------------------------------------
+
+async def get_scan_history(request: Request) -> Optional[ScanHistoryStore]:
+    """Provide the app-scoped ScanHistoryStore, or None when disabled."""
+    return getattr(request.app.state, "scan_history", None)
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+@router.get("", response_model=ScanHistoryPage, dependencies=[Depends(verify_admin_token)])
+async def list_history(
+    limit: int = Query(50, ge=1, le=500, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page"),
+    client_id: Optional[str] = Query(None, description="Only return scans from this client"),
+    store: Optional[ScanHistoryStore] = Depends(get_scan_history),
+):
+    """Return recent identifications, newest first."""
+    if store is None:
+        raise HTTPException(status_code=503, detail="Scan history is disabled.")
+    try:
+        records, next_cursor = await store.recent(limit=limit, cursor=cursor, client_id=client_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return ScanHistoryPage(items=records, next_cursor=next_cursor)
@@ -0,0 +1,59 @@
+"""
+Stored image API endpoints.
+
+Serves uploads persisted by the content-addressed ImageStore, either the
+original bytes or the downscaled thumbnail.  Uploads are users' photos, so
+the API is admin-only (``X-Admin-Token``) and responses are never cached
+by shared caches.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from ..database.image_store import ImageStore
+from ..services.image_processor import ImageProcessor
+from .admin import verify_admin_token
+
+router = APIRouter(prefix="/api/v1/images", tags=["images"])
+
+
+# ---------------------------------------------------------------------------
+# Dependency injection
+# ---------------------------------------------------------------------------
+
+async def get_image_store(request: Request) -> Optional[ImageStore]:
+    """Provide the app-scoped ImageStore, or None when disabled."""
+    return getattr(request.app.state, "image_store", None)
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+@router.get("/{digest}", dependencies=[Depends(verify_admin_token)])
+async def get_image(
+    digest: str,
+    variant: str = Query("original", pattern="^(original|thumbnail)$"),
+    store: Optional[ImageStore] = Depends(get_image_store),
+):
+    """Stream a stored image by its SHA-256 digest."""
+    if store is None:
+        raise HTTPException(status_code=503, detail="Image storage is disabled.")
+    if not store.is_valid_digest(digest):
+        raise HTTPException(status_code=400, detail="Invalid image digest.")
+    try:
+        mapped = store.open(digest, variant)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="Image not found.")
+
+    return StreamingResponse(
+        store.iter_chunks(mapped),
+        media_type=ImageProcessor.get_media_type(mapped[:12]),
+        headers={
+            "Content-Length": str(len(mapped)),
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "ETag": f'"{digest}-{variant}"',
+        },
+    )
@@ -0,0 +1,167 @@
+"""
+Admission control for expensive endpoints.
+
+Each worker admits at most ``max_in_flight`` identifications at a time.
+Further requests wait in a bounded per-lane queue; the ``interactive`` lane
+is always served before ``batch``.  When a lane's queue is full, or a
+request has waited longer than ``max_wait``, it is rejected immediately with
+a ``Retry-After`` estimate instead of joining an ever-growing backlog.
+
+All state lives on the worker's event loop, so no locking is needed.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Optional
+
+from . import metrics
+
+LANES = ("interactive", "batch")
+
+# Clients put background work in the low-priority lane with "X-Priority: batch"
+PRIORITY_HEADER = "X-Priority"
+
+
+def lane_for(priority: Optional[str]) -> str:
+    """The lane for an ``X-Priority`` header value."""
+    return "batch" if (priority or "").lower() == "batch" else "interactive"
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; carries a Retry-After hint."""
+
+    def __init__(self, lane: str, reason: str, retry_after: int) -> None:
+        super().__init__(f"{lane} request rejected: {reason}")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded in-flight work with prioritised, bounded wait queues."""
+
+    # Smoothing factor of the service-time average used for Retry-After
+    EWMA_ALPHA = 0.2
+    MAX_RETRY_AFTER = 60
+
+    def __init__(
+        self,
+        max_in_flight: int = 8,
+        max_queue: Optional[dict[str, int]] = None,
+        max_wait: float = 30.0,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queue = {"interactive": 32, "batch": 8, **(max_queue or {})}
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiters: dict[str, deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        self._service_time = 1.0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8")),
+            max_queue={
+                "interactive": int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+                "batch": int(os.getenv("ADMISSION_MAX_BATCH_QUEUE", "8")),
+            },
+            max_wait=float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30")),
+        )
+
+    def queued(self, lane: str) -> int:
+        return len(self._waiters[lane])
+
+    # ------------------------------------------------------------------
+    # Acquire / release
+    # ------------------------------------------------------------------
+
+    async def acquire(self, lane: str) -> float:
+        """Wait for a slot in *lane*; return the admission time (perf_counter).
+
+        Raises AdmissionRejected when the lane's queue is full or the wait
+        exceeds ``max_wait``.
+        """
+        started = time.perf_counter()
+        if self.in_flight < self.max_in_flight and not any(self._waiters.values()):
+            self._admit(lane, started)
+            return started
+
+        queue = self._waiters[lane]
+        if len(queue) >= self.max_queue[lane]:
+            self._reject(lane, "queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        self._publish_queue(lane)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self._discard(lane, waiter)
+            self._reject(lane, "timeout")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._return_slot()  # granted just as the client went away
+            else:
+                self._discard(lane, waiter)
+            raise
+
+        admitted = time.perf_counter()
+        metrics.ADMISSION_WAIT_SECONDS.observe(admitted - started, lane=lane)
+        metrics.ADMISSION_DECISIONS.inc(lane=lane, outcome="admitted")
+        return admitted
+
+    def release(self, admitted_at: float) -> None:
+        """Free a slot taken at *admitted_at* and hand it to the next waiter."""
+        elapsed = time.perf_counter() - admitted_at
+        self._service_time += self.EWMA_ALPHA * (elapsed - self._service_time)
+        self._return_slot()
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _admit(self, lane: str, started: float) -> None:
+        self.in_flight += 1
+        metrics.ADMISSION_IN_FLIGHT.set(self.in_flight)
+        metrics.ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, lane=lane)
+        metrics.ADMISSION_DECISIONS.inc(lane=lane, outcome="admitted")
+
+    def _return_slot(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+        metrics.ADMISSION_IN_FLIGHT.set(self.in_flight)
+
+    def _wake(self) -> None:
+        """Grant free slots to waiters, interactive lane first."""
+        for lane in LANES:
+            queue = self._waiters[lane]
+            while queue and self.in_flight < self.max_in_flight:
+                waiter = queue.popleft()
+                if waiter.done():  # timed out or cancelled
+                    continue
+                self.in_flight += 1
+                waiter.set_result(None)
+            self._publish_queue(lane)
+
+    def _discard(self, lane: str, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters[lane].remove(waiter)
+        except ValueError:
+            pass
+        self._publish_queue(lane)
+
+    def _reject(self, lane: str, reason: str) -> None:
+        metrics.ADMISSION_DECISIONS.inc(lane=lane, outcome=reason)
+        raise AdmissionRejected(lane, reason, self.retry_after())
+
+    def _publish_queue(self, lane: str) -> None:
+        metrics.ADMISSION_QUEUED.set(len(self._waiters[lane]), lane=lane)
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        backlog = sum(len(q) for q in self._waiters.values()) + 1
+        seconds = self._service_time * backlog / max(1, self.max_in_flight)
+        return max(1, min(self.MAX_RETRY_AFTER, math.ceil(seconds)))
@@ -0,0 +1,99 @@
+"""
+Bounding-box utilities.
+
+Boxes are normalised ``(x_min, y_min, x_max, y_max)`` in 0-1 image
+coordinates, as returned in ``Coin.bbox``.  Overlap computations are
+vectorized with numpy so responses with hundreds of coins stay cheap.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+# Normalised (x_min, y_min, x_max, y_max)
+Box = tuple[float, float, float, float]
+
+FULL_FRAME: Box = (0.0, 0.0, 1.0, 1.0)
+
+
+def to_full_frame(bbox: Optional[list[float]], crop: Box) -> Optional[list[float]]:
+    """Map a bbox relative to *crop* back to full-image coordinates."""
+    if bbox is None or tuple(crop) == FULL_FRAME:
+        return bbox
+    x0, y0, x1, y1 = crop
+    w, h = x1 - x0, y1 - y0
+    return [x0 + bbox[0] * w, y0 + bbox[1] * h, x0 + bbox[2] * w, y0 + bbox[3] * h]
+
+
+def areas(boxes: np.ndarray) -> np.ndarray:
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def sanitize(boxes: Sequence[Sequence[float]]) -> tuple[np.ndarray, np.ndarray]:
+    """Order each box's corners and clip it to the unit square.
+
+    Returns ``(boxes, valid)``; a box is invalid when it has non-finite
+    values or no area left inside the image.
+    """
+    array = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    ordered = np.stack(
+        [
+            np.minimum(array[:, 0], array[:, 2]), np.minimum(array[:, 1], array[:, 3]),
+            np.maximum(array[:, 0], array[:, 2]), np.maximum(array[:, 1], array[:, 3]),
+        ],
+        axis=1,
+    )
+    clipped = np.clip(ordered, 0.0, 1.0)
+    valid = (
+        np.isfinite(array).all(axis=1)
+        & (clipped[:, 2] > clipped[:, 0])
+        & (clipped[:, 3] > clipped[:, 1])
+    )
+    return clipped, valid
+
+
+def pairwise_overlaps(boxes: np.ndarray, metric: str = "iou") -> np.ndarray:
+    """(N, N) overlap matrix of *boxes*.
+
+    ``iou`` is intersection over union; ``ios`` is intersection over the
+    smaller box, which also catches a partial box lying inside a full one
+    (a coin cut by a tile edge).
+    """
+    x0, y0, x1, y1 = (boxes[:, i] for i in range(4))
+    ix = np.clip(np.minimum(x1[:, None], x1) - np.maximum(x0[:, None], x0), 0, None)
+    iy = np.clip(np.minimum(y1[:, None], y1) - np.maximum(y0[:, None], y0), 0, None)
+    intersection = ix * iy
+    size = areas(boxes)
+    if metric == "ios":
+        denominator = np.minimum(size[:, None], size)
+    else:
+        denominator = size[:, None] + size - intersection
+    return np.divide(
+        intersection, denominator, out=np.zeros_like(intersection), where=denominator > 0
+    )
+
+
+def nms(
+    boxes: Sequence[Sequence[float]],
+    scores: Sequence[float],
+    threshold: float = 0.5,
+    metric: str = "iou",
+) -> list[int]:
+    """Greedy non-maximum suppression; return kept indices, best score first.
+
+    The overlap matrix is computed once, so the greedy pass is a row lookup
+    per kept box.
+    """
+    if len(boxes) == 0:
+        return []
+    array = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    suppresses = pairwise_overlaps(array, metric) > threshold
+    order = np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable")
+    suppressed = np.zeros(len(array), dtype=bool)
+    keep: list[int] = []
+    for index in order:
+        if suppressed[index]:
+            continue
+        keep.append(int(index))
+        suppressed |= suppresses[index]
+    return keep
@@ -0,0 +1,244 @@
+"""
+Local coin detector pre-pass.
+
+A circular Hough transform on a downscaled edge map finds candidate coin
+regions without a model call.  VLMService uses the candidates to crop the
+upload to the area that actually holds coins (smaller payloads, fewer image
+tokens) and skips the provider entirely when nothing coin-like is found.
+
+Every edge pixel votes for circle centres along its gradient direction at
+each candidate radius; the votes are accumulated with ``np.bincount`` and
+normalised by circumference, so a peak means "a large share of this circle's
+outline is an edge pointing at its centre".
+"""
+
+import math
+import os
+from dataclasses import dataclass, field
+from io import BytesIO
+
+import numpy as np
+from PIL import ImageFilter
+
+from .bbox import FULL_FRAME, Box
+from .image_processor import ImagePipeline, ImageSource
+
+
+@dataclass(frozen=True)
+class Detection:
+    """Candidate coin boxes found in an image, normalised to 0-1."""
+
+    boxes: list[Box] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.boxes)
+
+    def union(self, margin: float = 0.0) -> Box:
+        """Smallest box holding every candidate, grown by *margin* of its size."""
+        array = np.asarray(self.boxes, dtype=np.float64)
+        x0, y0 = array[:, 0].min(), array[:, 1].min()
+        x1, y1 = array[:, 2].max(), array[:, 3].max()
+        dx, dy = (x1 - x0) * margin, (y1 - y0) * margin
+        return (
+            max(0.0, float(x0 - dx)), max(0.0, float(y0 - dy)),
+            min(1.0, float(x1 + dx)), min(1.0, float(y1 + dy)),
+        )
+
+
+class CoinDetector:
+    """Circle detector tuned for coins photographed from above."""
+
+    MODEL_NAME = "local-detector"
+    # Longest side of the grayscale copy the transform runs on
+    ANALYSIS_SIZE = 256
+    # Edge pixels beyond this are subsampled to bound the voting cost
+    MAX_EDGE_PIXELS = 20_000
+    MAX_CANDIDATES = 200
+    # Points sampled around a candidate circle to verify it
+    COVERAGE_ANGLES = 72
+
+    def __init__(
+        self,
+        min_radius: float = 0.03,
+        max_radius: float = 0.5,
+        vote_threshold: float = 0.6,
+        min_coverage: float = 0.6,
+        crop_margin: float = 0.1,
+        skip_empty: bool = True,
+    ) -> None:
+        # Radii are fractions of the shorter image side
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+        self.vote_threshold = vote_threshold
+        self.min_coverage = min_coverage
+        self.crop_margin = crop_margin
+        self.skip_empty = skip_empty
+
+    @classmethod
+    def from_env(cls) -> "CoinDetector":
+        return cls(
+            min_radius=float(os.getenv("COIN_DETECTOR_MIN_RADIUS", "0.03")),
+            max_radius=float(os.getenv("COIN_DETECTOR_MAX_RADIUS", "0.5")),
+            vote_threshold=float(os.getenv("COIN_DETECTOR_VOTE_THRESHOLD", "0.6")),
+            min_coverage=float(os.getenv("COIN_DETECTOR_MIN_COVERAGE", "0.6")),
+            crop_margin=float(os.getenv("COIN_DETECTOR_CROP_MARGIN", "0.1")),
+            skip_empty=os.getenv("COIN_DETECTOR_SKIP_EMPTY", "true").lower() == "true",
+        )
+
+    # ------------------------------------------------------------------
+    # Detection
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _grayscale(cls, image: ImageSource) -> np.ndarray:
+        gray = ImagePipeline.of(image).grayscale(cls.ANALYSIS_SIZE)
+        return np.asarray(gray.filter(ImageFilter.GaussianBlur(1.5)), dtype=np.float32)
+
+    @staticmethod
+    def _sobel(gray: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Sobel gradients of the interior pixels (shape shrinks by 2)."""
+        left = gray[:-2, :-2] + 2 * gray[1:-1, :-2] + gray[2:, :-2]
+        right = gray[:-2, 2:] + 2 * gray[1:-1, 2:] + gray[2:, 2:]
+        top = gray[:-2, :-2] + 2 * gray[:-2, 1:-1] + gray[:-2, 2:]
+        bottom = gray[2:, :-2] + 2 * gray[2:, 1:-1] + gray[2:, 2:]
+        return right - left, bottom - top
+
+    def _radii(self, height: int, width: int) -> np.ndarray:
+        """Candidate radii in pixels, spaced geometrically (~5% apart)."""
+        short = min(height, width)
+        low = max(3, int(self.min_radius * short))
+        high = max(low, int(self.max_radius * short))
+        steps = int(math.log(high / low) / math.log(1.05)) + 1
+        return np.unique(np.rint(low * 1.05 ** np.arange(steps + 1))).astype(np.int64)
+
+    def detect(self, image: ImageSource) -> Detection:
+        """Find candidate coin boxes in *image*."""
+        gray = self._grayscale(image)
+        height, width = gray.shape
+        if min(height, width) < 16:
+            return Detection()
+
+        gx, gy = (np.pad(g, 1) for g in self._sobel(gray))
+        magnitude = np.hypot(gx, gy)
+        edges = magnitude > max(20.0, float(np.percentile(magnitude, 90)))
+        ys, xs = np.nonzero(edges)
+        if len(xs) == 0:
+            return Detection()
+        safe = np.maximum(magnitude, 1e-6)
+        ux_map, uy_map = gx / safe, gy / safe
+        if len(xs) > self.MAX_EDGE_PIXELS:
+            keep = slice(None, None, math.ceil(len(xs) / self.MAX_EDGE_PIXELS))
+            ys, xs = ys[keep], xs[keep]
+
+        # Vote for centres on both sides of each edge, at every radius
+        radii = self._radii(height, width)
+        r = radii[:, None].astype(np.float32)
+        ri = np.broadcast_to(np.arange(len(radii))[:, None], (len(radii), len(xs)))
+        flat = []
+        for sign in (1.0, -1.0):
+            cx = np.rint(xs + sign * r * ux_map[ys, xs]).astype(np.int64)
+            cy = np.rint(ys + sign * r * uy_map[ys, xs]).astype(np.int64)
+            valid = (cx >= 0) & (cx < width) & (cy >= 0) & (cy < height)
+            flat.append((ri[valid] * height + cy[valid]) * width + cx[valid])
+        votes = np.bincount(np.concatenate(flat), minlength=len(radii) * height * width)
+        votes = votes.reshape(len(radii), height, width).astype(np.float32)
+
+        # Separable 3x3 box sum absorbs rounding of the vote positions
+        padded = np.pad(votes, ((0, 0), (1, 1), (1, 1)))
+        rows = padded[:, :, :-2] + padded[:, :, 1:-1] + padded[:, :, 2:]
+        pooled = rows[:, :-2] + rows[:, 1:-1] + rows[:, 2:]
+        support = pooled / (2 * math.pi * radii[:, None, None])
+
+        circles = self._peaks(support, radii, self._dilate(edges), ux_map, uy_map)
+        boxes = [
+            (
+                max(0.0, (cx - rad) / width), max(0.0, (cy - rad) / height),
+                min(1.0, (cx + rad) / width), min(1.0, (cy + rad) / height),
+            )
+            for cx, cy, rad in circles
+        ]
+        return Detection(boxes)
+
+    @staticmethod
+    def _dilate(mask: np.ndarray, passes: int = 2) -> np.ndarray:
+        """Grow *mask* by one pixel per pass (3x3 binary dilation)."""
+        for _ in range(passes):
+            padded = np.pad(mask, 1)
+            rows = padded[:, :-2] | padded[:, 1:-1] | padded[:, 2:]
+            mask = rows[:-2] | rows[1:-1] | rows[2:]
+        return mask
+
+    def _peaks(
+        self,
+        support: np.ndarray,
+        radii: np.ndarray,
+        near_edge: np.ndarray,
+        ux_map: np.ndarray,
+        uy_map: np.ndarray,
+    ) -> list[tuple[float, float, float]]:
+        """Verify accumulator peaks and suppress overlapping ones.
+
+        A peak is kept when enough points around its circle lie on an edge
+        whose gradient points radially; arcs of neighbouring coins and the
+        corners of square patterns fail that test.
+        """
+        candidates = np.flatnonzero(support > self.vote_threshold)
+        if len(candidates) == 0:
+            return []
+        order = candidates[np.argsort(-support.ravel()[candidates])][: self.MAX_CANDIDATES * 50]
+        ri, cy, cx = np.unravel_index(order, support.shape)
+        rad = radii[ri].astype(np.float32)
+
+        # Coverage of every candidate circle at once: (candidates, angles)
+        theta = np.linspace(0, 2 * math.pi, self.COVERAGE_ANGLES, endpoint=False)
+        cos, sin = np.cos(theta), np.sin(theta)
+        px = np.rint(cx[:, None] + rad[:, None] * cos).astype(np.int64)
+        py = np.rint(cy[:, None] + rad[:, None] * sin).astype(np.int64)
+        height, width = near_edge.shape
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+        px, py = np.clip(px, 0, width - 1), np.clip(py, 0, height - 1)
+        radial = np.abs(ux_map[py, px] * cos + uy_map[py, px] * sin) > 0.8
+        coverage = (inside & near_edge[py, px] & radial).mean(axis=1)
+
+        # Coins do not nest: take verified circles largest first, so letters
+        # and rim details inside a coin are suppressed by the coin itself.
+        verified = np.flatnonzero(coverage >= self.min_coverage)
+        verified = verified[np.argsort(-rad[verified], kind="stable")]
+        accepted: list[tuple[float, float, float]] = []
+        for index in verified:
+            x, y, radius = float(cx[index]), float(cy[index]), float(rad[index])
+            # A peak inside an accepted circle is the same coin (or a ring on it)
+            if any(
+                (x - ax) ** 2 + (y - ay) ** 2 < max(radius, ar) ** 2
+                for ax, ay, ar in accepted
+            ):
+                continue
+            accepted.append((x, y, radius))
+            if len(accepted) >= self.MAX_CANDIDATES:
+                break
+        return accepted
+
+    # ------------------------------------------------------------------
+    # Cropping
+    # ------------------------------------------------------------------
+
+    def crop(self, image: ImageSource, detection: Detection) -> tuple[bytes, Box]:
+        """Crop *image* to the candidates' union; return (bytes, crop box).
+
+        Returns the original bytes and FULL_FRAME when cropping would not
+        save much.
+        """
+        pipeline = ImagePipeline.of(image)
+        box = detection.union(self.crop_margin)
+        if (box[2] - box[0]) * (box[3] - box[1]) > 0.8:
+            return pipeline.data, FULL_FRAME
+        img = pipeline.decoded()
+        width, height = img.size
+        pixels = (
+            int(box[0] * width), int(box[1] * height),
+            math.ceil(box[2] * width), math.ceil(box[3] * height),
+        )
+        output = BytesIO()
+        img.crop(pixels).save(output, format="JPEG", quality=95)
+        left, top, right, bottom = pixels
+        return output.getvalue(), (left / width, top / height, right / width, bottom / height)
@@ -0,0 +1,101 @@
+"""
+Request deadlines.
+
+Each identification gets a time budget: the seconds the client sends in
+``X-Request-Timeout`` (capped at ``REQUEST_DEADLINE_MAX_SECONDS``) or else
+``REQUEST_DEADLINE_SECONDS``.  The :class:`Deadline` is bound to a context
+variable for the request, like the request timings, so tile and refine
+tasks see it too.  VLMService gives every provider call the remaining
+budget as its timeout, and stops retrying -- raising
+:class:`DeadlineExceededError` -- once too little is left for another
+attempt to finish.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+DEADLINE_HEADER = "X-Request-Timeout"
+
+_current: ContextVar[Optional["Deadline"]] = ContextVar("coinscope_deadline", default=None)
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a request's deadline leaves no time for another provider call."""
+
+
+@dataclass(frozen=True)
+class DeadlineConfig:
+    """Request time budgets (seconds)."""
+
+    # Budget of requests that do not send a timeout; 0 disables deadlines
+    default_seconds: float = 60.0
+    max_seconds: float = 300.0
+    # Least time left for a provider attempt to be started at all
+    min_attempt_seconds: float = 2.0
+
+    @classmethod
+    def from_env(cls) -> "DeadlineConfig":
+        return cls(
+            default_seconds=float(os.getenv("REQUEST_DEADLINE_SECONDS", "60")),
+            max_seconds=float(os.getenv("REQUEST_DEADLINE_MAX_SECONDS", "300")),
+            min_attempt_seconds=float(os.getenv("REQUEST_DEADLINE_MIN_ATTEMPT_SECONDS", "2")),
+        )
+
+    def budget(self, requested: Optional[str] = None) -> Optional[float]:
+        """Seconds granted for a client's requested timeout, or None for no deadline.
+
+        Malformed or non-positive values fall back to the default.
+        """
+        try:
+            seconds = float(requested) if requested else 0.0
+        except ValueError:
+            seconds = 0.0
+        if not seconds > 0:
+            seconds = self.default_seconds
+        if seconds <= 0:
+            return None
+        return min(seconds, self.max_seconds) if self.max_seconds > 0 else seconds
+
+    def start(self, requested: Optional[str] = None) -> Optional["Deadline"]:
+        """A deadline starting now for *requested* seconds (see :meth:`budget`)."""
+        budget = self.budget(requested)
+        return Deadline(budget) if budget is not None else None
+
+
+DEADLINES = DeadlineConfig.from_env()
+
+
+class Deadline:
+    """A point in time by which a request must be answered."""
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.budget = seconds
+        self._clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+@contextmanager
+def bind(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Make *deadline* the current one for the duration of the block."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def current() -> Optional[Deadline]:
+    """The deadline of the request being handled, or None."""
+    return _current.get()
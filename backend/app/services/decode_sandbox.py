@@ -0,0 +1,151 @@
+"""
+Resource-limited subprocess decoding.
+
+The header checks in ``ImageProcessor.open_guarded`` stop images that
+declare oversized dimensions, but a decoder bug or an unusual format can
+still allocate more than expected.  ``DecodeSandbox`` runs decoding in a
+small worker pool whose processes have an address-space limit
+(``RLIMIT_AS``), so a runaway decode fails with MemoryError, or kills the
+worker, instead of growing the API process.
+
+Two steps use it:
+
+* :meth:`DecodeSandbox.decode` is the ``ImagePipeline`` decoder, so the
+  quality gate, detector, feature index, crop, tiling and refine stages
+  receive pixels decoded in a worker (copied back, within the decode
+  budget) and never decompress the upload in the API process;
+* :meth:`DecodeSandbox.encode` builds the provider payload.
+
+Still parsed in-process: image headers (dimensions only), ``/stream``
+frames (at most ``STREAM_MAX_FRAME_KB``, decoded at 64 px) and stored-image
+thumbnails.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, Optional
+
+from PIL import Image
+
+from .image_encoder import EncodeBudget, EncodedImage
+from .image_processor import (
+    DECODE_LIMITS,
+    DecodeLimits,
+    ImagePipeline,
+    ImageTooLargeError,
+    decode_image,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _current_vm_bytes() -> int:
+    """Virtual memory size of this process (0 where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmSize:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _limit_memory(budget_bytes: int) -> None:
+    """Pool initializer: cap the worker's address space at its size + budget."""
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return
+    limit = _current_vm_bytes() + budget_bytes
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _encode(image_bytes: bytes, budget: EncodeBudget) -> EncodedImage:
+    return ImagePipeline(image_bytes).encoded(budget)
+
+
+class DecodeSandbox:
+    """Pool of memory-capped worker processes for decoding untrusted images."""
+
+    def __init__(self, workers: int = 2, budget_bytes: Optional[int] = None) -> None:
+        self.workers = workers
+        # Headroom over the decode budget for the resized copy and encoder buffers
+        self.budget_bytes = budget_bytes or DECODE_LIMITS.max_bytes * 2
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Pipeline stages call decode() from worker threads
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "DecodeSandbox":
+        return cls(
+            workers=int(os.getenv("IMAGE_DECODE_WORKERS", "2")),
+            budget_bytes=int(os.getenv("IMAGE_DECODE_SUBPROCESS_MB", "0")) * 1024 * 1024 or None,
+        )
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # forkserver children do not inherit the API process's memory
+                method = "forkserver" if sys.platform.startswith("linux") else "spawn"
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(method),
+                    initializer=_limit_memory,
+                    initargs=(self.budget_bytes,),
+                )
+            return self._pool
+
+    def decode(
+        self,
+        image_bytes: bytes,
+        max_size: Optional[int] = None,
+        limits: Optional[DecodeLimits] = None,
+    ) -> Image.Image:
+        """Decode *image_bytes* in a worker (an ImagePipeline decoder).
+
+        Blocks until the worker answers, so call it off the event loop.
+        Raises ImageTooLargeError on OOM, like :meth:`encode`.
+        """
+        with self._worker_errors():
+            future = self._executor().submit(
+                decode_image, image_bytes, max_size, limits or DECODE_LIMITS
+            )
+            return future.result()
+
+    async def encode(self, image_bytes: bytes, budget: EncodeBudget) -> EncodedImage:
+        """Encode *image_bytes* to *budget* in a worker; raise ImageTooLargeError on OOM."""
+        return await self._run(_encode, image_bytes, budget)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        with self._worker_errors():
+            return await loop.run_in_executor(self._executor(), func, *args)
+
+    @contextmanager
+    def _worker_errors(self) -> Iterator[None]:
+        """Map a worker's MemoryError or death to ImageTooLargeError."""
+        try:
+            yield
+        except MemoryError:
+            raise ImageTooLargeError("Decoding this image exceeds the memory limit.") from None
+        except BrokenProcessPool:
+            logger.warning("Decode worker died; restarting the decode pool")
+            self.shutdown()
+            raise ImageTooLargeError("Decoding this image exceeds the memory limit.") from None
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,357 @@
+"""
+Local nearest-neighbour index of coin-crop descriptors.
+
+Confirmed identifications (high-confidence VLM results) are stored together
+with a compact, rotation-invariant descriptor of their crop.  New images are
+described the same way, one crop per detected coin, and answered from a
+vectorized cosine search over the whole index; only crops without a
+confident match need a VLM call.
+
+The descriptor captures colour, ring structure and edge orientation, which
+tells coin types apart but not years or mint marks, so index answers carry
+the type (name, country, denomination) without the stored coin's year or
+side descriptions.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from ..models.coin import Coin
+from .image_processor import ImagePipeline, ImageSource
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = "data/feature_index.npz"
+
+FULL_FRAME = (0.0, 0.0, 1.0, 1.0)
+
+# Coin fields the descriptor cannot confirm; never copied into index answers
+UNMATCHED_FIELDS = ("year", "obverse_description", "reverse_description")
+
+
+class CoinDescriptor:
+    """Computes fixed-length descriptors of (cropped) coin images.
+
+    The descriptor concatenates three L2-normalised blocks:
+
+    * a joint RGB colour histogram (Hellinger-mapped),
+    * mean intensity and gradient energy in concentric rings,
+    * a histogram of gradient direction *relative to the radius*,
+
+    all of which are invariant to in-plane rotation of the coin.
+    """
+
+    SIZE = 64
+    COLOR_BINS = 4
+    RINGS = 8
+    ORIENTATION_BINS = 8
+
+    _grid_cache: dict[int, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def dimensions(cls) -> int:
+        return cls.COLOR_BINS ** 3 + 2 * cls.RINGS + cls.ORIENTATION_BINS
+
+    @classmethod
+    def compute(cls, image: Image.Image, box: tuple[float, ...] = FULL_FRAME) -> Optional[np.ndarray]:
+        """Describe the region *box* (normalised xyxy) of *image*.
+
+        Returns None when the box is degenerate.
+        """
+        width, height = image.size
+        left, top = int(box[0] * width), int(box[1] * height)
+        right, bottom = int(round(box[2] * width)), int(round(box[3] * height))
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, width), min(bottom, height)
+        if right - left < 4 or bottom - top < 4:
+            return None
+
+        crop = image.crop((left, top, right, bottom)).convert("RGB")
+        crop = crop.resize((cls.SIZE, cls.SIZE), Image.Resampling.BILINEAR)
+        rgb = np.asarray(crop, dtype=np.float32) / 255.0
+
+        radius, cos_r, sin_r = cls._polar_grid(cls.SIZE)
+        inside = radius <= 1.0
+
+        # Colour: joint RGB histogram inside the coin disc
+        quantised = np.minimum((rgb * cls.COLOR_BINS).astype(np.int32), cls.COLOR_BINS - 1)
+        codes = (
+            quantised[..., 0] * cls.COLOR_BINS ** 2
+            + quantised[..., 1] * cls.COLOR_BINS
+            + quantised[..., 2]
+        )
+        color = np.bincount(codes[inside], minlength=cls.COLOR_BINS ** 3).astype(np.float32)
+        color = np.sqrt(color / max(color.sum(), 1.0))
+
+        # Gradients on luminance
+        gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        gy, gx = np.gradient(gray)
+        magnitude = np.hypot(gx, gy)
+
+        # Rings: mean intensity and gradient energy per concentric band
+        ring = np.minimum((radius * cls.RINGS).astype(np.int32), cls.RINGS - 1)
+        ring_ids = ring[inside]
+        counts = np.maximum(np.bincount(ring_ids, minlength=cls.RINGS), 1)
+        ring_intensity = np.bincount(ring_ids, weights=gray[inside], minlength=cls.RINGS) / counts
+        ring_energy = np.bincount(ring_ids, weights=magnitude[inside], minlength=cls.RINGS) / counts
+        rings = np.concatenate([ring_intensity - ring_intensity.mean(), ring_energy])
+
+        # Orientation of the gradient relative to the radial direction
+        radial = (gx * cos_r + gy * sin_r) / np.maximum(magnitude, 1e-6)
+        tangential = (gy * cos_r - gx * sin_r) / np.maximum(magnitude, 1e-6)
+        angle = np.mod(np.arctan2(tangential, radial), np.pi)
+        bins = np.minimum((angle / np.pi * cls.ORIENTATION_BINS).astype(np.int32), cls.ORIENTATION_BINS - 1)
+        orientation = np.bincount(
+            bins[inside], weights=magnitude[inside], minlength=cls.ORIENTATION_BINS
+        )
+
+        blocks = [cls._normalise(b.astype(np.float32)) for b in (color, rings, orientation)]
+        return cls._normalise(np.concatenate(blocks))
+
+    @classmethod
+    def _polar_grid(cls, size: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if size not in cls._grid_cache:
+            coords = (np.arange(size, dtype=np.float32) + 0.5) / size * 2.0 - 1.0
+            xx, yy = np.meshgrid(coords, coords)
+            radius = np.hypot(xx, yy)
+            safe = np.maximum(radius, 1e-6)
+            cls._grid_cache[size] = (radius, xx / safe, yy / safe)
+        return cls._grid_cache[size]
+
+    @staticmethod
+    def _normalise(vector: np.ndarray) -> np.ndarray:
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+
+class FeatureIndex:
+    """Bounded in-memory descriptor matrix with cosine nearest-neighbour search."""
+
+    MODEL_NAME = "feature-index"
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_INDEX_PATH,
+        capacity: int = 10_000,
+        match_threshold: float = 0.97,
+        margin: float = 0.01,
+        confirm_confidence: float = 0.9,
+    ) -> None:
+        self.path = path
+        self.capacity = capacity
+        self.match_threshold = match_threshold
+        self.margin = margin
+        self.confirm_confidence = confirm_confidence
+        self._vectors = np.zeros((capacity, CoinDescriptor.dimensions()), dtype=np.float32)
+        self._entries: list[Optional[dict]] = [None] * capacity
+        self._size = 0
+        self._next = 0
+        self._dirty = False
+        # Matching and indexing run in worker threads
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_env(cls) -> "FeatureIndex":
+        """Build an index from ``FEATURE_INDEX_*`` environment variables."""
+        return cls(
+            path=os.getenv("FEATURE_INDEX_PATH", DEFAULT_INDEX_PATH),
+            capacity=int(os.getenv("FEATURE_INDEX_CAPACITY", "10000")),
+            match_threshold=float(os.getenv("FEATURE_INDEX_MATCH_THRESHOLD", "0.97")),
+            confirm_confidence=float(os.getenv("FEATURE_INDEX_CONFIRM_CONFIDENCE", "0.9")),
+        )
+
+    def __len__(self) -> int:
+        return self._size
+
+    # ------------------------------------------------------------------
+    # Indexing
+    # ------------------------------------------------------------------
+
+    def add(self, descriptor: np.ndarray, coin: dict) -> None:
+        """Store *descriptor* with its identification, evicting the oldest when full.
+
+        *coin* holds the identification fields; its ``bbox`` (if any) is
+        relative to the described crop.
+        """
+        with self._lock:
+            self._vectors[self._next] = descriptor
+            self._entries[self._next] = coin
+            self._next = (self._next + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+            self._dirty = True
+
+    def add_confirmed(self, image: ImageSource, coins: list[Coin], whole_frame: bool = True) -> int:
+        """Index the confident coins of a VLM result; return how many were added.
+
+        *whole_frame* is False when *coins* are not everything in *image*
+        (the rest were answered from the index), so the frame itself is
+        never indexed as a single coin.
+        """
+        confident = [c for c in coins if c.confidence >= self.confirm_confidence and c.bbox]
+        if not confident:
+            return 0
+        image = self._decode(image)
+        added = 0
+        for coin in confident:
+            descriptor = CoinDescriptor.compute(image, tuple(coin.bbox))
+            if descriptor is not None:
+                self.add(descriptor, self._entry(coin, bbox=list(FULL_FRAME)))
+                added += 1
+        # Single-coin photos are typically re-scanned with similar framing,
+        # so the whole frame is indexed as well and can be matched directly.
+        if whole_frame and len(coins) == 1 and added:
+            descriptor = CoinDescriptor.compute(image)
+            if descriptor is not None:
+                self.add(descriptor, self._entry(coins[0], bbox=coins[0].bbox))
+                added += 1
+        return added
+
+    @staticmethod
+    def _entry(coin: Coin, bbox: Optional[list[float]]) -> dict:
+        entry = coin.model_dump(exclude={"id", "bbox"})
+        entry["bbox"] = bbox
+        return entry
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search(self, descriptors: np.ndarray, k: int = 2) -> tuple[np.ndarray, np.ndarray]:
+        """Return top-*k* (similarities, indices) for each row of *descriptors*."""
+        with self._lock:
+            size = self._size
+            if size == 0:
+                empty = np.empty((len(descriptors), 0))
+                return empty, empty.astype(np.int64)
+            sims = descriptors @ self._vectors[:size].T
+        k = min(k, size)
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1)
+        return np.take_along_axis(top_sims, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+    def match(
+        self,
+        image: ImageSource,
+        boxes: Optional[list[tuple[float, ...]]] = None,
+    ) -> Optional[list[Coin]]:
+        """Answer every crop in *boxes* from the index, or return None.
+
+        All crops must match confidently; otherwise the caller should fall
+        back to the VLM.  Defaults to a single full-frame crop.
+        """
+        coins = self.match_each(image, boxes)
+        if not coins or any(coin is None for coin in coins):
+            return None
+        return coins
+
+    def match_each(
+        self,
+        image: ImageSource,
+        boxes: Optional[list[tuple[float, ...]]] = None,
+    ) -> list[Optional[Coin]]:
+        """Answer each crop in *boxes* from the index; None where it has no confident match.
+
+        Decodes and runs NumPy, so call it off the event loop.
+        """
+        boxes = boxes or [FULL_FRAME]
+        if self._size == 0:
+            return [None] * len(boxes)
+        image = self._decode(image)
+        descriptors = [CoinDescriptor.compute(image, box) for box in boxes]
+        described = [i for i, d in enumerate(descriptors) if d is not None]
+        coins: list[Optional[Coin]] = [None] * len(boxes)
+        if not described:
+            return coins
+
+        with self._lock:
+            sims, indices = self.search(np.stack([descriptors[i] for i in described]), k=2)
+            entries = [[self._entries[int(j)] for j in row] for row in indices]
+        for i, row_sims, row_entries in zip(described, sims, entries):
+            if len(row_sims) == 0:
+                continue
+            best = float(row_sims[0])
+            if best < self.match_threshold:
+                continue
+            entry = row_entries[0]
+            if len(row_sims) > 1 and not self._same_coin(entry, row_entries[1]):
+                if best - float(row_sims[1]) < self.margin:
+                    continue
+            coins[i] = self._to_coin(entry, boxes[i], best)
+        return coins
+
+    @staticmethod
+    def _same_coin(a: dict, b: dict) -> bool:
+        # Entries differing only in year give the same (year-less) answer
+        return (a["name"], a["country"]) == (b["name"], b["country"])
+
+    @staticmethod
+    def _to_coin(entry: dict, box: tuple[float, ...], similarity: float) -> Coin:
+        fields = {k: v for k, v in entry.items() if k != "bbox" and k not in UNMATCHED_FIELDS}
+        fields["confidence"] = min(float(entry["confidence"]), similarity)
+        if entry.get("bbox"):
+            x0, y0, x1, y1 = box
+            w, h = x1 - x0, y1 - y0
+            bx0, by0, bx1, by1 = entry["bbox"]
+            fields["bbox"] = [x0 + bx0 * w, y0 + by0 * h, x0 + bx1 * w, y0 + by1 * h]
+        return Coin(**fields)
+
+    @staticmethod
+    def _decode(image: ImageSource) -> Image.Image:
+        # JPEG can decode straight to a reduced scale, which is all we need.
+        return ImagePipeline.of(image).decoded(CoinDescriptor.SIZE * 8)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def load(self) -> None:
+        """Load a previously saved index from :attr:`path`, if present."""
+        if not self.path or not os.path.isfile(self.path):
+            return
+        with np.load(self.path, allow_pickle=False) as data:
+            vectors = data["vectors"]
+            entries = json.loads(str(data["entries"]))
+        if vectors.shape[1:] != (CoinDescriptor.dimensions(),):
+            logger.warning("Ignoring feature index with incompatible descriptor size")
+            return
+        for vector, entry in zip(vectors[-self.capacity:], entries[-self.capacity:]):
+            self.add(vector, entry)
+        self._dirty = False
+        logger.info("Loaded %d feature index entries from %s", self._size, self.path)
+
+    def save(self) -> None:
+        """Atomically write the index to :attr:`path` if it changed."""
+        if not self.path or not self._dirty:
+            return
+        # Oldest-first so a reload preserves eviction order
+        with self._lock:
+            order = [(self._next + i) % self.capacity for i in range(self.capacity)]
+            order = [i for i in order if self._entries[i] is not None]
+            vectors = self._vectors[order]
+            entries = [self._entries[i] for i in order]
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    vectors=vectors,
+                    entries=np.array(json.dumps(entries)),
+                )
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self._dirty = False
@@ -0,0 +1,132 @@
+"""
+Change and stability detection for live camera streams.
+
+Each incoming frame is reduced to a small grayscale grid and compared with
+vectorized numpy operations against the previous frame (is the camera
+still moving?) and against the last frame sent for identification (has the
+scene changed?).  A Laplacian-variance score drops motion-blurred frames.
+Only a sharp frame that has been stable for a few frames *and* differs from
+the last identified one is worth a VLM call.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from .image_processor import ImageProcessor
+from .image_quality import laplacian_variance
+
+BLURRY = "blurry"
+MOVING = "moving"
+UNCHANGED = "unchanged"
+READY = "ready"
+
+
+@dataclass(frozen=True)
+class FrameVerdict:
+    """What the gate decided about one frame, with the scores behind it."""
+
+    state: str
+    sharpness: float
+    motion: float
+    change: float
+
+
+class FrameGate:
+    """Per-stream frame filter; not shared between connections."""
+
+    # Side of the grid sharpness is measured on; differencing uses half of it
+    SIZE = 128
+
+    def __init__(
+        self,
+        blur_threshold: float = 20.0,
+        motion_threshold: float = 4.0,
+        change_threshold: float = 10.0,
+        settle_frames: int = 3,
+    ) -> None:
+        self.blur_threshold = blur_threshold
+        self.motion_threshold = motion_threshold
+        self.change_threshold = change_threshold
+        self.settle_frames = settle_frames
+        self._previous: Optional[np.ndarray] = None
+        self._reference: Optional[np.ndarray] = None
+        self._stable = 0
+
+    @classmethod
+    def from_env(cls) -> "FrameGate":
+        return cls(
+            blur_threshold=float(os.getenv("STREAM_BLUR_THRESHOLD", "20")),
+            motion_threshold=float(os.getenv("STREAM_MOTION_THRESHOLD", "4")),
+            change_threshold=float(os.getenv("STREAM_CHANGE_THRESHOLD", "10")),
+            settle_frames=int(os.getenv("STREAM_SETTLE_FRAMES", "3")),
+        )
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _grayscale(cls, frame_bytes: bytes) -> np.ndarray:
+        """Decode *frame_bytes* (guarded) to a SIZE x SIZE float32 grid."""
+        with ImageProcessor.open_guarded(frame_bytes, max_size=cls.SIZE) as img:
+            gray = img.convert("L").resize((cls.SIZE, cls.SIZE), Image.Resampling.BILINEAR)
+        return np.asarray(gray, dtype=np.float32)
+
+    @staticmethod
+    def _thumbnail(gray: np.ndarray) -> np.ndarray:
+        """2x2 mean-pooled grid with the mean removed (ignores exposure shifts)."""
+        h, w = gray.shape
+        pooled = gray.reshape(h // 2, 2, w // 2, 2).mean(axis=(1, 3))
+        return pooled - pooled.mean()
+
+    @staticmethod
+    def _difference(a: Optional[np.ndarray], b: np.ndarray) -> float:
+        """Mean absolute difference, infinite when there is nothing to compare."""
+        if a is None:
+            return float("inf")
+        return float(np.abs(a - b).mean())
+
+    # ------------------------------------------------------------------
+    # Decisions
+    # ------------------------------------------------------------------
+
+    def analyse(self, frame_bytes: bytes) -> FrameVerdict:
+        """Score a frame and update the stream state.
+
+        Raises ImageTooLargeError or PIL errors for frames that cannot be
+        decoded; those leave the state untouched.
+        """
+        gray = self._grayscale(frame_bytes)
+        sharpness = laplacian_variance(gray)
+        thumbnail = self._thumbnail(gray)
+        motion = self._difference(self._previous, thumbnail)
+        change = self._difference(self._reference, thumbnail)
+        self._previous = thumbnail
+
+        if sharpness < self.blur_threshold:
+            self._stable = 0
+            state = BLURRY
+        elif motion > self.motion_threshold:
+            self._stable = 0
+            state = MOVING
+        else:
+            self._stable += 1
+            if self._stable < self.settle_frames:
+                state = MOVING
+            elif change < self.change_threshold:
+                state = UNCHANGED
+            else:
+                state = READY
+        return FrameVerdict(state, sharpness, motion, change)
+
+    def mark_identified(self) -> None:
+        """Use the latest frame as the reference later frames must differ from."""
+        self._reference = self._previous
+
+    def forget(self) -> None:
+        """Drop the reference (e.g. after a failed identification) to retry."""
+        self._reference = None
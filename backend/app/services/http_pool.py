@@ -0,0 +1,182 @@
+"""
+App-scoped pooled HTTP client for provider calls.
+
+Left to themselves, LiteLLM's provider handlers create HTTP clients per
+call or per cache entry, so a busy worker keeps paying TCP and TLS setup.
+``HttpPool`` owns one ``httpx`` transport for the process's lifetime --
+keep-alive, HTTP/2 when the ``h2`` package is installed, bounded pool and
+timeouts -- that every provider call shares.  It is created in the app's
+lifespan handler and handed to the providers by VLMService.  LiteLLM calls
+reach it two ways: providers served through the OpenAI SDK read the
+process-wide ``litellm.aclient_session``, which the lifespan points at the
+pool once (``attach_litellm``), and the others take the pool's one
+``AsyncHTTPHandler`` (``litellm_handler``) as their ``client`` argument.
+
+The transport is instrumented: requests in flight, requests made,
+connections opened and TLS handshakes are exported as metrics, so
+connection reuse is ``1 - connections / requests``.
+"""
+
+import importlib.util
+import logging
+import os
+import sys
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body that releases its in-flight slot when closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, pool: "HttpPool") -> None:
+        self._stream = stream
+        self._pool = pool
+        self._closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._pool._finished()
+        await self._stream.aclose()
+
+
+class _InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Pooled transport that records pool usage for HttpPool."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, pool: "HttpPool") -> None:
+        self._transport = transport
+        self._pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        downstream = request.extensions.get("trace")
+
+        async def trace(event: str, info: dict) -> None:
+            # httpcore reports connection setup only for new connections
+            if event == "connection.connect_tcp.complete":
+                self._pool.connections_opened += 1
+                metrics.HTTP_POOL_CONNECTIONS_OPENED.inc(host=host)
+            elif event == "connection.start_tls.complete":
+                metrics.HTTP_POOL_TLS_HANDSHAKES.inc(host=host)
+            if downstream is not None:
+                await downstream(event, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        self._pool._started(host)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._pool._finished()
+            raise
+        response.stream = _TrackedStream(response.stream, self._pool)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class HttpPool:
+    """One pooled, instrumented async HTTP client shared by provider calls."""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 60.0,
+        http2: bool = True,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 120.0,
+        write_timeout: float = 30.0,
+        pool_timeout: float = 10.0,
+    ) -> None:
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but the h2 package is not installed; using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout, read=read_timeout, write=write_timeout, pool=pool_timeout
+        )
+        self.in_flight = 0
+        self.requests = 0
+        self.connections_opened = 0
+        self.transport = _InstrumentedTransport(
+            httpx.AsyncHTTPTransport(limits=self.limits, http2=http2), self
+        )
+        self.client = httpx.AsyncClient(transport=self.transport, timeout=self.timeout)
+        self._litellm_handler: Any = None
+        self._litellm_handler_built = False
+
+    @classmethod
+    def from_env(cls) -> "HttpPool":
+        return cls(
+            max_connections=int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100")),
+            max_keepalive=int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_POOL_KEEPALIVE_SECONDS", "60")),
+            http2=os.getenv("HTTP2_ENABLED", "true").lower() == "true",
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5")),
+            read_timeout=float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "120")),
+            write_timeout=float(os.getenv("HTTP_WRITE_TIMEOUT_SECONDS", "30")),
+            pool_timeout=float(os.getenv("HTTP_POOL_TIMEOUT_SECONDS", "10")),
+        )
+
+    @property
+    def max_connections(self) -> Optional[int]:
+        return self.limits.max_connections
+
+    def attach_litellm(self) -> None:
+        """Make the pool's client LiteLLM's process-wide ``aclient_session``.
+
+        Imports litellm, so the lifespan calls it off the event loop;
+        ``aclose`` detaches the client again.
+        """
+        import litellm
+
+        litellm.aclient_session = self.client
+
+    def litellm_handler(self) -> Any:
+        """LiteLLM ``AsyncHTTPHandler`` on the pool's transport, built once.
+
+        None when this LiteLLM cannot take a transport.
+        """
+        if not self._litellm_handler_built:
+            self._litellm_handler_built = True
+            try:
+                from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+
+                self._litellm_handler = AsyncHTTPHandler(timeout=self.timeout, transport=self.transport)
+            except (ImportError, TypeError):
+                logger.debug("This LiteLLM cannot share the pool's transport")
+        return self._litellm_handler
+
+    def _started(self, host: str) -> None:
+        self.in_flight += 1
+        self.requests += 1
+        metrics.HTTP_POOL_REQUESTS.inc(host=host)
+        metrics.HTTP_POOL_IN_FLIGHT.set(self.in_flight)
+
+    def _finished(self) -> None:
+        self.in_flight -= 1
+        metrics.HTTP_POOL_IN_FLIGHT.set(self.in_flight)
+
+    async def aclose(self) -> None:
+        """Close pooled connections and detach the client from LiteLLM."""
+        litellm = sys.modules.get("litellm")
+        if litellm is not None and getattr(litellm, "aclient_session", None) is self.client:
+            litellm.aclient_session = None
+        if self._litellm_handler is not None:
+            await self._litellm_handler.close()
+        await self.client.aclose()
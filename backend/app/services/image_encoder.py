@@ -0,0 +1,189 @@
+"""
+Byte-budgeted payload encoding.
+
+A VLM reads coin inscriptions just as well from a well-compressed image at
+the provider's working resolution as from a quality-95 JPEG, which is
+several times larger: slower to upload and, for some providers, billed by
+size.  ``encode_to_budget`` scales the image to the provider's useful
+resolution and picks the highest quality that fits a byte budget.
+
+The quality is binary-searched on a small probe copy, which is cheap to
+encode; full-size encodes only verify the estimate and recalibrate the
+probe-to-full size ratio.  Formats are tried in order of preference (JPEG,
+then WebP by default; AVIF when listed and Pillow has an encoder).  No
+EXIF, ICC or XMP data is written, and the pixels come from
+``ImagePipeline.decoded`` with EXIF orientation already applied.
+"""
+
+import os
+from dataclasses import dataclass, replace
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image, features
+
+# Pillow feature names of the encoders
+_FEATURES = {"JPEG": "jpg", "WEBP": "webp", "AVIF": "avif"}
+# Encoder effort: WebP method 2 and AVIF speed 8 are several times faster
+# than the defaults for a few percent more bytes
+_OPTIONS = {"JPEG": {"optimize": True}, "WEBP": {"method": 2}, "AVIF": {"speed": 8}}
+
+# Longest side beyond which a provider downsamples anyway; first match wins
+PROVIDER_MAX_SIZES: tuple[tuple[str, int], ...] = (
+    ("claude", 1568),
+    ("anthropic", 1568),
+)
+
+
+@dataclass(frozen=True)
+class EncodeBudget:
+    """Target size, resolution and formats of a provider payload."""
+
+    max_bytes: int = 400 * 1024
+    max_size: int = 2048
+    # JPEG first: on coin photos it kept more inscription detail per byte
+    # than WebP at the default budget, and encodes faster
+    # (benchmarks/encoding.py).  WebP is the fallback before shrinking.
+    formats: tuple[str, ...] = ("JPEG", "WEBP")
+    min_quality: int = 35
+    max_quality: int = 90
+
+    @classmethod
+    def from_env(cls) -> "EncodeBudget":
+        formats = os.getenv("IMAGE_FORMATS", "jpeg,webp")
+        return cls(
+            max_bytes=int(os.getenv("IMAGE_BYTE_BUDGET_KB", "400")) * 1024,
+            max_size=int(os.getenv("IMAGE_MAX_SIZE", "2048")),
+            formats=tuple(f.strip().upper() for f in formats.split(",") if f.strip()),
+            min_quality=int(os.getenv("IMAGE_MIN_QUALITY", "35")),
+            max_quality=int(os.getenv("IMAGE_MAX_QUALITY", "90")),
+        )
+
+    def for_model(self, model: str) -> "EncodeBudget":
+        """This budget scaled to the resolution the provider of *model* uses.
+
+        The byte budget shrinks with the pixel area, so the compression
+        level stays the same.
+        """
+        name = model.lower()
+        for needle, max_size in PROVIDER_MAX_SIZES:
+            if needle in name and max_size < self.max_size:
+                scale = (max_size / self.max_size) ** 2
+                return replace(self, max_size=max_size, max_bytes=int(self.max_bytes * scale))
+        return self
+
+
+ENCODE_BUDGET = EncodeBudget.from_env()
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    """An encoded payload and how it was produced."""
+
+    data: bytes
+    format: str
+    quality: int
+    size: tuple[int, int]
+
+    @property
+    def media_type(self) -> str:
+        return f"image/{self.format.lower()}"
+
+
+def available_formats(formats: tuple[str, ...]) -> list[str]:
+    """The formats in *formats* that this Pillow build can encode."""
+    return [f for f in formats if f in _FEATURES and features.check(_FEATURES[f])]
+
+
+def _save(img: Image.Image, fmt: str, quality: int) -> bytes:
+    output = BytesIO()
+    # No exif/icc_profile arguments: the payload carries no metadata
+    img.save(output, format=fmt, quality=quality, **_OPTIONS.get(fmt, {}))
+    return output.getvalue()
+
+
+def _search_quality(img: Image.Image, fmt: str, target: float, low: int, high: int) -> Optional[int]:
+    """Highest quality in [low, high] encoding *img* within *target* bytes."""
+    best = None
+    while low <= high:
+        mid = (low + high) // 2
+        if len(_save(img, fmt, mid)) <= target:
+            best, low = mid, mid + 1
+        else:
+            high = mid - 1
+    return best
+
+
+def fit(img: Image.Image, max_size: int) -> Image.Image:
+    """*img* downscaled to at most *max_size* pixels on its longest side."""
+    width, height = img.size
+    if max(width, height) <= max_size:
+        return img
+    scale = max_size / max(width, height)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    # reducing_gap box-reduces most of the way first, as thumbnail() does
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+class _Encoder:
+    """Quality search for one scaled image."""
+
+    # Full-size encodes per format before settling for the best fit found
+    MAX_FULL_ENCODES = 2
+    # A fitting encode is only redone for at least this much more quality
+    MIN_GAIN = 5
+    # Longest side of the probe copy the quality is searched on
+    PROBE_SIZE = 512
+
+    def __init__(self, img: Image.Image, budget: EncodeBudget) -> None:
+        self.img = img
+        self.budget = budget
+        factor = max(img.size) // self.PROBE_SIZE
+        self.probe = img.reduce(factor) if factor >= 2 else img
+        self.ratio = (img.size[0] * img.size[1]) / (self.probe.size[0] * self.probe.size[1])
+
+    def encode(self, fmt: str) -> Optional[EncodedImage]:
+        """Best-quality *fmt* encoding within the budget, or None."""
+        budget = self.budget
+        low, high = budget.min_quality, budget.max_quality
+        target = budget.max_bytes / self.ratio
+        best: Optional[EncodedImage] = None
+        for _ in range(self.MAX_FULL_ENCODES):
+            quality = _search_quality(self.probe, fmt, target, low, high)
+            if quality is None:
+                break
+            data = _save(self.img, fmt, quality)
+            fits = len(data) <= budget.max_bytes
+            if fits:
+                best = EncodedImage(data, fmt, quality, self.img.size)
+            if self.probe is self.img:
+                break  # the search ran on the image itself
+            # Recalibrate the probe-to-full size ratio at this quality
+            target = budget.max_bytes * len(_save(self.probe, fmt, quality)) / len(data)
+            if fits:
+                low = quality + self.MIN_GAIN
+            else:
+                low, high = budget.min_quality, quality - 1
+        return best
+
+
+def encode_to_budget(img: Image.Image, budget: EncodeBudget) -> EncodedImage:
+    """Encode *img* within *budget*, shrinking it if no format fits.
+
+    Falls back to the first format at minimum quality once the image is
+    down to the probe size and still too large.
+    """
+    formats = available_formats(budget.formats) or ["JPEG"]
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    img = fit(img, budget.max_size)
+    while True:
+        encoder = _Encoder(img, budget)
+        for fmt in formats:
+            encoded = encoder.encode(fmt)
+            if encoded is not None:
+                return encoded
+        if max(img.size) <= _Encoder.PROBE_SIZE:
+            data = _save(img, formats[0], budget.min_quality)
+            return EncodedImage(data, formats[0], budget.min_quality, img.size)
+        img = fit(img, int(max(img.size) * 0.75))
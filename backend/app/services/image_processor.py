@@ -3,47 +3,134 @@ Image preprocessing utilities for coin identification.
 
 Handles resizing, encoding, and media-type detection so that downstream
 providers receive consistently formatted image data.
+
+Uploads are untrusted: every decode goes through ``open_guarded``, which
+reads the dimensions from the header and refuses images whose pixel count
+or decoded size would exceed the configured budgets before any pixel data
+is decompressed.
+
+``ImagePipeline`` wraps one upload for the length of a request, so the
+quality gate, detector, resize, tiling and refine stages share a single
+decode and its derived artifacts instead of each decoding the bytes again.
+The decode itself is pluggable: with ``IMAGE_DECODE_SUBPROCESS`` enabled it
+runs in the memory-capped DecodeSandbox, which sends the pixels back.
 """
 
-import base64
+import hashlib
+import os
+from dataclasses import dataclass
 from io import BytesIO
+from typing import Callable, Optional, Union
+
+from PIL import Image, ImageOps
+
+from . import metrics
+from .image_encoder import EncodeBudget, EncodedImage, encode_to_budget, fit
+from .profiling import trace_allocations
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when decoding an image would exceed the decode budgets."""
+
+
+@dataclass(frozen=True)
+class DecodeLimits:
+    """Pixel and memory budgets applied before decoding an image."""
 
-from PIL import Image
+    max_pixels: int = 100_000_000
+    max_bytes: int = 256 * 1024 * 1024
+
+    @classmethod
+    def from_env(cls) -> "DecodeLimits":
+        return cls(
+            max_pixels=int(float(os.getenv("IMAGE_MAX_MEGAPIXELS", "100")) * 1_000_000),
+            max_bytes=int(os.getenv("IMAGE_DECODE_BUDGET_MB", "256")) * 1024 * 1024,
+        )
+
+
+DECODE_LIMITS = DecodeLimits.from_env()
+
+
+def _bytes_per_pixel(mode: str) -> int:
+    """Pillow's in-memory storage per pixel (multi-band modes are 32-bit)."""
+    if mode in ("1", "L", "P"):
+        return 1
+    if mode.startswith("I;16"):
+        return 2
+    return 4
 
 
 class ImageProcessor:
     """Stateless image processing utilities."""
 
     @staticmethod
+    @metrics.timed("resize")
+    @trace_allocations
     def resize_image(image_bytes: bytes, max_size: int = 1280) -> bytes:
         """Resize image to fit within *max_size* pixels on its longest side.
 
         Preserves aspect ratio.  Converts RGBA/P images to RGB and outputs
-        high-quality JPEG bytes.
+        high-quality JPEG bytes.  Raises ImageTooLargeError for images over
+        the decode budgets.  Decodes *image_bytes* afresh; stages sharing an
+        upload should use ``ImagePipeline.resized`` instead.
         """
-        img = Image.open(BytesIO(image_bytes))
-        width, height = img.size
-
-        if width > max_size or height > max_size:
-            if width > height:
-                new_width = max_size
-                new_height = int(height * (max_size / width))
-            else:
-                new_height = max_size
-                new_width = int(width * (max_size / height))
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        return ImagePipeline(image_bytes)._encode_resized(max_size, quality=95)
 
-        if img.mode in ("RGBA", "P"):
-            img = img.convert("RGB")
+    @staticmethod
+    def open_guarded(
+        image_bytes: bytes,
+        max_size: Optional[int] = None,
+        limits: Optional[DecodeLimits] = None,
+    ) -> Image.Image:
+        """Open *image_bytes* for decoding if it fits the decode budgets.
 
-        output = BytesIO()
-        img.save(output, format="JPEG", quality=95)
-        return output.getvalue()
+        Only the header has been read when the checks run.  JPEGs larger
+        than *max_size* are switched to DCT-domain downscaling (``draft``)
+        first, so the memory budget applies to what will actually be decoded.
+        """
+        limits = limits or DECODE_LIMITS
+        try:
+            img = Image.open(BytesIO(image_bytes))
+        except Image.DecompressionBombError as exc:  # Pillow's own hard limit
+            raise ImageTooLargeError(
+                f"Image exceeds {limits.max_pixels / 1_000_000:g} megapixels."
+            ) from exc
+        width, height = img.size
+        if width * height > limits.max_pixels:
+            img.close()
+            raise ImageTooLargeError(
+                f"Image is {width}x{height}; the limit is "
+                f"{limits.max_pixels / 1_000_000:g} megapixels."
+            )
+        longest = max(width, height)
+        if max_size and img.format == "JPEG" and longest > max_size:
+            # draft() keeps both sides >= the requested box, so ask for the
+            # aspect-preserving target rather than a square
+            img.draft(img.mode, (width * max_size // longest, height * max_size // longest))
+        decoded_bytes = img.size[0] * img.size[1] * _bytes_per_pixel(img.mode)
+        if decoded_bytes > limits.max_bytes:
+            img.close()
+            raise ImageTooLargeError(
+                f"Decoding this {width}x{height} image needs "
+                f"{decoded_bytes // (1024 * 1024)} MB; the limit is "
+                f"{limits.max_bytes // (1024 * 1024)} MB."
+            )
+        return img
 
     @staticmethod
-    def encode_image(image_bytes: bytes) -> str:
-        """Base64-encode raw image bytes."""
-        return base64.b64encode(image_bytes).decode("utf-8")
+    def get_dimensions(image_bytes: bytes) -> tuple[int, int]:
+        """Return (width, height) read from the image header, without decoding pixels.
+
+        Headers past Pillow's decompression-bomb limit raise ImageTooLargeError,
+        as in :meth:`open_guarded`.
+        """
+        try:
+            with Image.open(BytesIO(image_bytes)) as img:
+                return img.size
+        except Image.DecompressionBombError as exc:
+            raise ImageTooLargeError(
+                f"Image exceeds {DECODE_LIMITS.max_pixels / 1_000_000:g} megapixels."
+            ) from exc
 
     @staticmethod
     def get_media_type(image_bytes: bytes) -> str:
@@ -56,4 +143,144 @@ class ImageProcessor:
             return "image/gif"
         if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
             return "image/webp"
+        if image_bytes[4:12] in (b"ftypavif", b"ftypavis"):
+            return "image/avif"
         return "image/jpeg"
+
+
+def decode_image(image_bytes: bytes, max_size: Optional[int], limits: DecodeLimits) -> Image.Image:
+    """Guarded decode to EXIF-oriented RGB or L pixels (see ImagePipeline.decoded)."""
+    img = ImageProcessor.open_guarded(image_bytes, max_size=max_size, limits=limits)
+    ImageOps.exif_transpose(img, in_place=True)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    return img
+
+
+# Signature of decode_image; DecodeSandbox.decode runs it in a worker process
+Decoder = Callable[[bytes, Optional[int], DecodeLimits], Image.Image]
+
+
+class ImagePipeline:
+    """One upload, decoded once and shared by every preprocessing stage.
+
+    Derived artifacts -- header dimensions, EXIF-oriented pixels, downscaled
+    grayscale copies, re-encoded variants and the content digest -- are
+    computed on first use and cached.  JPEGs are decoded at reduced scale
+    when a stage only needs a small copy; a decode at one scale serves every
+    later request for that scale or smaller, so an upload is decoded at most
+    once per scale actually needed.
+
+    A pipeline belongs to one request, whose stages use it one at a time;
+    it is not safe to share between threads.  *decoder* produces the pixels
+    (default :func:`decode_image`, in this process); a sandboxed decoder
+    blocks until its worker answers, so stages run off the event loop.
+    """
+
+    def __init__(
+        self,
+        data: bytes,
+        limits: Optional[DecodeLimits] = None,
+        decoder: Optional[Decoder] = None,
+    ) -> None:
+        self.data = data
+        self.limits = limits or DECODE_LIMITS
+        self.decoder = decoder or decode_image
+        self._size: Optional[tuple[int, int]] = None
+        self._digest: Optional[str] = None
+        # Keyed by the requested max_size; None holds the full-resolution decode
+        self._decoded: dict[Optional[int], Image.Image] = {}
+        self._grayscale: dict[int, Image.Image] = {}
+        self._encoded: dict[EncodeBudget, EncodedImage] = {}
+
+    @classmethod
+    def of(cls, image: "ImageSource", decoder: Optional[Decoder] = None) -> "ImagePipeline":
+        """Return *image* if it already is a pipeline, else wrap its bytes."""
+        return image if isinstance(image, ImagePipeline) else cls(image, decoder=decoder)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """(width, height) from the image header, without decoding pixels."""
+        if self._size is None:
+            self._size = ImageProcessor.get_dimensions(self.data)
+        return self._size
+
+    @property
+    def media_type(self) -> str:
+        return ImageProcessor.get_media_type(self.data)
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 hex digest of the upload (the image store key)."""
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.data).hexdigest()
+        return self._digest
+
+    def _covering(self, max_size: Optional[int]) -> Optional[Image.Image]:
+        """A cached decode at least *max_size* on its longest side, if any."""
+        if None in self._decoded:
+            return self._decoded[None]
+        if max_size is None:
+            return None
+        sizes = [size for size in self._decoded if size >= max_size]
+        return self._decoded[min(sizes)] if sizes else None
+
+    def check_budget(self, max_size: Optional[int] = None) -> None:
+        """Raise ImageTooLargeError if decoding at *max_size* exceeds the budgets."""
+        if self._covering(max_size) is None:
+            ImageProcessor.open_guarded(self.data, max_size=max_size, limits=self.limits).close()
+
+    @trace_allocations
+    def decoded(self, max_size: Optional[int] = None) -> Image.Image:
+        """EXIF-oriented RGB or L pixels, at least *max_size* on the longest side.
+
+        With *max_size* set, JPEGs may be decoded at a reduced scale; the
+        result is not resized to *max_size* exactly.  Callers must not modify
+        the returned image.
+        """
+        cached = self._covering(max_size)
+        if cached is not None:
+            return cached
+        img = self.decoder(self.data, max_size, self.limits)
+        # Longest side, as EXIF orientation may have swapped width and height
+        full = max(img.size) == max(self.size)
+        # A decode that was not reduced serves every later scale
+        self._decoded[None if full else max_size] = img
+        return img
+
+    def grayscale(self, size: int) -> Image.Image:
+        """Grayscale copy fitting within *size* x *size* pixels."""
+        if size not in self._grayscale:
+            gray = self.decoded(size).convert("L")
+            gray.thumbnail((size, size), Image.Resampling.BILINEAR)
+            self._grayscale[size] = gray
+        return self._grayscale[size]
+
+    @trace_allocations
+    def encoded(self, budget: EncodeBudget) -> EncodedImage:
+        """The image scaled and compressed to fit *budget* (see image_encoder)."""
+        if budget not in self._encoded:
+            with metrics.stage("resize"):
+                img = fit(self.decoded(budget.max_size), budget.max_size)
+            with metrics.stage("compress"):
+                self._encoded[budget] = encode_to_budget(img, budget)
+        return self._encoded[budget]
+
+    def _encode_resized(self, max_size: int, quality: int) -> bytes:
+        img = self.decoded(max_size)
+        width, height = img.size
+        if width > max_size or height > max_size:
+            if width > height:
+                new_width = max_size
+                new_height = int(height * (max_size / width))
+            else:
+                new_height = max_size
+                new_width = int(width * (max_size / height))
+            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        output = BytesIO()
+        img.save(output, format="JPEG", quality=quality)
+        return output.getvalue()
+
+
+# Stages accept raw upload bytes or a request's shared pipeline
+ImageSource = Union[bytes, ImagePipeline]
@@ -0,0 +1,121 @@
+"""
+Local image quality gate.
+
+Scores an upload on a downscaled grayscale copy before any provider call:
+sharpness as the variance of the Laplacian, exposure as mean brightness,
+contrast and the share of clipped (near-black / near-white) pixels.  Depending
+on QUALITY_GATE the report is only attached to the response (``flag``) or
+unusable images are refused outright (``reject``) so clients can ask for a
+retake instead of paying for a provider call that returns junk.
+"""
+
+import os
+
+import numpy as np
+
+from ..models.coin import ImageQuality
+from . import metrics
+from .image_processor import ImagePipeline, ImageSource
+
+MODES = ("off", "flag", "reject")
+
+# Pixel values at or beyond these count as clipped shadows / highlights
+CLIP_LOW = 5
+CLIP_HIGH = 250
+
+RETAKE_HINTS = {
+    "blurry": "The photo is blurry; hold the camera steady and refocus.",
+    "underexposed": "The photo is too dark; add light or avoid shadows.",
+    "overexposed": "The photo is too bright; avoid glare and direct light.",
+    "low_contrast": "The photo has very little contrast; use a plain contrasting background.",
+}
+
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian of *gray*; low values mean blur."""
+    if min(gray.shape) < 3:
+        return 0.0
+    laplacian = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4.0 * gray[1:-1, 1:-1]
+    )
+    return float(laplacian.var())
+
+
+class QualityGate:
+    """Configurable blur/exposure thresholds for uploads."""
+
+    # Longest side of the grayscale copy the statistics are computed on
+    ANALYSIS_SIZE = 512
+
+    def __init__(
+        self,
+        mode: str = "flag",
+        min_sharpness: float = 50.0,
+        min_brightness: float = 40.0,
+        max_brightness: float = 215.0,
+        max_clipped: float = 0.5,
+        min_contrast: float = 10.0,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown quality gate mode {mode!r}; expected one of {MODES}")
+        self.mode = mode
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        self.min_contrast = min_contrast
+
+    @classmethod
+    def from_env(cls) -> "QualityGate":
+        return cls(
+            mode=os.getenv("QUALITY_GATE", "flag").lower(),
+            min_sharpness=float(os.getenv("QUALITY_MIN_SHARPNESS", "50")),
+            min_brightness=float(os.getenv("QUALITY_MIN_BRIGHTNESS", "40")),
+            max_brightness=float(os.getenv("QUALITY_MAX_BRIGHTNESS", "215")),
+            max_clipped=float(os.getenv("QUALITY_MAX_CLIPPED", "0.5")),
+            min_contrast=float(os.getenv("QUALITY_MIN_CONTRAST", "10")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @metrics.timed("quality")
+    def assess(self, image: ImageSource) -> ImageQuality:
+        """Score *image*; raises ImageTooLargeError or PIL errors if undecodable."""
+        gray = np.asarray(
+            ImagePipeline.of(image).grayscale(self.ANALYSIS_SIZE), dtype=np.float32
+        )
+        sharpness = laplacian_variance(gray)
+        brightness = float(gray.mean())
+        contrast = float(gray.std())
+        dark = float((gray <= CLIP_LOW).mean())
+        bright = float((gray >= CLIP_HIGH).mean())
+
+        issues = []
+        if sharpness < self.min_sharpness:
+            issues.append("blurry")
+        if brightness < self.min_brightness or dark > self.max_clipped:
+            issues.append("underexposed")
+        if brightness > self.max_brightness or bright > self.max_clipped:
+            issues.append("overexposed")
+        if contrast < self.min_contrast:
+            issues.append("low_contrast")
+        return ImageQuality(
+            usable=not issues,
+            issues=issues,
+            sharpness=round(sharpness, 1),
+            brightness=round(brightness, 1),
+            contrast=round(contrast, 1),
+            clipped_dark=round(dark, 4),
+            clipped_bright=round(bright, 4),
+        )
+
+    def rejects(self, quality: ImageQuality) -> bool:
+        """True if *quality* should be refused instead of identified."""
+        return self.mode == "reject" and not quality.usable
+
+    @staticmethod
+    def retake_hint(quality: ImageQuality) -> str:
+        return " ".join(RETAKE_HINTS[issue] for issue in quality.issues)
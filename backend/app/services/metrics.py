@@ -0,0 +1,350 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Counters, gauges and fixed-bucket histograms keyed by label values.  An
+update is a dict lookup, a bisect and a few additions under a lock, cheap
+enough for the request hot path.  Each worker process keeps its own
+registry; Prometheus scrapes and aggregates them per instance.
+
+Stage timings share one histogram, ``coinscope_stage_duration_seconds``,
+labelled by stage, model and outcome.  The model label is taken from the
+surrounding :func:`model_context`, so leaf components (ImageProcessor,
+ResponseParser) need not know which model a request is for.
+
+Clients choose the model with ``?model=``, so model labels go through
+:func:`model_label`: only configured models (``VLM_MODEL``,
+``MODEL_ROUTER_MODELS``, ``METRICS_MODEL_ALLOWLIST``) get their own series,
+anything else is counted as ``other``.
+"""
+
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional, TypeVar
+
+from . import request_timing
+
+F = TypeVar("F", bound=Callable)
+
+_current_model: ContextVar[str] = ContextVar("coinscope_metrics_model", default="")
+
+OTHER_MODEL = "other"
+
+
+def _configured_models() -> frozenset[str]:
+    names = [os.getenv("VLM_MODEL", "gemini/gemini-flash-latest")]
+    for variable in ("MODEL_ROUTER_MODELS", "METRICS_MODEL_ALLOWLIST"):
+        names.extend(os.getenv(variable, "").split(","))
+    return frozenset(name.strip() for name in names if name.strip())
+
+
+# Models labelled by name; see model_label
+KNOWN_MODELS = _configured_models()
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    TYPE = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram per label set."""
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return int(sum(series[:-1])) if series else 0
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = []
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} "
+                    f"{_format_value(cumulative)}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---------------------------------------------------------------------------
+# CoinScope metrics
+# ---------------------------------------------------------------------------
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "coinscope_http_request_duration_seconds",
+    "HTTP request duration by route and status.",
+    ("method", "route", "status"),
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "coinscope_stage_duration_seconds",
+    "Duration of identification pipeline stages.",
+    ("stage", "model", "outcome"),
+))
+PROVIDER_RETRIES = REGISTRY.register(Counter(
+    "coinscope_provider_retries_total",
+    "Provider attempts beyond the first for an image variant.",
+    ("model",),
+))
+VARIANT_ESCALATIONS = REGISTRY.register(Counter(
+    "coinscope_variant_escalations_total",
+    "Times identification fell through to the next image variant.",
+    ("model", "variant"),
+))
+DEADLINE_EXCEEDED = REGISTRY.register(Counter(
+    "coinscope_deadline_exceeded_total",
+    "Identifications stopped because too little of the request deadline was left.",
+    ("model",),
+))
+CLIENT_DISCONNECTS = REGISTRY.register(Counter(
+    "coinscope_client_disconnects_total",
+    "Identifications cancelled because the client disconnected.",
+))
+UPSTREAM_BYTES = REGISTRY.register(Counter(
+    "coinscope_upstream_bytes_total",
+    "Request payload bytes sent to VLM providers.",
+    ("provider", "model"),
+))
+ADMISSION_IN_FLIGHT = REGISTRY.register(Gauge(
+    "coinscope_admission_in_flight",
+    "Identifications currently admitted on this worker.",
+))
+ADMISSION_QUEUED = REGISTRY.register(Gauge(
+    "coinscope_admission_queued",
+    "Requests waiting for admission, by priority lane.",
+    ("lane",),
+))
+ADMISSION_DECISIONS = REGISTRY.register(Counter(
+    "coinscope_admission_decisions_total",
+    "Admission outcomes (admitted, queue_full, timeout) by lane.",
+    ("lane", "outcome"),
+))
+ADMISSION_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "coinscope_admission_wait_seconds",
+    "Time spent queued before admission.",
+    ("lane",),
+))
+STREAM_FRAMES = REGISTRY.register(Counter(
+    "coinscope_stream_frames_total",
+    "Camera stream frames by gate verdict (blurry, moving, unchanged, ready).",
+    ("state",),
+))
+PROVIDER_INPUT_TOKENS = REGISTRY.register(Counter(
+    "coinscope_provider_input_tokens_total",
+    "Provider input tokens by prompt-cache use (read, write, none).",
+    ("provider", "model", "cache"),
+))
+PROVIDER_OUTPUT_TOKENS = REGISTRY.register(Counter(
+    "coinscope_provider_output_tokens_total",
+    "Provider output tokens.",
+    ("provider", "model"),
+))
+HTTP_POOL_IN_FLIGHT = REGISTRY.register(Gauge(
+    "coinscope_http_pool_in_flight",
+    "Provider HTTP requests in flight on the shared connection pool.",
+))
+HTTP_POOL_REQUESTS = REGISTRY.register(Counter(
+    "coinscope_http_pool_requests_total",
+    "Provider HTTP requests sent through the shared connection pool.",
+    ("host",),
+))
+HTTP_POOL_CONNECTIONS_OPENED = REGISTRY.register(Counter(
+    "coinscope_http_pool_connections_opened_total",
+    "New connections opened by the shared pool (the rest reused one).",
+    ("host",),
+))
+HTTP_POOL_TLS_HANDSHAKES = REGISTRY.register(Counter(
+    "coinscope_http_pool_tls_handshakes_total",
+    "TLS handshakes performed by the shared pool.",
+    ("host",),
+))
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def model_label(model: str) -> str:
+    """*model* if it is a configured model, else ``other``.
+
+    Keeps the label set bounded whatever clients pass as ``?model=``.
+    """
+    if not model or model in KNOWN_MODELS:
+        return model
+    return OTHER_MODEL
+
+
+@contextmanager
+def model_context(model: str) -> Iterator[None]:
+    """Label stages recorded inside the block with *model* (see :func:`model_label`)."""
+    token = _current_model.set(model_label(model))
+    try:
+        yield
+    finally:
+        _current_model.reset(token)
+
+
+@contextmanager
+def stage(name: str, model: Optional[str] = None) -> Iterator[None]:
+    """Time the block into ``coinscope_stage_duration_seconds``.
+
+    The outcome label is ``error`` if the block raises, else ``ok``.  The
+    duration is also added to the request's RequestTimings, when bound.
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(
+            elapsed,
+            stage=name,
+            model=_current_model.get() if model is None else model_label(model),
+            outcome=outcome,
+        )
+        timings = request_timing.current()
+        if timings is not None:
+            timings.add(name, elapsed)
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Decorator form of :func:`stage` for synchronous functions."""
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return decorator
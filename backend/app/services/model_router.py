@@ -0,0 +1,196 @@
+"""
+Adaptive model routing.
+
+With ``MODEL_ROUTER_MODELS`` set, requests that do not name a model are
+routed among those models from live statistics.  VLMService reports every
+provider call; per model the router keeps exponentially weighted moving
+averages (EWMA) of
+
+* latency of successful calls,
+* error rate (failed calls count 1, successful ones 0),
+* cost per call, in cost units: ``(input + 4 x output tokens) / 1000`` --
+  cached input tokens at a tenth -- times the model's price multiplier
+  from ``CostEstimator``.  Models that report no usage are priced by the
+  multiplier alone until they do.
+
+and picks per request by policy:
+
+``fastest``   lowest latency among healthy models;
+``cheapest``  lowest cost among healthy models meeting the latency SLO,
+              else the fastest;
+``weighted``  random split by configured weights among healthy models.
+
+A model is healthy while its error rate is at most the threshold.  Models
+without calls are tried first, and a small share of requests explores a
+random model, so a model that recovers is noticed again.
+"""
+
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .providers.usage import CallUsage
+from .quota import CostEstimator
+
+POLICIES = ("fastest", "cheapest", "weighted")
+
+# Output tokens are priced at this many input tokens
+OUTPUT_TOKEN_WEIGHT = 4.0
+CACHED_TOKEN_WEIGHT = 0.1
+# Typical tokens of an identification call, to price models without usage
+PRIOR_TOKENS = 2000
+
+
+@dataclass(frozen=True)
+class RouterConfig:
+    """Candidate models and how one is chosen."""
+
+    models: tuple[str, ...] = ()
+    policy: str = "fastest"
+    # Latency a model must meet for the cheapest policy (seconds)
+    slo_seconds: float = 10.0
+    max_error_rate: float = 0.2
+    weights: dict[str, float] = field(default_factory=dict)
+    # EWMA weight of the newest call
+    alpha: float = 0.2
+    # Share of requests routed to a random model to keep statistics fresh
+    explore: float = 0.05
+
+    @classmethod
+    def from_env(cls) -> "RouterConfig":
+        weights = {}
+        for item in os.getenv("MODEL_ROUTER_WEIGHTS", "").split(","):
+            if "=" in item:
+                model, weight = item.rsplit("=", 1)
+                weights[model.strip()] = float(weight)
+        return cls(
+            models=tuple(m.strip() for m in os.getenv("MODEL_ROUTER_MODELS", "").split(",") if m.strip()),
+            policy=os.getenv("MODEL_ROUTER_POLICY", "fastest").lower(),
+            slo_seconds=float(os.getenv("MODEL_ROUTER_SLO_SECONDS", "10")),
+            max_error_rate=float(os.getenv("MODEL_ROUTER_MAX_ERROR_RATE", "0.2")),
+            weights=weights,
+            alpha=float(os.getenv("MODEL_ROUTER_ALPHA", "0.2")),
+            explore=float(os.getenv("MODEL_ROUTER_EXPLORE", "0.05")),
+        )
+
+
+@dataclass
+class ModelStats:
+    """EWMA statistics of one model's recent calls."""
+
+    model: str
+    latency: Optional[float] = None
+    error_rate: float = 0.0
+    cost: Optional[float] = None
+    calls: int = 0
+
+    def observe(self, alpha: float, seconds: float, ok: bool, cost: Optional[float]) -> None:
+        self.calls += 1
+        self.error_rate += alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.latency = seconds if self.latency is None else self.latency + alpha * (seconds - self.latency)
+        if cost is not None:
+            self.cost = cost if self.cost is None else self.cost + alpha * (cost - self.cost)
+
+    @property
+    def expected_cost(self) -> float:
+        if self.cost is not None:
+            return self.cost
+        return PRIOR_TOKENS / 1000 * CostEstimator.model_multiplier(self.model)
+
+
+def call_cost(model: str, usage: CallUsage) -> Optional[float]:
+    """Cost units of a call from its token usage; None if none was reported."""
+    if not usage.reported:
+        return None
+    cached = min(usage.cached_tokens, usage.input_tokens)
+    tokens = (
+        usage.input_tokens - cached
+        + CACHED_TOKEN_WEIGHT * cached
+        + OUTPUT_TOKEN_WEIGHT * usage.output_tokens
+    )
+    return tokens / 1000 * CostEstimator.model_multiplier(model)
+
+
+class ModelRouter:
+    """Chooses the model of each request from live per-model statistics."""
+
+    def __init__(self, config: RouterConfig, rng: Optional[random.Random] = None) -> None:
+        if not config.models:
+            raise ValueError("The model router needs at least one model")
+        if config.policy not in POLICIES:
+            raise ValueError(f"Unknown routing policy {config.policy!r}; expected one of {POLICIES}")
+        self.config = config
+        self.stats = {model: ModelStats(model) for model in config.models}
+        self._rng = rng or random.Random()
+
+    @classmethod
+    def from_env(cls) -> Optional["ModelRouter"]:
+        """A router for ``MODEL_ROUTER_MODELS``, or None when it is unset."""
+        config = RouterConfig.from_env()
+        return cls(config) if config.models else None
+
+    # ------------------------------------------------------------------
+    # Statistics
+    # ------------------------------------------------------------------
+
+    def record(self, model: str, seconds: float, ok: bool, usage: Optional[CallUsage] = None) -> None:
+        """Add one provider call of *model*; models outside the pool are ignored."""
+        stats = self.stats.get(model)
+        if stats is None:
+            return
+        cost = call_cost(model, usage) if usage is not None else None
+        stats.observe(self.config.alpha, seconds, ok, cost)
+
+    def healthy(self, stats: ModelStats) -> bool:
+        return stats.error_rate <= self.config.max_error_rate
+
+    # ------------------------------------------------------------------
+    # Selection
+    # ------------------------------------------------------------------
+
+    def choose(self) -> str:
+        """The model for the next request under the configured policy."""
+        candidates = list(self.stats.values())
+        untried = [s for s in candidates if s.calls == 0]
+        if untried:
+            return untried[0].model
+        if self.config.explore and self._rng.random() < self.config.explore:
+            return self._rng.choice(candidates).model
+        healthy = [s for s in candidates if self.healthy(s)]
+        if not healthy:
+            # Everything is failing: use the model failing least
+            return min(candidates, key=lambda s: s.error_rate).model
+        if self.config.policy == "cheapest":
+            within_slo = [
+                s for s in healthy if s.latency is not None and s.latency <= self.config.slo_seconds
+            ]
+            if within_slo:
+                return min(within_slo, key=lambda s: s.expected_cost).model
+        elif self.config.policy == "weighted":
+            weights = [self.config.weights.get(s.model, 1.0) for s in healthy]
+            if sum(weights) > 0:
+                return self._rng.choices(healthy, weights=weights)[0].model
+        # A model with no successful call yet has no latency to offer
+        return min(healthy, key=lambda s: s.latency if s.latency is not None else float("inf")).model
+
+    def snapshot(self) -> dict:
+        """Current scores, as shown on ``/providers``."""
+        return {
+            "policy": self.config.policy,
+            "slo_seconds": self.config.slo_seconds,
+            "max_error_rate": self.config.max_error_rate,
+            "models": [
+                {
+                    "model": s.model,
+                    "calls": s.calls,
+                    "latency_ms": None if s.latency is None else round(s.latency * 1000, 1),
+                    "error_rate": round(s.error_rate, 4),
+                    "cost": round(s.expected_cost, 4),
+                    "healthy": self.healthy(s),
+                    "weight": self.config.weights.get(s.model, 1.0),
+                }
+                for s in self.stats.values()
+            ],
+        }
@@ -0,0 +1,48 @@
+"""
+Provider payloads.
+
+A payload variant is sent up to ``VLMService.MAX_RETRIES`` times, and a
+data URL for a full-resolution upload is tens of megabytes of text.
+``Payload`` carries the image bytes with their MIME type and builds the
+base64 data URL on first use, so retries (and any provider that is handed
+the same payload) reuse one copy instead of re-encoding it per attempt.
+"""
+
+import base64
+from typing import Optional, Union
+
+from . import metrics
+from .image_processor import ImageProcessor
+
+
+class Payload:
+    """Image bytes and MIME type sent to a provider, plus a cached data URL."""
+
+    __slots__ = ("data", "media_type", "_data_url")
+
+    def __init__(self, data: bytes, media_type: Optional[str] = None) -> None:
+        self.data = data
+        self.media_type = media_type or ImageProcessor.get_media_type(data)
+        self._data_url: Optional[str] = None
+
+    @classmethod
+    def of(cls, image: Union[bytes, "Payload"]) -> "Payload":
+        """*image* as a Payload, sniffing the MIME type of raw bytes."""
+        return image if isinstance(image, Payload) else cls(image)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        return f"Payload({self.media_type}, {len(self.data)} bytes)"
+
+    @property
+    def data_url(self) -> str:
+        """``data:<media type>;base64,...`` URL of the image, built once."""
+        if self._data_url is None:
+            self._data_url = self._build_data_url()
+        return self._data_url
+
+    @metrics.timed("encode")
+    def _build_data_url(self) -> str:
+        return f"data:{self.media_type};base64," + base64.b64encode(self.data).decode("ascii")
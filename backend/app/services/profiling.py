@@ -0,0 +1,310 @@
+"""
+On-demand CPU and memory profiling for live workers.
+
+Nothing here runs until an administrator asks for it:
+
+* :class:`SamplingProfiler` walks ``sys._current_frames()`` from a daemon
+  thread every few milliseconds and counts collapsed stacks.  Reports use the
+  folded format understood by speedscope and ``flamegraph.pl``.  It is used
+  both for a single request (``X-Profile`` header) and for a timed capture
+  of the whole process.
+* :data:`allocations` diffs ``tracemalloc`` snapshots around functions
+  decorated with :func:`trace_allocations` (ImageProcessor, ImagePipeline
+  and ResponseParser).  While inactive the decorator costs one attribute check.
+
+Reports are kept in memory by :class:`Profiler` and downloaded through the
+admin API.  Profiling is available only when ``ADMIN_TOKEN`` is set.
+"""
+
+import asyncio
+import fnmatch
+import functools
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable)
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+@dataclass
+class ProfileReport:
+    """A finished profile, downloadable as a text file."""
+
+    kind: str  # "request", "capture" or "allocations"
+    label: str
+    content: str
+    duration_s: float
+    samples: int = 0
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def filename(self) -> str:
+        extension = "txt" if self.kind == "allocations" else "folded"
+        return f"coinscope-{self.kind}-{self.id}.{extension}"
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "label": self.label,
+            "created_at": self.created_at,
+            "duration_s": round(self.duration_s, 3),
+            "samples": self.samples,
+            "filename": self.filename,
+        }
+
+
+# ---------------------------------------------------------------------------
+# CPU: stack sampling
+# ---------------------------------------------------------------------------
+
+class SamplingProfiler:
+    """Samples the stacks of every thread (except its own) at a fixed interval.
+
+    Python threads interleave on the GIL, so the event loop thread, the
+    default executor and any other worker threads are all visible.  A
+    per-request profile therefore also includes whatever else the worker was
+    doing concurrently.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64) -> None:
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self.duration_s = 0.0
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="coinscope-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Stop sampling and return the folded-stack report."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration_s = time.perf_counter() - self._started
+        return self.folded()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                self._stacks[self._collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.samples += 1
+
+    def _collapse(self, thread_name: str, frame) -> str:
+        parts = []
+        while frame is not None and len(parts) < self.max_depth:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        parts.append(thread_name)
+        return ";".join(reversed(parts))
+
+
+def _short_path(path: str) -> str:
+    """Trim a filename to its last two components (``services/vlm_service.py``)."""
+    head, tail = os.path.split(path)
+    return os.path.join(os.path.basename(head), tail)
+
+
+# ---------------------------------------------------------------------------
+# Memory: tracemalloc diffs around decorated calls
+# ---------------------------------------------------------------------------
+
+class AllocationTracer:
+    """Aggregates tracemalloc snapshot diffs around traced function calls."""
+
+    TOP_LINES = 15
+
+    def __init__(self) -> None:
+        self.active = False
+        self.max_calls = 0
+        self._lock = threading.RLock()
+        self._owns_tracemalloc = False
+        self._started = 0.0
+        self._in_call = False
+        self._calls: Counter[str] = Counter()
+        self._peaks: dict[str, int] = {}
+        self._lines: dict[str, Counter[str]] = {}
+        self._filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, fnmatch.__file__),  # used by filter_traces itself
+            tracemalloc.Filter(False, __file__),
+        ]
+
+    def start(self, max_calls: int = 50, frames: int = 1) -> None:
+        """Begin tracing the next *max_calls* decorated calls."""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                self._owns_tracemalloc = True
+            self._calls.clear()
+            self._peaks.clear()
+            self._lines.clear()
+            self.max_calls = max_calls
+            self._started = time.perf_counter()
+            self.active = True
+
+    def stop(self) -> ProfileReport:
+        """Stop tracing and return the aggregated report."""
+        with self._lock:
+            self.active = False
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+                self._owns_tracemalloc = False
+            return ProfileReport(
+                kind="allocations",
+                label="ImageProcessor / ImagePipeline / ResponseParser",
+                content=self._render(),
+                duration_s=time.perf_counter() - self._started,
+                samples=sum(self._calls.values()),
+            )
+
+    def call(self, name: str, func: Callable, args: tuple, kwargs: dict):
+        # Serialised so each diff is attributable to a single call; decorated
+        # calls nested inside one (resize_image -> decoded) count towards it.
+        with self._lock:
+            if self.active and not self._in_call:
+                return self._traced_call(name, func, args, kwargs)
+        return func(*args, **kwargs)
+
+    def _traced_call(self, name: str, func: Callable, args: tuple, kwargs: dict):
+        before = tracemalloc.take_snapshot().filter_traces(self._filters)
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self._in_call = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._in_call = False
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            after = tracemalloc.take_snapshot().filter_traces(self._filters)
+            lines = self._lines.setdefault(name, Counter())
+            for stat in after.compare_to(before, "lineno"):
+                if stat.size_diff:
+                    frame = stat.traceback[0]
+                    lines[f"{_short_path(frame.filename)}:{frame.lineno}"] += stat.size_diff
+            self._calls[name] += 1
+            self._peaks[name] = max(self._peaks.get(name, 0), peak)
+            if sum(self._calls.values()) >= self.max_calls:
+                self.active = False
+
+    def _render(self) -> str:
+        out = [f"# tracemalloc diffs over {sum(self._calls.values())} call(s)\n"]
+        for name, calls in self._calls.most_common():
+            out.append(
+                f"\n{name}: {calls} call(s), peak {self._peaks[name] / 1024:.1f} KiB above baseline\n"
+            )
+            for line, size in self._lines[name].most_common(self.TOP_LINES):
+                out.append(f"  {size / 1024:+10.1f} KiB  {line}\n")
+        return "".join(out)
+
+
+allocations = AllocationTracer()
+
+
+def trace_allocations(func: F) -> F:
+    """Record allocation diffs for *func* while :data:`allocations` is active."""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not allocations.active:
+            return func(*args, **kwargs)
+        return allocations.call(name, func, args, kwargs)
+    return wrapper  # type: ignore[return-value]
+
+
+# ---------------------------------------------------------------------------
+# Report store and admin access
+# ---------------------------------------------------------------------------
+
+class Profiler:
+    """Admin-gated entry point for profiles, keeping the latest reports."""
+
+    MAX_REPORTS = 20
+    SAMPLE_INTERVAL_SECONDS = 0.005
+
+    def __init__(self, admin_token: str, max_reports: int = MAX_REPORTS) -> None:
+        self._admin_token = admin_token
+        self.max_reports = max_reports
+        self._reports: OrderedDict[str, ProfileReport] = OrderedDict()
+        self._capture_lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["Profiler"]:
+        """Build from ``ADMIN_TOKEN``; None (profiling disabled) when unset."""
+        token = os.getenv("ADMIN_TOKEN")
+        if not token:
+            return None
+        return cls(token, max_reports=int(os.getenv("PROFILE_MAX_REPORTS", str(cls.MAX_REPORTS))))
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return token is not None and hmac.compare_digest(token.encode(), self._admin_token.encode())
+
+    # -- reports ---------------------------------------------------------
+
+    def add(self, report: ProfileReport) -> ProfileReport:
+        self._reports[report.id] = report
+        while len(self._reports) > self.max_reports:
+            self._reports.popitem(last=False)
+        return report
+
+    def get(self, report_id: str) -> Optional[ProfileReport]:
+        return self._reports.get(report_id)
+
+    def reports(self) -> list[ProfileReport]:
+        return list(reversed(self._reports.values()))
+
+    # -- CPU ---------------------------------------------------------------
+
+    def sampler(self) -> SamplingProfiler:
+        return SamplingProfiler(interval=self.SAMPLE_INTERVAL_SECONDS)
+
+    def finish(self, sampler: SamplingProfiler, kind: str, label: str) -> ProfileReport:
+        content = sampler.stop()
+        return self.add(ProfileReport(
+            kind=kind,
+            label=label,
+            content=content,
+            duration_s=sampler.duration_s,
+            samples=sampler.samples,
+        ))
+
+    async def capture(self, seconds: float) -> ProfileReport:
+        """Sample the whole process for *seconds*; one capture at a time."""
+        async with self._capture_lock:
+            sampler = self.sampler()
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                report = self.finish(sampler, "capture", f"{seconds:g}s process capture")
+            return report
+
@@ -3,6 +3,10 @@ Prompt construction for coin identification requests.
 
 Centralises the system prompt so it can be reused across providers and
 easily updated without touching provider code.
+
+Every prompt starts with the static ``TEMPLATE``; per-request additions
+follow it, so providers can cache the template as a prompt prefix
+(see ``providers.prompt_cache``).
 """
 
 
@@ -48,7 +52,27 @@ Example response format:
   }
 ]"""
 
+    SINGLE_COIN_NOTE = """
+
+This image is a close-up of ONE coin cropped from a larger photo.
+Identify only the coin in the centre of the image; ignore partial coins at the edges."""
+
     @classmethod
-    def build(cls) -> str:
-        """Return the full coin identification prompt."""
+    def build(cls, single_coin: bool = False) -> str:
+        """Return the full coin identification prompt.
+
+        *single_coin* adds a note for a close-up crop of one coin.
+        """
+        if single_coin:
+            return cls.TEMPLATE + cls.SINGLE_COIN_NOTE
         return cls.TEMPLATE
+
+    @classmethod
+    def split(cls, prompt: str) -> tuple[str, str]:
+        """Split *prompt* into its cacheable static prefix and the rest.
+
+        The prefix is empty for a prompt not built on ``TEMPLATE``.
+        """
+        if prompt.startswith(cls.TEMPLATE):
+            return cls.TEMPLATE, prompt[len(cls.TEMPLATE):].strip()
+        return "", prompt
@@ -2,11 +2,25 @@
 VLM provider implementations for coin identification.
 
 Supports multiple providers including Gemini (direct SDK) and LiteLLM-based
-providers (OpenAI, Anthropic, etc.).
+providers (OpenAI, Anthropic, etc.).  Provider classes are imported lazily
+through :data:`registry`, so their SDKs load only when first used.
 """
 
 from .base import BaseVLMProvider
-from .gemini import GeminiProvider
-from .litellm_provider import LiteLLMProvider
+from .registry import ProviderRegistry, registry
 
-__all__ = ["BaseVLMProvider", "GeminiProvider", "LiteLLMProvider"]
+__all__ = [
+    "BaseVLMProvider",
+    "GeminiProvider",
+    "LiteLLMProvider",
+    "ProviderRegistry",
+    "registry",
+]
+
+_LAZY_CLASSES = {"GeminiProvider": "gemini", "LiteLLMProvider": "litellm"}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_CLASSES:
+        return registry.load(_LAZY_CLASSES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
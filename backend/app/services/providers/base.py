@@ -1,23 +1,30 @@
 """
 Abstract base class for VLM providers.
 
-All VLM providers must implement the `identify` method, which accepts
-preprocessed image bytes and a prompt string, returning the raw model response.
+All VLM providers must implement the `identify` method, which accepts a
+preprocessed image payload and a prompt string, returning the raw model response.
 """
 
 from abc import ABC, abstractmethod
+from typing import Optional
+
+from ..payload import Payload
 
 
 class BaseVLMProvider(ABC):
     """Abstract base class for Vision Language Model providers."""
 
     @abstractmethod
-    async def identify(self, image_bytes: bytes, prompt: str) -> str:
+    async def identify(self, image: Payload, prompt: str, timeout: Optional[float] = None) -> str:
         """Send an image and prompt to the VLM and return the raw text response.
 
         Args:
-            image_bytes: Preprocessed image bytes (already resized to JPEG).
+            image: The preprocessed image (JPEG, WebP or AVIF) with its MIME
+                type.  The same Payload is passed to every retry, so derived
+                encodings such as ``data_url`` are built once.
             prompt: The identification prompt to send alongside the image.
+            timeout: Seconds the call may take -- what is left of the
+                request deadline -- or None for the provider's default.
 
         Returns:
             Raw text response from the model.
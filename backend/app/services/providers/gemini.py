@@ -2,30 +2,43 @@
 Google Gemini provider using the google-generativeai SDK.
 
 Calls the Gemini API directly for better image handling compared to the
-LiteLLM passthrough.
+LiteLLM passthrough.  The static instructions are uploaded once as cached
+content and referenced by handle (see ``prompt_cache``); calls fall back
+to sending them inline when the model refuses a cache.
 """
 
 import asyncio
+import hashlib
 import logging
 import os
+from datetime import timedelta
+from typing import Any, Optional
 
 from .base import BaseVLMProvider
+from .. import metrics
+from ..payload import Payload
+from ..prompt_builder import PromptBuilder
+from .prompt_cache import PromptCache
+from .usage import record_usage
 
 logger = logging.getLogger(__name__)
 
 try:
     import google.generativeai as genai
+    from google.generativeai import caching
     GENAI_AVAILABLE = True
 except ImportError:
     genai = None  # type: ignore[assignment]
+    caching = None  # type: ignore[assignment]
     GENAI_AVAILABLE = False
 
 
 class GeminiProvider(BaseVLMProvider):
     """Gemini provider using the google-generativeai SDK."""
 
-    def __init__(self, model_name: str) -> None:
+    def __init__(self, model_name: str, prompt_cache: Optional[PromptCache] = None) -> None:
         self.model_name = model_name
+        self.prompt_cache = prompt_cache
         if GENAI_AVAILABLE:
             api_key = os.getenv("GEMINI_API_KEY")
             if api_key:
@@ -43,22 +56,79 @@ class GeminiProvider(BaseVLMProvider):
             return model_string[7:]
         return model_string
 
-    async def identify(self, image_bytes: bytes, prompt: str) -> str:
+    async def identify(self, image: Payload, prompt: str, timeout: Optional[float] = None) -> str:
         """Call Gemini with an image and prompt, returning raw text."""
-        model = genai.GenerativeModel(self.model_name)
-        image_part = {"mime_type": "image/jpeg", "data": image_bytes}
+        image = Payload.of(image)
+        image_part = {"mime_type": image.media_type, "data": image.data}
+        instructions, rest = PromptBuilder.split(prompt)
+        # The SDK call runs in a thread that cancelling the request cannot
+        # stop; its own timeout bounds it instead
+        request_options = {"timeout": timeout} if timeout is not None else None
 
         def _sync_generate() -> str:
-            response = model.generate_content(
-                [prompt, image_part],
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.1,
-                    max_output_tokens=4000,
-                ),
-            )
+            key = self._cache_key(instructions) if instructions else None
+            cached = self._cached_instructions(key, instructions) if key else None
+            if cached is not None:
+                model = genai.GenerativeModel.from_cached_content(cached_content=cached)
+                contents = [image_part, rest] if rest else [image_part]
+            else:
+                model = genai.GenerativeModel(self.model_name)
+                contents = [prompt, image_part]
+            try:
+                response = model.generate_content(
+                    contents,
+                    generation_config=genai.types.GenerationConfig(
+                        temperature=0.1,
+                        max_output_tokens=4000,
+                    ),
+                    request_options=request_options,
+                )
+            except Exception:
+                if cached is not None:
+                    # The handle may have expired server-side; the retry makes a new one
+                    self.prompt_cache.invalidate(key)
+                raise
+            self._record_usage(response)
             return response.text
 
-        loop = asyncio.get_event_loop()
-        response_text = await loop.run_in_executor(None, _sync_generate)
+        metrics.UPSTREAM_BYTES.inc(
+            len(image.data) + len(prompt), provider="gemini", model=metrics.model_label(self.model_name)
+        )
+        # to_thread, unlike run_in_executor, carries the call's usage context
+        response_text = await asyncio.to_thread(_sync_generate)
         logger.debug("Gemini response: %s", response_text[:500])
         return response_text
+
+    def _cache_key(self, instructions: str) -> str:
+        digest = hashlib.sha256(instructions.encode("utf-8")).hexdigest()[:16]
+        return f"gemini:{self.model_name}:{digest}"
+
+    def _cached_instructions(self, key: str, instructions: str) -> Optional[Any]:
+        """The CachedContent holding *instructions*, or None to send them inline."""
+        if self.prompt_cache is None or caching is None:
+            return None
+
+        def create(ttl: float) -> Any:
+            return caching.CachedContent.create(
+                model=self.model_name,
+                system_instruction=instructions,
+                ttl=timedelta(seconds=ttl),
+            )
+
+        def refresh(handle: Any, ttl: float) -> Any:
+            handle.update(ttl=timedelta(seconds=ttl))
+            return handle
+
+        return self.prompt_cache.handle(key, create, refresh)
+
+    def _record_usage(self, response: Any) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        record_usage(
+            "gemini",
+            self.model_name,
+            getattr(usage, "prompt_token_count", 0),
+            getattr(usage, "candidates_token_count", 0),
+            getattr(usage, "cached_content_token_count", 0),
+        )
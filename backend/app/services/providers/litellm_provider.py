@@ -3,51 +3,114 @@ LiteLLM-based provider for OpenAI, Anthropic, and other VLM backends.
 
 Routes requests through LiteLLM's unified API, which handles authentication
 and payload formatting for each upstream provider.
+
+The static instructions go first, as a system message, so providers that
+cache prompt prefixes (OpenAI automatically, Anthropic when marked with
+``cache_control``) serve them from cache on later calls.
 """
 
 import logging
 import os
+from typing import Any, Optional
 
 import litellm
 
 from .base import BaseVLMProvider
-from ..image_processor import ImageProcessor
+from .. import metrics
+from ..http_pool import HttpPool
+from ..payload import Payload
+from ..prompt_builder import PromptBuilder
+from .prompt_cache import PromptCache
+from .usage import record_usage
 
 logger = logging.getLogger(__name__)
 
+# LiteLLM providers served through the OpenAI SDK, which takes its HTTP
+# client from ``litellm.aclient_session`` (set by the app's lifespan)
+# rather than a ``client`` argument
+_OPENAI_SDK_PROVIDERS = {"openai", "azure", "text-completion-openai"}
+
 
 class LiteLLMProvider(BaseVLMProvider):
     """LiteLLM provider supporting OpenAI, Anthropic, and others."""
 
-    def __init__(self, model: str) -> None:
+    def __init__(
+        self,
+        model: str,
+        http_pool: Optional[HttpPool] = None,
+        prompt_cache: Optional[PromptCache] = None,
+    ) -> None:
         self.model = model
         litellm.set_verbose = os.getenv("DEBUG", "false").lower() == "true"
+        self._client_kwargs = self._pooled_client(model, http_pool) if http_pool else {}
+        # Anthropic models only cache prefixes marked with cache_control
+        name = model.lower()
+        self.mark_cacheable = (
+            prompt_cache is not None and prompt_cache.enabled and ("claude" in name or "anthropic" in name)
+        )
+
+    @staticmethod
+    def _pooled_client(model: str, http_pool: HttpPool) -> dict[str, Any]:
+        """``acompletion`` arguments that send *model*'s calls through *http_pool*."""
+        try:
+            provider = litellm.get_llm_provider(model)[1]
+        except Exception:
+            return {}
+        if provider in _OPENAI_SDK_PROVIDERS or provider in litellm.openai_compatible_providers:
+            return {}
+        # The pool's one handler, so every provider shares its connections
+        handler = http_pool.litellm_handler()
+        return {"client": handler} if handler is not None else {}
 
-    async def identify(self, image_bytes: bytes, prompt: str) -> str:
+    async def identify(self, image: Payload, prompt: str, timeout: Optional[float] = None) -> str:
         """Send image + prompt through LiteLLM and return raw text."""
-        image_b64 = ImageProcessor.encode_image(image_bytes)
-        data_url = f"data:image/jpeg;base64,{image_b64}"
-
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": data_url},
-                    },
-                ],
-            }
-        ]
+        # Built on the payload's first attempt and reused by its retries
+        data_url = Payload.of(image).data_url
 
+        messages = self.build_messages(prompt, data_url)
+        metrics.UPSTREAM_BYTES.inc(len(data_url) + len(prompt), provider="litellm",
+                                   model=metrics.model_label(self.model))
+
+        kwargs = dict(self._client_kwargs)
+        if timeout is not None:
+            kwargs["timeout"] = timeout
         response = await litellm.acompletion(
             model=self.model,
             messages=messages,
             max_tokens=4000,
             temperature=0.1,
+            **kwargs,
         )
 
+        self._record_usage(response)
         text = response.choices[0].message.content
         logger.debug("LiteLLM response: %s", text[:500] if text else "")
         return text or ""
+
+    def build_messages(self, prompt: str, data_url: str) -> list[dict]:
+        """Chat messages for *prompt* and the image, static instructions first."""
+        instructions, rest = PromptBuilder.split(prompt)
+        image_part = {"type": "image_url", "image_url": {"url": data_url}}
+        if not instructions:
+            return [{"role": "user", "content": [{"type": "text", "text": prompt}, image_part]}]
+        system: dict[str, Any] = {"type": "text", "text": instructions}
+        if self.mark_cacheable:
+            system["cache_control"] = {"type": "ephemeral"}
+        content = [{"type": "text", "text": rest}, image_part] if rest else [image_part]
+        return [{"role": "system", "content": [system]}, {"role": "user", "content": content}]
+
+    def _record_usage(self, response: Any) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or getattr(usage, "cache_read_input_tokens", 0)
+        written = getattr(usage, "cache_creation_input_tokens", 0)
+        record_usage(
+            "litellm",
+            self.model,
+            getattr(usage, "prompt_tokens", 0),
+            getattr(usage, "completion_tokens", 0),
+            cached,
+            written,
+        )
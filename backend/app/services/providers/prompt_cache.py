@@ -0,0 +1,109 @@
+"""
+Provider-side caching of the static identification prompt.
+
+Every identification sends the same instruction block
+(``PromptBuilder.TEMPLATE``) ahead of the image.  Providers can process and
+bill that prefix once:
+
+* Gemini keeps it as explicit *cached content*, referenced by a handle
+  that expires after a TTL.  ``PromptCache`` holds those handles for the
+  process (providers are built per request), refreshes them before they
+  expire and backs off when the provider refuses one, e.g. because the
+  prompt is below the model's minimum cacheable size.
+* Anthropic caches a prefix marked with ``cache_control`` (LiteLLM passes
+  the marker through); no handle is needed.
+* OpenAI caches identical prefixes automatically; the instructions only
+  need to come first, before the image.
+
+Providers report cache reads and writes in their usage data, which
+``usage.record_usage`` exports as ``coinscope_provider_input_tokens_total``.
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    handle: Optional[Any]
+    expires_at: float
+
+
+class PromptCache:
+    """Process-wide provider cache handles, by key, with their expiry."""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        ttl: float = 3600.0,
+        refresh_margin: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.enabled = enabled
+        self.ttl = ttl
+        # Handles are refreshed once they have less than this left to live
+        self.refresh_margin = min(refresh_margin, ttl / 2)
+        self._clock = clock
+        self._entries: dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "PromptCache":
+        return cls(
+            enabled=os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true",
+            ttl=float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600")),
+            refresh_margin=float(os.getenv("PROMPT_CACHE_REFRESH_SECONDS", "300")),
+        )
+
+    def __len__(self) -> int:
+        return sum(1 for entry in self._entries.values() if entry.handle is not None)
+
+    def handle(
+        self,
+        key: str,
+        create: Callable[[float], Any],
+        refresh: Optional[Callable[[Any, float], Any]] = None,
+    ) -> Optional[Any]:
+        """The live handle for *key*, creating or refreshing it as needed.
+
+        *create(ttl)* returns a new handle; *refresh(handle, ttl)* extends
+        one and returns it.  Both may block (they call the provider), so
+        call this off the event loop.  Returns None -- send the prompt
+        uncached -- when caching is disabled or the provider refused a
+        handle within the last TTL.
+        """
+        if not self.enabled:
+            return None
+        # Held while the provider is called, so concurrent requests wait for
+        # one new handle instead of each creating their own
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at - now > self.refresh_margin:
+                return entry.handle
+            handle = None
+            try:
+                if entry is not None and entry.handle is not None and refresh is not None:
+                    try:
+                        handle = refresh(entry.handle, self.ttl)
+                    except Exception:
+                        logger.info("Refreshing prompt cache %s failed; recreating it", key)
+                if handle is None:
+                    handle = create(self.ttl)
+            except Exception as exc:
+                # Retried after a TTL, not on every call
+                logger.warning("Provider refused a prompt cache for %s: %s", key, exc)
+            self._entries[key] = _Entry(handle, now + self.ttl)
+            return handle
+
+    def invalidate(self, key: str) -> None:
+        """Forget *key*'s handle, e.g. after the provider reports it gone."""
+        with self._lock:
+            self._entries.pop(key, None)
+
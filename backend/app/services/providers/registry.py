@@ -0,0 +1,92 @@
+"""
+Lazy registry of VLM provider implementations.
+
+Provider modules pull in heavy SDKs (litellm alone takes seconds to import),
+so they are imported on first use instead of at application start.  SDK
+availability is checked with ``importlib.util.find_spec``, which locates a
+package without executing it.
+"""
+
+import importlib
+import importlib.util
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from .base import BaseVLMProvider
+from .prompt_cache import PromptCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ProviderSpec:
+    """Where a provider class lives and which SDK it needs."""
+
+    name: str
+    module: str  # relative to this package
+    class_name: str
+    requires: str  # top-level SDK module
+
+
+PROVIDERS: dict[str, ProviderSpec] = {
+    "gemini": ProviderSpec("gemini", ".gemini", "GeminiProvider", "google.generativeai"),
+    "litellm": ProviderSpec("litellm", ".litellm_provider", "LiteLLMProvider", "litellm"),
+}
+
+
+class ProviderRegistry:
+    """Imports provider classes on demand and caches them.
+
+    It also owns the process's provider-side prompt cache handles, which
+    outlive the per-request provider instances.
+    """
+
+    def __init__(
+        self, specs: dict[str, ProviderSpec] = PROVIDERS, prompt_cache: Optional[PromptCache] = None
+    ) -> None:
+        self.specs = dict(specs)
+        self.prompt_cache = prompt_cache or PromptCache.from_env()
+        self._loaded: dict[str, type[BaseVLMProvider]] = {}
+        self._lock = threading.Lock()
+
+    def is_available(self, name: str) -> bool:
+        """Return True if *name*'s SDK is installed (without importing it)."""
+        spec = self.specs[name]
+        try:
+            return importlib.util.find_spec(spec.requires) is not None
+        except (ImportError, ValueError):
+            return False
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def load(self, name: str) -> type[BaseVLMProvider]:
+        """Import and return the provider class registered as *name*."""
+        provider_cls = self._loaded.get(name)
+        if provider_cls is not None:
+            return provider_cls
+        spec = self.specs[name]
+        with self._lock:
+            if name not in self._loaded:
+                module = importlib.import_module(spec.module, __package__)
+                self._loaded[name] = getattr(module, spec.class_name)
+                logger.debug("Loaded VLM provider %s", name)
+        return self._loaded[name]
+
+    def warm_up(self, *names: str) -> list[str]:
+        """Import the named (default: all available) providers; return those loaded."""
+        loaded = []
+        for name in names or tuple(self.specs):
+            if not self.is_available(name):
+                continue
+            try:
+                self.load(name)
+                loaded.append(name)
+            except Exception:
+                logger.exception("Failed to warm up VLM provider %s", name)
+        return loaded
+
+
+registry = ProviderRegistry()
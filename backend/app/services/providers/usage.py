@@ -0,0 +1,70 @@
+"""
+Token usage reported by providers.
+
+Providers call :func:`record_usage` with the token counts of each response.
+They are exported as ``coinscope_provider_input_tokens_total`` (split by
+prompt-cache use) and ``coinscope_provider_output_tokens_total``, and added
+to the :class:`CallUsage` bound by :func:`collect`, which VLMService wraps
+around each provider call so the model router can price it.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from .. import metrics
+
+_current: ContextVar[Optional["CallUsage"]] = ContextVar("coinscope_call_usage", default=None)
+
+
+@dataclass
+class CallUsage:
+    """Tokens of one provider call."""
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # Input tokens served from / written to the provider's prompt cache
+    cached_tokens: int = 0
+    written_tokens: int = 0
+
+    @property
+    def reported(self) -> bool:
+        return bool(self.input_tokens or self.output_tokens)
+
+
+@contextmanager
+def collect() -> Iterator[CallUsage]:
+    """Bind a CallUsage for the provider call made inside the block."""
+    usage = CallUsage()
+    token = _current.set(usage)
+    try:
+        yield usage
+    finally:
+        _current.reset(token)
+
+
+def record_usage(
+    provider: str,
+    model: str,
+    input_tokens: Optional[int],
+    output_tokens: Optional[int] = 0,
+    cached: Optional[int] = 0,
+    written: Optional[int] = 0,
+) -> None:
+    """Count a call's tokens; *input_tokens* includes the cached and written ones."""
+    input_tokens, output_tokens = input_tokens or 0, output_tokens or 0
+    cached, written = cached or 0, written or 0
+    uncached = max(0, input_tokens - cached - written)
+    model = metrics.model_label(model)
+    for cache, tokens in (("read", cached), ("write", written), ("none", uncached)):
+        if tokens:
+            metrics.PROVIDER_INPUT_TOKENS.inc(tokens, provider=provider, model=model, cache=cache)
+    if output_tokens:
+        metrics.PROVIDER_OUTPUT_TOKENS.inc(output_tokens, provider=provider, model=model)
+    usage = _current.get()
+    if usage is not None:
+        usage.input_tokens += input_tokens
+        usage.output_tokens += output_tokens
+        usage.cached_tokens += cached
+        usage.written_tokens += written
@@ -0,0 +1,209 @@
+"""
+Per-API-key, cost-weighted quotas.
+
+Clients identify themselves with an ``X-API-Key`` header that maps to a tier;
+requests without a key fall back to the anonymous tier keyed by remote
+address.  Each tier has a request-rate limit (enforced by slowapi) and a
+per-minute cost budget.  Every provider attempt is charged *before* it is
+made, by an estimate derived from the payload's pixel count and the model's
+price tier, so retries and heavy images draw down the budget while light
+clients can burst.  Budgets live in the same ``limits`` storage as the
+request limiter and are therefore shared across workers.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Request
+from limits import RateLimitItemPerMinute
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+from slowapi.util import get_remote_address
+
+from .image_processor import ImageProcessor
+
+API_KEY_HEADER = "X-API-Key"
+
+
+@dataclass(frozen=True)
+class QuotaTier:
+    """Request-rate and cost budget granted to a class of clients."""
+
+    name: str
+    requests_per_minute: int
+    cost_per_minute: int
+
+
+DEFAULT_TIERS: dict[str, QuotaTier] = {
+    "anonymous": QuotaTier("anonymous", requests_per_minute=10, cost_per_minute=300),
+    "free": QuotaTier("free", requests_per_minute=20, cost_per_minute=600),
+    "pro": QuotaTier("pro", requests_per_minute=120, cost_per_minute=6000),
+}
+
+
+@dataclass(frozen=True)
+class ClientIdentity:
+    """The rate-limit key and tier of the calling client."""
+
+    key: str
+    tier: QuotaTier
+
+
+class InvalidAPIKeyError(Exception):
+    """Raised when a request presents an unknown API key."""
+
+
+class QuotaExceededError(Exception):
+    """Raised when a client's cost budget cannot cover the next provider call."""
+
+    def __init__(self, client: ClientIdentity, retry_after: int) -> None:
+        super().__init__(f"Quota exceeded for {client.key} (tier {client.tier.name})")
+        self.client = client
+        self.retry_after = retry_after
+
+
+class CostEstimator:
+    """Estimates the cost units of one provider call."""
+
+    BASE_COST = 2.0
+    COST_PER_MEGAPIXEL = 2.0
+
+    # First match wins, so more specific names come first.  Needles must
+    # start a word ("mini" matches "gpt-4o-mini" but not "gemini").
+    MODEL_MULTIPLIERS: tuple[tuple[str, float], ...] = (
+        ("flash-lite", 0.5),
+        ("mini", 0.5),
+        ("haiku", 0.5),
+        ("lite", 0.5),
+        ("flash", 1.0),
+        ("opus", 6.0),
+        ("pro", 4.0),
+        ("gpt-4", 3.0),
+        ("sonnet", 2.0),
+    )
+    DEFAULT_MULTIPLIER = 2.0
+
+    @classmethod
+    def model_multiplier(cls, model: str) -> float:
+        name = model.lower()
+        for needle, multiplier in cls.MODEL_MULTIPLIERS:
+            if re.search(rf"(?<![a-z]){re.escape(needle)}", name):
+                return multiplier
+        return cls.DEFAULT_MULTIPLIER
+
+    @classmethod
+    def estimate(cls, pixels: int, model: str) -> int:
+        """Return the integer cost of sending *pixels* to *model* once."""
+        megapixels = pixels / 1_000_000
+        raw = (cls.BASE_COST + cls.COST_PER_MEGAPIXEL * megapixels) * cls.model_multiplier(model)
+        return max(1, math.ceil(round(raw, 3)))
+
+
+class QuotaManager:
+    """Maps API keys to tiers and enforces cost budgets."""
+
+    def __init__(
+        self,
+        api_keys: Optional[dict[str, str]] = None,
+        tiers: Optional[dict[str, QuotaTier]] = None,
+        storage_uri: str = "memory://",
+    ) -> None:
+        self.tiers = dict(tiers or DEFAULT_TIERS)
+        # Only key digests are kept, never the raw secrets.
+        self._keys: dict[str, QuotaTier] = {
+            self._key_id(key): self.tiers[tier] for key, tier in (api_keys or {}).items()
+        }
+        self._limiter = SlidingWindowCounterRateLimiter(storage_from_string(storage_uri))
+
+    @classmethod
+    def from_env(cls) -> "QuotaManager":
+        """Build from ``API_KEYS`` (``key:tier,...``) and optional ``QUOTA_TIERS`` JSON."""
+        tiers = dict(DEFAULT_TIERS)
+        for name, spec in json.loads(os.getenv("QUOTA_TIERS", "{}")).items():
+            tiers[name] = QuotaTier(name=name, **spec)
+        api_keys: dict[str, str] = {}
+        for pair in filter(None, os.getenv("API_KEYS", "").split(",")):
+            key, _, tier = pair.strip().partition(":")
+            api_keys[key] = tier or "free"
+        return cls(
+            api_keys=api_keys,
+            tiers=tiers,
+            storage_uri=os.getenv("RATE_LIMIT_STORAGE_URI", "memory://"),
+        )
+
+    @staticmethod
+    def _key_id(api_key: str) -> str:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+    # ------------------------------------------------------------------
+    # Client identification
+    # ------------------------------------------------------------------
+
+    def identify(self, request: Request) -> ClientIdentity:
+        """Resolve the caller's identity; raise InvalidAPIKeyError for unknown keys."""
+        api_key = request.headers.get(API_KEY_HEADER)
+        if api_key:
+            key_id = self._key_id(api_key)
+            tier = self._keys.get(key_id)
+            if tier is None:
+                raise InvalidAPIKeyError(key_id)
+            return ClientIdentity(key=key_id, tier=tier)
+        return ClientIdentity(key=get_remote_address(request), tier=self.tiers["anonymous"])
+
+    def client_key(self, request: Request) -> str:
+        """slowapi key function: API key identity, else remote address."""
+        try:
+            return self.identify(request).key
+        except InvalidAPIKeyError:
+            return get_remote_address(request)
+
+    def request_limit(self, key: str) -> str:
+        """slowapi limit provider: the request-rate limit of *key*'s tier."""
+        tier = self._keys.get(key, self.tiers["anonymous"])
+        return f"{tier.requests_per_minute}/minute"
+
+    # ------------------------------------------------------------------
+    # Cost budget
+    # ------------------------------------------------------------------
+
+    def charge(self, client: ClientIdentity, cost: int) -> None:
+        """Deduct *cost* from *client*'s budget or raise QuotaExceededError.
+
+        A single call is capped at the full budget so oversized requests can
+        still run on a fresh window rather than being refused forever.
+        """
+        item = RateLimitItemPerMinute(client.tier.cost_per_minute, namespace="COST")
+        if not self._limiter.hit(item, client.key, cost=min(cost, item.amount)):
+            stats = self._limiter.get_window_stats(item, client.key)
+            retry_after = max(1, math.ceil(stats.reset_time - time.time()))
+            raise QuotaExceededError(client, retry_after)
+
+    def account(self, client: ClientIdentity) -> "QuotaAccount":
+        return QuotaAccount(self, client)
+
+
+class QuotaAccount:
+    """A client's budget bound to one request, charged per provider attempt."""
+
+    def __init__(self, manager: QuotaManager, client: ClientIdentity) -> None:
+        self.manager = manager
+        self.client = client
+        self.charged = 0
+
+    def charge_image(self, image_bytes: bytes, model: str) -> int:
+        """Charge one provider call carrying *image_bytes*; return its cost."""
+        try:
+            width, height = ImageProcessor.get_dimensions(image_bytes)
+        except Exception:
+            width = height = 0  # undecodable here; the provider call decides
+        cost = CostEstimator.estimate(width * height, model)
+        self.manager.charge(self.client, cost)
+        self.charged += cost
+        return cost
+
@@ -0,0 +1,63 @@
+"""
+Crop-and-refine second pass for low-confidence coins.
+
+In a multi-coin photo every coin gets only a small share of the image the
+provider sees.  Instead of resubmitting the whole photo, VLMService crops
+each uncertain coin from the full-resolution upload by its bbox and
+re-identifies only those crops, concurrently.
+"""
+
+import os
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Sequence
+
+from PIL import Image
+
+from .bbox import Box
+from .image_processor import ImagePipeline, ImageSource
+
+
+@dataclass(frozen=True)
+class RefineConfig:
+    """Which coins are refined and how their crops are cut."""
+
+    # Coins below this confidence are re-identified; 0 disables refining
+    below_confidence: float = 0.5
+    # Crop grown by this fraction of the bbox on every side
+    padding: float = 0.15
+    max_coins: int = 8
+    concurrency: int = 4
+    # Longest side of a refine crop (pixels)
+    max_size: int = 1024
+
+    @classmethod
+    def from_env(cls) -> "RefineConfig":
+        return cls(
+            below_confidence=float(os.getenv("REFINE_BELOW_CONFIDENCE", "0.5")),
+            padding=float(os.getenv("REFINE_PADDING", "0.15")),
+            max_coins=int(os.getenv("REFINE_MAX_COINS", "8")),
+            concurrency=int(os.getenv("REFINE_CONCURRENCY", "4")),
+            max_size=int(os.getenv("REFINE_MAX_SIZE", "1024")),
+        )
+
+
+REFINE = RefineConfig.from_env()
+
+
+def crop_coins(image: ImageSource, boxes: Sequence[Box], config: RefineConfig = REFINE) -> list[bytes]:
+    """Cut a padded JPEG crop per normalised box from the full-resolution *image*."""
+    crops = []
+    img = ImagePipeline.of(image).decoded()
+    width, height = img.size
+    for x0, y0, x1, y1 in boxes:
+        dx, dy = (x1 - x0) * config.padding, (y1 - y0) * config.padding
+        left, top = max(0, round((x0 - dx) * width)), max(0, round((y0 - dy) * height))
+        right = max(left + 1, min(width, round((x1 + dx) * width)))
+        bottom = max(top + 1, min(height, round((y1 + dy) * height)))
+        crop = img.crop((left, top, right, bottom))
+        crop.thumbnail((config.max_size, config.max_size), Image.Resampling.LANCZOS)
+        output = BytesIO()
+        crop.save(output, format="JPEG", quality=92)
+        crops.append(output.getvalue())
+    return crops
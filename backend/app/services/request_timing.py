@@ -0,0 +1,94 @@
+"""
+Request-scoped stage timings for Server-Timing and debug responses.
+
+A :class:`RequestTimings` is bound to a context variable for the duration of
+one request.  ``metrics.stage`` adds every stage it times to the bound
+instance, and VLMService notes provider attempts and the winning image
+variant.  Outside a bound request, such as the image store's background
+thumbnailing, :func:`current` returns None and nothing is collected.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+_current: ContextVar[Optional["RequestTimings"]] = ContextVar(
+    "coinscope_request_timings", default=None
+)
+
+
+class RequestTimings:
+    """Accumulated stage durations and provider attempts for one request."""
+
+    # Server-Timing entry -> metrics stages summed into it.  ``encode`` runs
+    # inside the LiteLLM provider call, so preprocess and provider overlap.
+    SERVER_TIMING_GROUPS: dict[str, tuple[str, ...]] = {
+        "read": ("read",),
+        "preprocess": ("quality", "detect", "tile", "refine_crop", "resize", "compress", "encode"),
+        "provider": ("provider",),
+        "parse": ("parse_json", "parse_coins", "parse_boxes"),
+    }
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.stages: dict[str, float] = {}
+        self.attempts: list[dict] = []
+        self.variant: Optional[str] = None
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def note_attempt(self, variant: str, seconds: float, ok: bool) -> None:
+        """Record one provider attempt; the last successful one sets ``variant``."""
+        self.attempts.append({"variant": variant, "ms": round(seconds * 1000, 2), "ok": ok})
+        if ok:
+            self.variant = variant
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+    @property
+    def total_ms(self) -> float:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return (end - self.started) * 1000
+
+    def group_ms(self) -> dict[str, float]:
+        """Milliseconds per Server-Timing entry, including ``total``."""
+        grouped = {
+            name: sum(self.stages.get(stage, 0.0) for stage in stages) * 1000
+            for name, stages in self.SERVER_TIMING_GROUPS.items()
+        }
+        grouped["total"] = self.total_ms
+        return grouped
+
+    def server_timing(self) -> str:
+        """Render a ``Server-Timing`` header value."""
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.group_ms().items())
+
+    def breakdown(self) -> dict:
+        """JSON-friendly timing block for debug responses."""
+        return {
+            **{f"{name}_ms": round(ms, 2) for name, ms in self.group_ms().items()},
+            "stages_ms": {name: round(s * 1000, 2) for name, s in self.stages.items()},
+            "attempts": list(self.attempts),
+            "variant": self.variant,
+        }
+
+
+def current() -> Optional[RequestTimings]:
+    """Return the timings bound to the running request, if any."""
+    return _current.get()
+
+
+@contextmanager
+def collect() -> Iterator[RequestTimings]:
+    """Bind a fresh RequestTimings to the current context."""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        timings.finish()
+        _current.reset(token)
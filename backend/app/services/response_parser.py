@@ -7,18 +7,27 @@ into validated Coin model instances.
 
 import json
 import logging
+import os
 import re
 from typing import Optional
 
 from ..models.coin import Coin
+from . import bbox as boxes
+from . import metrics
+from .profiling import trace_allocations
 
 logger = logging.getLogger(__name__)
 
+# Coins whose boxes overlap more than this are the same coin reported twice
+BBOX_NMS_IOU = float(os.getenv("BBOX_NMS_IOU", "0.6"))
+
 
 class ResponseParser:
     """Parses raw VLM text into Coin objects."""
 
     @staticmethod
+    @metrics.timed("parse_json")
+    @trace_allocations
     def parse_json_response(response_text: str) -> list[dict]:
         """Extract a JSON array from a VLM response string.
 
@@ -52,6 +61,8 @@ class ResponseParser:
         return []
 
     @staticmethod
+    @metrics.timed("parse_coins")
+    @trace_allocations
     def parse_coins(coins_data: list[dict]) -> list[Coin]:
         """Convert raw dicts into validated Coin instances.
 
@@ -90,4 +101,31 @@ class ResponseParser:
             except Exception:
                 logger.warning("Skipping malformed coin entry: %s", entry)
                 continue
-        return coins
+        return ResponseParser.postprocess_boxes(coins)
+
+    @staticmethod
+    @metrics.timed("parse_boxes")
+    def postprocess_boxes(coins: list[Coin], iou_threshold: float = BBOX_NMS_IOU) -> list[Coin]:
+        """Clip and order every bbox, then drop duplicate coins.
+
+        Boxes are clipped to [0, 1] with x_min < x_max and y_min < y_max; a
+        box with no area inside the image is removed (the coin is kept).
+        Coins whose boxes overlap by more than *iou_threshold* IoU are the
+        same coin reported twice: only the most confident one is kept.
+        Input order is preserved.
+        """
+        boxed = [i for i, coin in enumerate(coins) if coin.bbox is not None]
+        if not boxed:
+            return coins
+        clipped, valid = boxes.sanitize([coins[i].bbox for i in boxed])
+        for i, box, ok in zip(boxed, clipped.tolist(), valid):
+            coins[i].bbox = box if ok else None
+
+        boxed = [i for i, is_valid in zip(boxed, valid) if is_valid]
+        keep = boxes.nms(
+            clipped[valid], [coins[i].confidence for i in boxed], iou_threshold
+        )
+        duplicates = set(boxed) - {boxed[k] for k in keep}
+        if duplicates:
+            logger.info("Dropped %d duplicate coin(s) by bbox overlap", len(duplicates))
+        return [coin for i, coin in enumerate(coins) if i not in duplicates]
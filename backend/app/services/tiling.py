@@ -0,0 +1,74 @@
+"""
+Tiling of very large coin-lot photos.
+
+Trays of 50-200 coins downscaled to a single 2048px image leave each coin a
+few dozen pixels wide, and one response cannot list them all within its
+token limit.  Tiled mode cuts the photo into overlapping tiles that are
+identified separately; VLMService maps each tile's boxes back to the full
+image and merges the coins seen twice in an overlap.
+"""
+
+import math
+import os
+from dataclasses import dataclass
+from io import BytesIO
+
+from .bbox import Box
+from .image_processor import ImagePipeline, ImageSource
+
+
+@dataclass(frozen=True)
+class TilingConfig:
+    """Tile geometry and parallelism for tiled identification."""
+
+    tile_size: int = 1536
+    overlap: float = 0.15
+    concurrency: int = 4
+    # Tile automatically from this longest side (pixels); 0 means only on request
+    auto_min_side: int = 0
+
+    @classmethod
+    def from_env(cls) -> "TilingConfig":
+        return cls(
+            tile_size=int(os.getenv("TILE_SIZE", "1536")),
+            overlap=float(os.getenv("TILE_OVERLAP", "0.15")),
+            concurrency=int(os.getenv("TILE_CONCURRENCY", "4")),
+            auto_min_side=int(os.getenv("TILE_AUTO_MIN_SIDE", "0")),
+        )
+
+
+TILING = TilingConfig.from_env()
+
+
+def _starts(length: int, tile: int, overlap: int) -> list[int]:
+    """Evenly spaced tile offsets covering *length* with at least *overlap*."""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - overlap) / (tile - overlap))
+    step = (length - tile) / (count - 1)
+    return [round(i * step) for i in range(count)]
+
+
+def plan_tiles(width: int, height: int, tile_size: int, overlap: float) -> list[tuple[int, int, int, int]]:
+    """Pixel boxes (left, top, right, bottom) of the tiles covering the image."""
+    margin = int(tile_size * overlap)
+    tile_w, tile_h = min(tile_size, width), min(tile_size, height)
+    return [
+        (left, top, left + tile_w, top + tile_h)
+        for top in _starts(height, tile_h, margin)
+        for left in _starts(width, tile_w, margin)
+    ]
+
+
+def cut_tiles(image: ImageSource, config: TilingConfig = TILING) -> list[tuple[bytes, Box]]:
+    """Split *image* into JPEG tiles with their normalised boxes."""
+    tiles = []
+    img = ImagePipeline.of(image).decoded()
+    width, height = img.size
+    for left, top, right, bottom in plan_tiles(width, height, config.tile_size, config.overlap):
+        output = BytesIO()
+        img.crop((left, top, right, bottom)).save(output, format="JPEG", quality=92)
+        tiles.append(
+            (output.getvalue(), (left / width, top / height, right / width, bottom / height))
+        )
+    return tiles
@@ -8,15 +8,32 @@ ResponseParser into a single high-level `identify_coins` call.
 import asyncio
 import logging
 import os
-from typing import Optional
+import time
+from typing import TYPE_CHECKING, Optional
 
 from ..models.coin import Coin
-from .image_processor import ImageProcessor
+from . import deadline as request_deadline
+from . import metrics, request_timing
+from .bbox import FULL_FRAME, Box, nms, to_full_frame
+from .coin_detector import CoinDetector, Detection
+from .deadline import DEADLINES, Deadline, DeadlineExceededError
+from .feature_index import FeatureIndex
+from .decode_sandbox import DecodeSandbox
+from .image_encoder import ENCODE_BUDGET, EncodeBudget, EncodedImage
+from .image_processor import Decoder, ImagePipeline, ImageSource
+from .model_router import ModelRouter
+from .payload import Payload
 from .prompt_builder import PromptBuilder
+from .quota import QuotaAccount
+from .refine import REFINE, crop_coins
 from .response_parser import ResponseParser
+from .providers import usage
 from .providers.base import BaseVLMProvider
-from .providers.gemini import GeminiProvider
-from .providers.litellm_provider import LiteLLMProvider
+from .providers.registry import registry
+from .tiling import TILING, cut_tiles
+
+if TYPE_CHECKING:  # httpx is only imported once a pool is created
+    from .http_pool import HttpPool
 
 logger = logging.getLogger(__name__)
 
@@ -29,55 +46,274 @@ class VLMService:
     MAX_RETRIES = 3
     RETRY_DELAY_SECONDS = 2
 
+    # Optional app-scoped collaborators, attached per request by the router
+    feature_index: Optional[FeatureIndex] = None
+    quota: Optional[QuotaAccount] = None
+    decode_sandbox: Optional[DecodeSandbox] = None
+    coin_detector: Optional[CoinDetector] = None
+    http_pool: Optional["HttpPool"] = None
+    model_router: Optional[ModelRouter] = None
+
     def __init__(self, model: Optional[str] = None) -> None:
         self.model = model or os.getenv("VLM_MODEL", "gemini/gemini-flash-latest")
-        self._provider = self._build_provider()
+        # An explicitly requested model is never rerouted
+        self.model_pinned = model is not None
+        # Built on first identification, so constructing a service (as the
+        # /health and /providers endpoints do) never imports a provider SDK.
+        self._provider: Optional[BaseVLMProvider] = None
 
     # ------------------------------------------------------------------
     # Provider factory
     # ------------------------------------------------------------------
 
+    @staticmethod
+    def provider_name(model: str) -> str:
+        """Registry name of the provider that serves *model*."""
+        if "gemini" in model.lower() and registry.is_available("gemini"):
+            return "gemini"
+        return "litellm"
+
+    def route(self) -> str:
+        """Let the model router choose this service's model, once.
+
+        Called as identification starts, since the payload budget depends
+        on the model; the provider built next serves the chosen model.
+        """
+        if self.model_router is not None and not self.model_pinned and self._provider is None:
+            self.model = self.model_router.choose()
+            self.model_pinned = True
+        return self.model
+
     def _build_provider(self) -> BaseVLMProvider:
         """Select and instantiate the appropriate provider."""
-        if self._is_gemini_model() and GeminiProvider.is_available():
-            model_name = GeminiProvider.extract_model_name(self.model)
-            return GeminiProvider(model_name)
-        return LiteLLMProvider(self.model)
+        self.route()
+        name = self.provider_name(self.model)
+        provider_cls = registry.load(name)
+        if name == "gemini":
+            # The Gemini SDK speaks gRPC over its own cached channel
+            return provider_cls(
+                provider_cls.extract_model_name(self.model), prompt_cache=registry.prompt_cache
+            )
+        return provider_cls(self.model, http_pool=self.http_pool, prompt_cache=registry.prompt_cache)
 
-    def _is_gemini_model(self) -> bool:
-        return "gemini" in self.model.lower()
+    async def _get_provider(self) -> BaseVLMProvider:
+        if self._provider is None:
+            # The first use may import the SDK; keep that off the event loop.
+            self._provider = await asyncio.to_thread(self._build_provider)
+        return self._provider
 
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
 
-    async def identify_coins(self, image_bytes: bytes) -> tuple[list[Coin], str]:
-        """Identify coins in *image_bytes* and return (coins, model_used)."""
+    async def identify_coins(
+        self, image: ImageSource, tiled: Optional[bool] = None
+    ) -> tuple[list[Coin], str]:
+        """Identify coins in *image* and return (coins, model_used).
+
+        *image* is the upload's bytes or the request's ImagePipeline, whose
+        decoded pixels every preprocessing stage shares.  *tiled* forces
+        tiled identification on or off; by default large images are tiled
+        from TILE_AUTO_MIN_SIDE pixels, when configured.
+        """
+        self.route()
+        with metrics.model_context(self.model), metrics.stage("identify"):
+            return await self._identify_coins(ImagePipeline.of(image, self._decoder()), tiled)
+
+    @staticmethod
+    def _note_attempt(variant: str, started: float, ok: bool) -> None:
+        """Add a provider attempt to the request's timings, when collected."""
+        timings = request_timing.current()
+        if timings is not None:
+            timings.note_attempt(variant, time.perf_counter() - started, ok)
+
+    @staticmethod
+    def _out_of_time(deadline: Optional[Deadline]) -> bool:
+        """True if *deadline* leaves too little time to start a provider call."""
+        return deadline is not None and deadline.remaining() < DEADLINES.min_attempt_seconds
+
+    def _attempt_timeout(
+        self, deadline: Optional[Deadline], cause: Optional[Exception] = None, delay: float = 0.0
+    ) -> Optional[float]:
+        """Timeout of a provider call starting after *delay*: the deadline's remaining budget.
+
+        Raises DeadlineExceededError (from *cause*, the last failure) when
+        too little would be left for the call to finish.
+        """
+        if deadline is None:
+            return None
+        remaining = deadline.remaining() - delay
+        if remaining < DEADLINES.min_attempt_seconds:
+            metrics.DEADLINE_EXCEEDED.inc(model=metrics.model_label(self.model))
+            raise DeadlineExceededError(
+                f"{deadline.remaining():.1f}s left of the {deadline.budget:g}s request deadline"
+            ) from cause
+        return remaining
+
+    def _record_call(self, started: float, ok: bool, call_usage: usage.CallUsage) -> None:
+        """Report a provider call (and its parse) to the model router, if any."""
+        if self.model_router is not None:
+            self.model_router.record(self.model, time.perf_counter() - started, ok, call_usage)
+
+    @staticmethod
+    def _cut_short(started: float, timeout: Optional[float]) -> bool:
+        """True if an attempt ran for all of the time the deadline allowed it."""
+        return timeout is not None and time.perf_counter() - started >= timeout
+
+    def _decoder(self) -> Optional[Decoder]:
+        """Decode in the sandbox's workers when it is enabled, else in-process."""
+        return self.decode_sandbox.decode if self.decode_sandbox is not None else None
+
+    async def _encode(self, source: ImagePipeline, budget: EncodeBudget) -> EncodedImage:
+        if self.decode_sandbox is not None:
+            # The sandboxed worker decodes its own copy, out of this process
+            return await self.decode_sandbox.encode(source.data, budget)
+        return source.encoded(budget)
+
+    @staticmethod
+    def _fits(source: ImagePipeline, budget: EncodeBudget) -> bool:
+        """True if the upload itself is already within the payload budget."""
+        return len(source.data) <= budget.max_bytes and max(source.size) <= budget.max_size
+
+    def _should_tile(self, pipeline: ImagePipeline, tiled: Optional[bool]) -> bool:
+        if tiled is not None:
+            return tiled
+        if not TILING.auto_min_side:
+            return False
+        return max(pipeline.size) >= TILING.auto_min_side
+
+    async def _identify_coins(
+        self, pipeline: ImagePipeline, tiled: Optional[bool] = None
+    ) -> tuple[list[Coin], str]:
+        if self._should_tile(pipeline, tiled):
+            # Tiles are cut from the full-resolution image, so check it whole
+            pipeline.check_budget()
+            return await self._identify_tiled(pipeline)
+
+        # Refuse decompression bombs before anything decodes the pixels
+        budget = ENCODE_BUDGET.for_model(self.model)
+        pipeline.check_budget(max_size=budget.max_size)
+
+        # Find candidate coins, or answer "no coins" without a provider call
+        detection: Optional[Detection] = None
+        if self.coin_detector is not None:
+            with metrics.stage("detect"):
+                detection = await asyncio.to_thread(self.coin_detector.detect, pipeline)
+            if not detection and self.coin_detector.skip_empty:
+                logger.info("No coin candidates found; skipping the provider")
+                return [], CoinDetector.MODEL_NAME
+
+        # Answer each candidate (or the whole frame) from the index where it
+        # matches; only the unmatched candidates go to the provider
+        matched: list[Coin] = []
+        if self.feature_index is not None:
+            boxes = list(detection.boxes) if detection else [FULL_FRAME]
+            with metrics.stage("feature_match"):
+                answers = await asyncio.to_thread(self.feature_index.match_each, pipeline, boxes)
+            matched = [coin for coin in answers if coin is not None]
+            if len(matched) == len(boxes):
+                logger.info("Answered %d coin(s) from the local feature index", len(matched))
+                return matched, FeatureIndex.MODEL_NAME
+            if matched:
+                detection = Detection([box for box, coin in zip(boxes, answers) if coin is None])
+
+        source, crop = pipeline, FULL_FRAME
+        if detection:
+            with metrics.stage("detect"):
+                cropped, crop = await asyncio.to_thread(self.coin_detector.crop, pipeline, detection)
+            if crop != FULL_FRAME:
+                source = ImagePipeline(cropped, decoder=pipeline.decoder)
+
+        provider = await self._get_provider()
         prompt = PromptBuilder.build()
 
-        # Prepare image variants (original + resized fallback)
-        processed = ImageProcessor.resize_image(image_bytes, max_size=2048)
-        variants = [("original", image_bytes)]
-        if processed != image_bytes:
-            variants.append(("resized", processed))
+        # Send the upload as-is only when it is within the payload budget;
+        # otherwise the budget-encoded copy goes first and the original is
+        # the fallback for an empty answer.  Each variant's Payload is built
+        # once and reused by all of its attempts.
+        encoded = await self._encode(source, budget)
+        variants = [("original", Payload(source.data, source.media_type))]
+        if encoded.data != source.data:
+            resized = Payload(encoded.data, encoded.media_type)
+            variants.insert(1 if self._fits(source, budget) else 0, ("resized", resized))
 
+        coins_data = await self._attempt_variants(provider, prompt, variants)
+        coins = ResponseParser.parse_coins(coins_data)
+        if crop != FULL_FRAME:
+            for coin in coins:
+                coin.bbox = to_full_frame(coin.bbox, crop)
+        await self._refine(provider, pipeline, coins)
+        if self.feature_index is not None:
+            with metrics.stage("feature_index"):
+                await asyncio.to_thread(
+                    self.feature_index.add_confirmed, pipeline, coins, whole_frame=not matched
+                )
+        if matched:
+            # The provider may also have seen matched coins inside the crop
+            coins = self.merge_tiles(matched + coins)
+        return coins, self.model
+
+    async def _attempt_variants(
+        self,
+        provider: BaseVLMProvider,
+        prompt: str,
+        variants: list[tuple[str, Payload]],
+    ) -> list[dict]:
+        """Try each payload variant with retries; return the first non-empty result.
+
+        Every call is limited to what is left of the request deadline, and
+        no attempt starts (nor retry delay elapses) without enough of it.
+        """
         coins_data: list[dict] = []
         last_error: Optional[Exception] = None
+        deadline = request_deadline.current()
 
-        for variant_name, payload in variants:
+        for index, (variant_name, payload) in enumerate(variants):
+            if index:
+                if self._out_of_time(deadline):
+                    # An empty answer beats none at all
+                    logger.info("No time left to try the %s payload", variant_name)
+                    break
+                metrics.VARIANT_ESCALATIONS.inc(
+                    model=metrics.model_label(self.model), variant=variant_name
+                )
+            answered = False
             for attempt in range(self.MAX_RETRIES):
+                if answered and self._out_of_time(deadline):
+                    break
+                timeout = self._attempt_timeout(deadline, last_error)
+                if attempt:
+                    metrics.PROVIDER_RETRIES.inc(model=metrics.model_label(self.model))
+                # Charged before every attempt; QuotaExceededError is not retried.
+                if self.quota is not None:
+                    self.quota.charge_image(payload.data, self.model)
+                started = time.perf_counter()
+                call_usage = usage.CallUsage()
                 try:
-                    response_text = await self._provider.identify(payload, prompt)
+                    with metrics.stage("provider"), usage.collect() as call_usage:
+                        # wait_for also bounds SDKs that only time out between reads
+                        response_text = await asyncio.wait_for(
+                            provider.identify(payload, prompt, timeout=timeout), timeout
+                        )
                     coins_data = ResponseParser.parse_json_response(response_text)
+                    answered = True
+                    self._record_call(started, True, call_usage)
+                    self._note_attempt(variant_name, started, ok=bool(coins_data))
                     if coins_data:
                         break
                 except Exception as exc:
+                    # A call that used up its share of the deadline says
+                    # nothing about the model; only other failures count
+                    if not self._cut_short(started, timeout):
+                        self._record_call(started, False, call_usage)
+                    self._note_attempt(variant_name, started, ok=False)
                     last_error = exc
                     logger.warning(
                         "Attempt %d/%d (%s) failed: %s",
                         attempt + 1, self.MAX_RETRIES, variant_name, exc,
                     )
                     if attempt < self.MAX_RETRIES - 1:
+                        self._attempt_timeout(deadline, exc, delay=self.RETRY_DELAY_SECONDS)
                         await asyncio.sleep(self.RETRY_DELAY_SECONDS)
                         continue
                     raise
@@ -87,5 +323,96 @@ class VLMService:
             if last_error:
                 raise last_error
 
-        coins = ResponseParser.parse_coins(coins_data)
+        return coins_data
+
+    async def _identify_tiled(self, pipeline: ImagePipeline) -> tuple[list[Coin], str]:
+        """Identify overlapping tiles concurrently and merge their coins."""
+        with metrics.stage("tile"):
+            tiles = await asyncio.to_thread(cut_tiles, pipeline, TILING)
+        provider = await self._get_provider()
+        prompt = PromptBuilder.build()
+        semaphore = asyncio.Semaphore(max(1, TILING.concurrency))
+
+        async def identify_tile(tile_bytes: bytes, box: Box) -> list[Coin]:
+            async with semaphore:
+                coins_data = await self._attempt_variants(
+                    provider, prompt, [("tile", Payload(tile_bytes, "image/jpeg"))]
+                )
+            coins = ResponseParser.parse_coins(coins_data)
+            for coin in coins:
+                coin.bbox = to_full_frame(coin.bbox, box)
+            return coins
+
+        results = await asyncio.gather(
+            *(identify_tile(tile_bytes, box) for tile_bytes, box in tiles),
+            return_exceptions=True,
+        )
+        failures = [r for r in results if isinstance(r, BaseException)]
+        if len(failures) == len(results):
+            raise failures[0]
+        if failures:
+            logger.warning("%d of %d tiles failed: %s", len(failures), len(tiles), failures[0])
+        coins = [coin for r in results if not isinstance(r, BaseException) for coin in r]
+        logger.info("Tiled identification: %d tiles, %d coins before merging", len(tiles), len(coins))
+        coins = self.merge_tiles(coins)
+        await self._refine(provider, pipeline, coins)
         return coins, self.model
+
+    async def _refine(self, provider: BaseVLMProvider, pipeline: ImagePipeline, coins: list[Coin]) -> None:
+        """Re-identify low-confidence coins from full-resolution crops, in place.
+
+        A refined identification replaces the coin's fields (its bbox is
+        kept) only when it is more confident; a failed crop leaves the coin
+        as it was.
+        """
+        uncertain = sorted(
+            (c for c in coins if c.bbox and c.confidence < REFINE.below_confidence),
+            key=lambda c: c.confidence,
+        )[: REFINE.max_coins]
+        if not uncertain:
+            return
+        if self._out_of_time(request_deadline.current()):
+            logger.info("No time left to refine %d low-confidence coin(s)", len(uncertain))
+            return
+        with metrics.stage("refine_crop"):
+            crops = await asyncio.to_thread(
+                crop_coins, pipeline, [tuple(c.bbox) for c in uncertain], REFINE
+            )
+        prompt = PromptBuilder.build(single_coin=True)
+        semaphore = asyncio.Semaphore(max(1, REFINE.concurrency))
+
+        async def refine_coin(coin: Coin, crop_bytes: bytes) -> bool:
+            async with semaphore:
+                coins_data = await self._attempt_variants(
+                    provider, prompt, [("refine", Payload(crop_bytes, "image/jpeg"))]
+                )
+            candidates = ResponseParser.parse_coins(coins_data)
+            best = max(candidates, key=lambda c: c.confidence, default=None)
+            if best is None or best.confidence <= coin.confidence:
+                return False
+            for field, value in best.model_dump(exclude={"id", "bbox"}).items():
+                setattr(coin, field, value)
+            return True
+
+        results = await asyncio.gather(
+            *(refine_coin(coin, crop_bytes) for coin, crop_bytes in zip(uncertain, crops)),
+            return_exceptions=True,
+        )
+        failures = [r for r in results if isinstance(r, BaseException)]
+        if failures:
+            logger.warning("%d of %d refine crops failed: %s", len(failures), len(results), failures[0])
+        logger.info(
+            "Refined %d of %d low-confidence coin(s)", results.count(True), len(uncertain)
+        )
+
+    @staticmethod
+    def merge_tiles(coins: list[Coin]) -> list[Coin]:
+        """Drop coins seen again in a tile overlap, keeping the most confident.
+
+        Overlap is measured as intersection over the smaller box so that a
+        coin cut by one tile's edge merges into its whole box from the
+        neighbouring tile.  Coins without a bbox cannot be matched and are kept.
+        """
+        boxed = [coin for coin in coins if coin.bbox]
+        keep = nms([c.bbox for c in boxed], [c.confidence for c in boxed], 0.5, metric="ios")
+        return [boxed[i] for i in keep] + [coin for coin in coins if not coin.bbox]
@@ -0,0 +1,137 @@
+"""
+Payload encoding benchmark: bytes vs. fidelity (and, optionally, answers).
+
+Usage (from backend/):
+
+    python benchmarks/encoding.py                          # every image in ../testdata
+    python benchmarks/encoding.py --budgets 150 400 --formats webp jpeg avif
+    python benchmarks/encoding.py --identify               # also ask VLM_MODEL per payload
+
+Compares the previous payload (``resize_image``: 2048px JPEG quality 95)
+with byte-budgeted encodes per format and budget.  Reports payload size,
+encode time, PSNR against the 2048px reference and how faithfully fine
+detail survives: the correlation of the payload's Laplacian with the
+reference's (1.0 is intact; blur and compression artefacts both lower it),
+which is the band inscriptions live in.  With ``--identify`` every
+payload is sent to the provider and the coins it names are listed, which
+needs provider credentials and costs one call per payload.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.services.image_encoder import EncodeBudget, available_formats, fit  # noqa: E402
+from app.services.image_processor import ImagePipeline, ImageProcessor  # noqa: E402
+
+TESTDATA_DIR = BACKEND_DIR.parent / "testdata"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def _gray(data: bytes, size: tuple[int, int]) -> np.ndarray:
+    with Image.open(BytesIO(data)) as img:
+        img = img.convert("L")
+        if img.size != size:
+            img = img.resize(size, Image.Resampling.LANCZOS)
+        return np.asarray(img, dtype=np.float64)
+
+
+def _psnr(a: np.ndarray, b: np.ndarray) -> float:
+    mse = float(np.mean((a - b) ** 2))
+    return math.inf if mse == 0 else 10 * math.log10(255.0 ** 2 / mse)
+
+
+def _laplacian(gray: np.ndarray) -> np.ndarray:
+    return (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4.0 * gray[1:-1, 1:-1]
+    )
+
+
+def _detail(reference: np.ndarray, gray: np.ndarray) -> float:
+    return float(np.corrcoef(_laplacian(reference).ravel(), _laplacian(gray).ravel())[0, 1])
+
+
+def _row(name: str, data: bytes, seconds: float, reference: np.ndarray, baseline_bytes: int) -> dict:
+    gray = _gray(data, (reference.shape[1], reference.shape[0]))
+    with Image.open(BytesIO(data)) as img:
+        size = img.size
+    return {
+        "payload": name,
+        "format": ImageProcessor.get_media_type(data).split("/")[1],
+        "size": f"{size[0]}x{size[1]}",
+        "kb": round(len(data) / 1024, 1),
+        "vs_q95": round(len(data) / baseline_bytes, 3),
+        "encode_ms": round(seconds * 1000, 1),
+        "psnr_db": round(_psnr(reference, gray), 2),
+        "detail": round(_detail(reference, gray), 3),
+    }
+
+
+def bench_image(path: Path, budgets: list[int], formats: list[str]) -> tuple[list[dict], dict[str, bytes]]:
+    data = path.read_bytes()
+    reference_img = fit(ImagePipeline(data).decoded(), 2048).convert("L")
+    reference = np.asarray(reference_img, dtype=np.float64)
+
+    started = time.perf_counter()
+    baseline = ImageProcessor.resize_image(data, max_size=2048)
+    rows = [_row("q95 jpeg (before)", baseline, time.perf_counter() - started, reference, len(baseline))]
+    payloads = {"q95 jpeg (before)": baseline}
+
+    for fmt in formats:
+        for kb in budgets:
+            budget = EncodeBudget(max_bytes=kb * 1024, formats=(fmt,))
+            started = time.perf_counter()
+            encoded = ImagePipeline(data).encoded(budget)
+            name = f"{fmt.lower()} <= {kb} KB (q{encoded.quality})"
+            rows.append(_row(name, encoded.data, time.perf_counter() - started, reference, len(baseline)))
+            payloads[name] = encoded.data
+    return rows, payloads
+
+
+async def identify(payloads: dict[str, bytes]) -> dict[str, list[str]]:
+    from app.services.payload import Payload
+    from app.services.prompt_builder import PromptBuilder
+    from app.services.response_parser import ResponseParser
+    from app.services.vlm_service import VLMService
+
+    provider = await VLMService()._get_provider()
+    answers = {}
+    for name, data in payloads.items():
+        text = await provider.identify(Payload(data), PromptBuilder.build())
+        coins = ResponseParser.parse_coins(ResponseParser.parse_json_response(text))
+        answers[name] = [f"{c.name} {c.year or ''} ({c.confidence:.2f})".replace("  ", " ") for c in coins]
+    return answers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("images", nargs="*", type=Path, help=f"images (default: {TESTDATA_DIR})")
+    parser.add_argument("--budgets", nargs="+", type=int, default=[150, 400], help="budgets in KB")
+    parser.add_argument("--formats", nargs="+", default=["webp", "jpeg", "avif"])
+    parser.add_argument("--identify", action="store_true", help="send every payload to VLM_MODEL")
+    args = parser.parse_args()
+
+    images = args.images or sorted(p for p in TESTDATA_DIR.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    formats = available_formats(tuple(f.upper() for f in args.formats))
+    for path in images:
+        rows, payloads = bench_image(path, args.budgets, formats)
+        result = {"image": path.name, "upload_kb": round(path.stat().st_size / 1024, 1), "payloads": rows}
+        if args.identify:
+            result["answers"] = asyncio.run(identify(payloads))
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Payload memory benchmark: data-URL construction for a 20 MB upload.
+
+Usage (from backend/):
+
+    python benchmarks/payload_memory.py               # 20 MB upload, 3 attempts
+    python benchmarks/payload_memory.py --mb 10 --attempts 5
+
+Sends one large upload through ``LiteLLMProvider.identify`` as the original
+variant does when every attempt fails, with ``litellm.acompletion``
+replaced by a stub, so only our side of the request is measured (LiteLLM
+serialises the body again, in either case).  The previous construction --
+a fresh data URL per attempt -- is measured the same way.  Both build the
+URL the same way, so the first attempt costs about the same; the saving is
+on retries, which reuse the shared URL.  Reports the traced peak above the
+upload itself, the bytes allocated across all attempts (sum of per-attempt
+peaks) and the time per first attempt and per retry.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.services.image_processor import ImageProcessor  # noqa: E402
+from app.services.payload import Payload  # noqa: E402
+from app.services.providers.litellm_provider import LiteLLMProvider  # noqa: E402
+
+MB = 1024 * 1024
+RESPONSE = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="[]"))])
+
+
+def make_upload(target_bytes: int) -> bytes:
+    """A noise JPEG of roughly *target_bytes*; noise barely compresses."""
+    rng = np.random.default_rng(0)
+    side = int((target_bytes / 2.0) ** 0.5)
+    while True:
+        pixels = rng.integers(0, 256, (side, side, 3), dtype=np.uint8)
+        output = BytesIO()
+        Image.fromarray(pixels).save(output, format="JPEG", quality=95)
+        data = output.getvalue()
+        if len(data) >= target_bytes:
+            return data
+        side = int(side * (target_bytes / len(data)) ** 0.5) + 1
+
+
+async def _stub_completion(**kwargs):
+    return RESPONSE
+
+
+def legacy_data_url(image_bytes: bytes) -> str:
+    """The data URL as LiteLLMProvider built it before payloads were shared."""
+    image_b64 = base64.b64encode(image_bytes).decode("utf-8")
+    media_type = ImageProcessor.get_media_type(image_bytes)
+    return f"data:{media_type};base64,{image_b64}"
+
+
+def measure(name: str, attempt, attempts: int) -> dict:
+    peaks, seconds = [], []
+    tracemalloc.start()
+    for _ in range(attempts):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        asyncio.run(attempt())
+        seconds.append(time.perf_counter() - started)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return {
+        "construction": name,
+        "peak_mb": round(max(peaks) / MB, 1),
+        "allocated_mb": round(sum(peaks) / MB, 1),
+        "first_attempt_ms": round(seconds[0] * 1000, 1),
+        "retry_ms": round(sum(seconds[1:]) / max(1, len(seconds) - 1) * 1000, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=float, default=20, help="upload size in MB")
+    parser.add_argument("--attempts", type=int, default=3, help="attempts per variant")
+    args = parser.parse_args()
+
+    upload = make_upload(int(args.mb * MB))
+    provider = LiteLLMProvider("openai/gpt-4o")
+    prompt = "Identify the coins."
+
+    def legacy():
+        # A fresh Payload per attempt, with the old URL construction
+        async def attempt():
+            with patch.object(Payload, "data_url", property(lambda p: legacy_data_url(p.data))):
+                await provider.identify(Payload(upload), prompt)
+        return attempt
+
+    shared = Payload(upload)
+
+    async def payload_attempt():
+        await provider.identify(shared, prompt)
+
+    with patch("litellm.acompletion", _stub_completion):
+        rows = [
+            measure("b64encode + f-string per attempt (before)", legacy(), args.attempts),
+            measure("Payload.data_url, shared by retries", payload_attempt, args.attempts),
+        ]
+    print(json.dumps({"upload_mb": round(len(upload) / MB, 1), "attempts": args.attempts, "rows": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
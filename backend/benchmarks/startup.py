@@ -0,0 +1,83 @@
+"""
+Cold-start benchmark: time ``import app.main`` in fresh interpreters.
+
+Usage (from backend/):
+
+    python benchmarks/startup.py                # current tree
+    python benchmarks/startup.py --ref HEAD~1   # another git revision, for before/after
+
+Each run starts a new Python process, so nothing is cached in ``sys.modules``
+(bytecode caches on disk are warmed by one untimed run first).  Reports the
+min and median wall time and which provider SDKs the import pulled in.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+sdks = [m for m in ("litellm", "google.generativeai") if m in sys.modules]
+print(json.dumps({"seconds": elapsed, "sdks": sdks}))
+"""
+
+
+def measure(backend_dir: Path, runs: int) -> dict:
+    env = {**os.environ, "LITELLM_LOCAL_MODEL_COST_MAP": "True"}
+    command = [sys.executable, "-c", PROBE]
+    subprocess.run(command, cwd=backend_dir, env=env, check=True, capture_output=True)
+    results = []
+    for _ in range(runs):
+        out = subprocess.run(
+            command, cwd=backend_dir, env=env, check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    times = [r["seconds"] for r in results]
+    return {
+        "runs": runs,
+        "min_s": round(min(times), 3),
+        "median_s": round(statistics.median(times), 3),
+        "sdks_imported": results[-1]["sdks"],
+    }
+
+
+def checkout(ref: str, into: Path) -> Path:
+    """Extract backend/ at *ref* into *into* and return its path."""
+    repo = BACKEND_DIR.parent
+    archive = subprocess.run(
+        ["git", "archive", "--format=tar", ref, "backend"],
+        cwd=repo, check=True, capture_output=True,
+    ).stdout
+    with tarfile.open(fileobj=BytesIO(archive)) as tar:
+        tar.extractall(into, filter="data")
+    return into / "backend"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ref", help="git revision to measure instead of the working tree")
+    args = parser.parse_args()
+
+    if args.ref:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = measure(checkout(args.ref, Path(tmp)), args.runs)
+    else:
+        result = measure(BACKEND_DIR, args.runs)
+    print(json.dumps({"ref": args.ref or "working tree", **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
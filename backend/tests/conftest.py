@@ -1,10 +1,24 @@
 """Shared fixtures for CoinScope backend tests."""
 
 import io
+import os
 
 import pytest
 from PIL import Image
 
+from app.routers.coins import limiter
+
+# No background provider import when a test client starts the app; tests
+# load the providers they use
+os.environ.setdefault("PROVIDER_WARMUP", "false")
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Keep the app-wide request limiter from leaking hits between tests."""
+    limiter.reset()
+    yield
+
 
 # ---------------------------------------------------------------------------
 # Tiny valid image fixtures
@@ -0,0 +1,146 @@
+"""Tests for app.services.admission and admission on /identify."""
+
+import asyncio
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+
+from app.main import app
+from app.routers.coins import get_vlm_service
+from app.services import metrics
+from app.services.admission import AdmissionController, AdmissionRejected, lane_for
+from app.services.vlm_service import VLMService
+
+
+class TestAdmissionController:
+    """Tests for bounded in-flight work and priority lanes."""
+
+    @pytest.mark.asyncio
+    async def test_admits_up_to_limit_without_waiting(self):
+        controller = AdmissionController(max_in_flight=2)
+        await controller.acquire("interactive")
+        await controller.acquire("batch")
+        assert controller.in_flight == 2
+
+    @pytest.mark.asyncio
+    async def test_interactive_lane_is_served_first(self):
+        controller = AdmissionController(max_in_flight=1)
+        held = await controller.acquire("interactive")
+        order: list[str] = []
+
+        async def wait(lane: str) -> None:
+            admitted = await controller.acquire(lane)
+            order.append(lane)
+            controller.release(admitted)
+
+        batch = asyncio.create_task(wait("batch"))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(wait("interactive"))
+        await asyncio.sleep(0)
+        assert controller.queued("batch") == 1 and controller.queued("interactive") == 1
+
+        controller.release(held)
+        await asyncio.gather(batch, interactive)
+        assert order == ["interactive", "batch"]
+        assert controller.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_full_queue_rejects_immediately(self):
+        controller = AdmissionController(max_in_flight=1, max_queue={"batch": 0})
+        await controller.acquire("interactive")
+        before = metrics.ADMISSION_DECISIONS.value(lane="batch", outcome="queue_full")
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire("batch")
+        assert exc_info.value.retry_after >= 1
+        assert metrics.ADMISSION_DECISIONS.value(lane="batch", outcome="queue_full") == before + 1
+
+    @pytest.mark.asyncio
+    async def test_wait_timeout_rejects_and_dequeues(self):
+        controller = AdmissionController(max_in_flight=1, max_wait=0.01)
+        await controller.acquire("interactive")
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire("interactive")
+        assert exc_info.value.reason == "timeout"
+        assert controller.queued("interactive") == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_leak_a_slot(self):
+        controller = AdmissionController(max_in_flight=1)
+        held = await controller.acquire("interactive")
+        waiter = asyncio.create_task(controller.acquire("interactive"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        controller.release(held)
+        assert controller.in_flight == 0
+        assert controller.queued("interactive") == 0
+
+
+    def test_priority_header_picks_the_lane(self):
+        assert lane_for("Batch") == "batch"
+        assert lane_for(None) == lane_for("urgent") == "interactive"
+
+
+class TestIdentifyAdmission:
+    """Tests for 503 backpressure on /identify."""
+
+    @pytest.fixture
+    def saturated(self):
+        """An admission controller with no free slots and no queue."""
+        app.state.admission = AdmissionController(
+            max_in_flight=0, max_queue={"interactive": 0, "batch": 0}
+        )
+        yield
+        app.state.admission = None
+
+    @pytest.mark.asyncio
+    async def test_saturated_worker_sheds_with_retry_after(self, saturated, jpeg_bytes: bytes):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post(
+                "/api/v1/coins/identify",
+                files={"image": ("coin.jpg", jpeg_bytes, "image/jpeg")},
+                headers={"X-Priority": "batch"},
+            )
+
+        assert resp.status_code == 503
+        assert int(resp.headers["retry-after"]) >= 1
+
+    @pytest.mark.asyncio
+    async def test_other_paths_are_not_admitted(self, saturated):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.get("/api/v1/coins/health")
+
+        assert resp.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_slot_is_held_for_identification_only(self, jpeg_bytes: bytes):
+        """The slot is taken after the upload is read and released with the response."""
+        controller = AdmissionController(max_in_flight=1)
+        in_flight: list[int] = []
+
+        async def identify(image, tiled=None):
+            in_flight.append(controller.in_flight)
+            return [], "test-model"
+
+        service = AsyncMock(spec=VLMService)
+        service.identify_coins = AsyncMock(side_effect=identify)
+        app.state.admission = controller
+        app.dependency_overrides[get_vlm_service] = lambda: service
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                resp = await client.post(
+                    "/api/v1/coins/identify",
+                    files={"image": ("coin.jpg", jpeg_bytes, "image/jpeg")},
+                )
+        finally:
+            app.dependency_overrides.clear()
+            app.state.admission = None
+
+        assert resp.status_code == 200
+        assert in_flight == [1]
+        assert controller.in_flight == 0
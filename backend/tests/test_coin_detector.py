@@ -0,0 +1,93 @@
+"""Tests for app.services.coin_detector and the detector pre-pass in VLMService."""
+
+import io
+import json
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.services.bbox import FULL_FRAME, to_full_frame
+from app.services.coin_detector import CoinDetector, Detection
+from app.services.vlm_service import VLMService
+
+
+def _scene(circles: list[tuple[int, int, int]], size=(1600, 1200)) -> bytes:
+    """A noisy dark background with bright discs at (cx, cy, r)."""
+    img = Image.new("L", size, 60)
+    draw = ImageDraw.Draw(img)
+    for cx, cy, r in circles:
+        draw.ellipse((cx - r, cy - r, cx + r, cy + r), fill=190)
+    noisy = np.asarray(img, dtype=np.float32) + np.random.default_rng(0).normal(0, 8, size[::-1])
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8)).convert("RGB").save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def _contains(box, cx: float, cy: float) -> bool:
+    return box[0] <= cx <= box[2] and box[1] <= cy <= box[3]
+
+
+class TestCoinDetector:
+    """Tests for circle detection and cropping."""
+
+    def test_finds_each_coin(self):
+        detection = CoinDetector().detect(_scene([(400, 400, 120), (1000, 700, 150)]))
+        assert len(detection.boxes) == 2
+        centres = [(400 / 1600, 400 / 1200), (1000 / 1600, 700 / 1200)]
+        for cx, cy in centres:
+            assert any(_contains(box, cx, cy) for box in detection.boxes)
+
+    def test_counts_a_tray_of_coins(self):
+        coins = [(200 + 250 * i, 200 + 300 * j, 90) for i in range(5) for j in range(3)]
+        assert len(CoinDetector().detect(_scene(coins)).boxes) == 15
+
+    def test_empty_background_has_no_candidates(self):
+        assert not CoinDetector().detect(_scene([]))
+
+    def test_crop_covers_candidates_and_maps_back(self):
+        detector = CoinDetector()
+        image_bytes = _scene([(400, 400, 120)])
+        cropped, crop = detector.crop(image_bytes, detector.detect(image_bytes))
+
+        assert crop != FULL_FRAME
+        assert len(cropped) < len(image_bytes)
+        assert _contains(crop, 400 / 1600, 400 / 1200)
+        assert to_full_frame([0.0, 0.0, 1.0, 1.0], crop) == pytest.approx(list(crop))
+
+    def test_large_union_is_not_cropped(self, jpeg_bytes: bytes):
+        detection = Detection([(0.0, 0.0, 0.5, 0.5), (0.5, 0.5, 1.0, 1.0)])
+        assert CoinDetector().crop(jpeg_bytes, detection) == (jpeg_bytes, FULL_FRAME)
+
+
+class TestVLMServiceDetector:
+    """Tests for the detector pre-pass in VLMService."""
+
+    @pytest.fixture
+    def service(self):
+        service = VLMService.__new__(VLMService)
+        service.model = "test-model"
+        service._provider = AsyncMock()
+        service.coin_detector = CoinDetector()
+        return service
+
+    @pytest.mark.asyncio
+    async def test_empty_image_skips_provider(self, service):
+        coins, model = await service.identify_coins(_scene([]))
+        assert coins == []
+        assert model == CoinDetector.MODEL_NAME
+        service._provider.identify.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_cropped_payload_and_full_frame_bboxes(self, service, sample_coin_data):
+        entry = dict(sample_coin_data[0], bbox=[0.0, 0.0, 1.0, 1.0])
+        service._provider.identify.return_value = json.dumps([entry])
+        image_bytes = _scene([(400, 400, 120)])
+
+        coins, _ = await service.identify_coins(image_bytes)
+
+        payload = service._provider.identify.call_args.args[0]
+        assert len(payload) < len(image_bytes)
+        x0, y0, x1, y1 = coins[0].bbox
+        assert (x1 - x0) < 0.5 and _contains(coins[0].bbox, 400 / 1600, 400 / 1200)
@@ -0,0 +1,265 @@
+"""Tests for request deadlines (app.services.deadline) and their propagation."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+
+from app.main import app
+from app.routers import coins as coins_router
+from app.routers.coins import get_vlm_service
+from app.services import deadline as request_deadline
+from app.services import metrics
+from app.services.deadline import Deadline, DeadlineConfig, DeadlineExceededError
+from app.services.model_router import ModelRouter, RouterConfig
+from app.services.payload import Payload
+from app.services.providers.gemini import GeminiProvider
+from app.services.providers.litellm_provider import LiteLLMProvider
+from app.services.vlm_service import VLMService
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def service() -> VLMService:
+    service = VLMService.__new__(VLMService)
+    service.model = "deadline-model"
+    service._provider = AsyncMock()
+    service.RETRY_DELAY_SECONDS = 0
+    return service
+
+
+class TestDeadlineConfig:
+    """Tests for the budget granted per request."""
+
+    @pytest.fixture
+    def config(self):
+        return DeadlineConfig(default_seconds=60, max_seconds=300)
+
+    def test_header_sets_the_budget(self, config):
+        assert config.budget("12.5") == 12.5
+
+    def test_budget_is_capped(self, config):
+        assert config.budget("3600") == 300
+
+    @pytest.mark.parametrize("header", [None, "", "soon", "0", "-5", "nan"])
+    def test_missing_or_invalid_header_uses_the_default(self, config, header):
+        assert config.budget(header) == 60
+
+    def test_zero_default_disables_deadlines(self):
+        config = DeadlineConfig(default_seconds=0)
+        assert config.start() is None
+        assert config.budget("5") == 5
+
+    def test_remaining_counts_down(self, clock):
+        deadline = Deadline(10, clock=clock)
+        clock.now = 4
+        assert deadline.remaining() == 6
+        clock.now = 11
+        assert deadline.remaining() == 0
+        assert deadline.expired
+
+
+class TestVLMServiceDeadline:
+    """Tests for per-call timeouts and retries under a deadline."""
+
+    @pytest.mark.asyncio
+    async def test_calls_get_the_remaining_budget(self, service, clock, jpeg_bytes, sample_coin_data):
+        clock.now = 3
+        service._provider.identify.return_value = json.dumps(sample_coin_data)
+        with request_deadline.bind(Deadline(30, clock=clock)):
+            clock.now = 8
+            await service.identify_coins(jpeg_bytes)
+        assert service._provider.identify.call_args.kwargs["timeout"] == 25
+
+    @pytest.mark.asyncio
+    async def test_no_deadline_means_no_timeout(self, service, jpeg_bytes, sample_coin_data):
+        service._provider.identify.return_value = json.dumps(sample_coin_data)
+        await service.identify_coins(jpeg_bytes)
+        assert service._provider.identify.call_args.kwargs["timeout"] is None
+
+    @pytest.mark.asyncio
+    async def test_retries_stop_when_the_budget_is_spent(self, service, clock, jpeg_bytes):
+        def slow_failure(payload, prompt, timeout=None):
+            clock.now += 9
+            raise RuntimeError("upstream 503")
+
+        service._provider.identify.side_effect = slow_failure
+        before = metrics.DEADLINE_EXCEEDED.value(model=metrics.OTHER_MODEL)
+        with request_deadline.bind(Deadline(19, clock=clock)):
+            with pytest.raises(DeadlineExceededError) as info:
+                await service.identify_coins(jpeg_bytes)
+
+        # 19 s allows two 9 s attempts; a third would start with 1 s left
+        assert service._provider.identify.call_count == 2
+        assert isinstance(info.value.__cause__, RuntimeError)
+        assert metrics.DEADLINE_EXCEEDED.value(model=metrics.OTHER_MODEL) == before + 1
+
+    @pytest.mark.asyncio
+    async def test_retry_delay_is_not_slept_past_the_deadline(self, service, clock, jpeg_bytes):
+        service.RETRY_DELAY_SECONDS = 5
+        service._provider.identify.side_effect = RuntimeError("upstream 503")
+        with request_deadline.bind(Deadline(6, clock=clock)), \
+                patch("app.services.vlm_service.asyncio.sleep", AsyncMock()) as sleep:
+            with pytest.raises(DeadlineExceededError):
+                await service.identify_coins(jpeg_bytes)
+        sleep.assert_not_awaited()
+        service._provider.identify.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_slow_call_is_cancelled_at_the_deadline(self, service, jpeg_bytes):
+        cancelled = asyncio.Event()
+
+        async def hang(payload, prompt, timeout=None):
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        service._provider.identify.side_effect = hang
+        with request_deadline.bind(Deadline(0.1)), \
+                patch("app.services.vlm_service.DEADLINES", DeadlineConfig(min_attempt_seconds=0.05)):
+            with pytest.raises(DeadlineExceededError) as info:
+                await service.identify_coins(jpeg_bytes)
+        assert cancelled.is_set()
+        assert isinstance(info.value.__cause__, asyncio.TimeoutError)
+
+    @pytest.mark.asyncio
+    async def test_deadline_timeouts_are_not_held_against_the_model(self, service, jpeg_bytes):
+        async def hang(payload, prompt, timeout=None):
+            await asyncio.sleep(60)
+
+        router = ModelRouter(RouterConfig(models=("deadline-model",)))
+        service.model_router = router
+        service.model_pinned = True
+        service._provider.identify.side_effect = hang
+        with request_deadline.bind(Deadline(0.1)), \
+                patch("app.services.vlm_service.DEADLINES", DeadlineConfig(min_attempt_seconds=0.05)):
+            with pytest.raises(DeadlineExceededError):
+                await service.identify_coins(jpeg_bytes)
+        assert router.stats["deadline-model"].calls == 0
+
+    @pytest.mark.asyncio
+    async def test_no_escalation_without_time(self, service, clock, large_jpeg_bytes):
+        def empty_answer(payload, prompt, timeout=None):
+            clock.now += 9
+            return "[]"
+
+        service._provider.identify.side_effect = empty_answer
+        with request_deadline.bind(Deadline(10, clock=clock)):
+            coins, _ = await service.identify_coins(large_jpeg_bytes)
+        assert coins == []
+        service._provider.identify.assert_called_once()
+
+
+class TestProviderTimeouts:
+    """Tests for the timeout each provider passes upstream."""
+
+    @pytest.mark.asyncio
+    async def test_litellm_passes_the_timeout(self, jpeg_bytes):
+        response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="[]"))])
+        completion = AsyncMock(return_value=response)
+        with patch("litellm.acompletion", completion):
+            await LiteLLMProvider("openai/gpt-4o").identify(Payload(jpeg_bytes), "prompt", timeout=7.5)
+            await LiteLLMProvider("openai/gpt-4o").identify(Payload(jpeg_bytes), "prompt")
+        assert completion.await_args_list[0].kwargs["timeout"] == 7.5
+        assert "timeout" not in completion.await_args_list[1].kwargs
+
+    @pytest.mark.asyncio
+    async def test_gemini_passes_request_options(self, png_bytes):
+        genai = MagicMock()
+        genai.GenerativeModel.return_value.generate_content.return_value = SimpleNamespace(
+            text="[]", usage_metadata=None
+        )
+        with patch("app.services.providers.gemini.genai", genai):
+            await GeminiProvider("gemini-flash-latest").identify(Payload(png_bytes), "prompt", timeout=7.5)
+        kwargs = genai.GenerativeModel.return_value.generate_content.call_args.kwargs
+        assert kwargs["request_options"] == {"timeout": 7.5}
+
+
+class TestIdentifyEndpointDeadline:
+    """Tests for deadlines and disconnects on POST /api/v1/coins/identify."""
+
+    async def _post(self, service, jpeg_bytes, headers=None) -> httpx.Response:
+        app.dependency_overrides[get_vlm_service] = lambda: service
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post(
+                    "/api/v1/coins/identify",
+                    files={"image": ("coin.jpg", jpeg_bytes, "image/jpeg")},
+                    headers=headers,
+                )
+        finally:
+            app.dependency_overrides.clear()
+
+    @pytest.mark.asyncio
+    async def test_header_deadline_reaches_the_service(self, jpeg_bytes):
+        seen = []
+
+        async def identify(image, tiled=None):
+            seen.append(request_deadline.current())
+            return [], "test-model"
+
+        service = AsyncMock(spec=VLMService)
+        service.identify_coins = AsyncMock(side_effect=identify)
+        resp = await self._post(service, jpeg_bytes, headers={"X-Request-Timeout": "7"})
+        assert resp.status_code == 200
+        assert seen[0].budget == 7
+
+    @pytest.mark.asyncio
+    async def test_exceeded_deadline_returns_504(self, jpeg_bytes):
+        service = AsyncMock(spec=VLMService)
+        service.identify_coins = AsyncMock(side_effect=DeadlineExceededError("0.5s left"))
+        resp = await self._post(service, jpeg_bytes)
+        assert resp.status_code == 504
+
+    @pytest.mark.asyncio
+    async def test_connected_client_gets_a_slow_answer(self, jpeg_bytes, monkeypatch):
+        monkeypatch.setattr(coins_router, "DISCONNECT_POLL_SECONDS", 0.01)
+
+        async def identify(image, tiled=None):
+            await asyncio.sleep(0.05)
+            return [], "test-model"
+
+        service = AsyncMock(spec=VLMService)
+        service.identify_coins = AsyncMock(side_effect=identify)
+        resp = await self._post(service, jpeg_bytes)
+        assert resp.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_disconnect_cancels_the_work(self, monkeypatch):
+        monkeypatch.setattr(coins_router, "DISCONNECT_POLL_SECONDS", 0.01)
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        request = MagicMock()
+        request.is_disconnected = AsyncMock(side_effect=[False, True])
+        before = metrics.CLIENT_DISCONNECTS.value()
+        with pytest.raises(coins_router.HTTPException) as info:
+            await coins_router._until_disconnected(request, work())
+        await asyncio.sleep(0)
+        assert info.value.status_code == coins_router.CLIENT_CLOSED_REQUEST
+        assert cancelled.is_set()
+        assert metrics.CLIENT_DISCONNECTS.value() == before + 1
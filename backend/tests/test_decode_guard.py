@@ -0,0 +1,191 @@
+"""Tests for guarded image decoding and the decode sandbox."""
+
+import io
+import struct
+import zlib
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+from PIL import Image
+
+from app.main import app
+from app.routers.coins import get_vlm_service
+from app.services.decode_sandbox import DecodeSandbox
+from app.services.image_encoder import EncodeBudget
+from app.services.coin_detector import CoinDetector
+from app.services.image_processor import (
+    DECODE_LIMITS,
+    DecodeLimits,
+    ImagePipeline,
+    ImageProcessor,
+    ImageTooLargeError,
+    decode_image,
+)
+from app.services.image_quality import QualityGate
+from app.services.tiling import TilingConfig
+from app.services.vlm_service import VLMService
+
+
+def _png_claiming(width: int, height: int) -> bytes:
+    """A tiny PNG whose header declares *width* x *height* (a decompression bomb)."""
+    buf = io.BytesIO()
+    Image.new("RGB", (1, 1)).save(buf, format="PNG")
+    data = bytearray(buf.getvalue())
+    # IHDR data starts after the 8-byte signature, length and chunk type
+    ihdr = struct.pack(">II", width, height) + bytes(data[24:29])
+    data[16:29] = ihdr
+    data[29:33] = struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+    return bytes(data)
+
+
+class TestOpenGuarded:
+    """Tests for ImageProcessor.open_guarded."""
+
+    def test_accepts_image_within_limits(self, png_bytes: bytes):
+        img = ImageProcessor.open_guarded(png_bytes)
+        assert img.size == (1, 1)
+
+    def test_rejects_pixel_count_from_header(self):
+        bomb = _png_claiming(50_000, 50_000)
+        with pytest.raises(ImageTooLargeError, match="megapixels"):
+            ImageProcessor.open_guarded(bomb)
+
+    def test_rejects_pixel_count_over_configured_limit(self, large_jpeg_bytes: bytes):
+        limits = DecodeLimits(max_pixels=1_000_000)
+        with pytest.raises(ImageTooLargeError, match="2000x1000"):
+            ImageProcessor.open_guarded(large_jpeg_bytes, limits=limits)
+
+    def test_rejects_decoded_size_over_memory_budget(self, large_jpeg_bytes: bytes):
+        limits = DecodeLimits(max_bytes=1024 * 1024)
+        with pytest.raises(ImageTooLargeError, match="MB"):
+            ImageProcessor.open_guarded(large_jpeg_bytes, limits=limits)
+
+    def test_jpeg_draft_counts_against_budget(self, large_jpeg_bytes: bytes):
+        # 2000x1000 RGB needs ~7.6 MB; drafted at 1/2 scale it fits in 2 MB
+        limits = DecodeLimits(max_bytes=2 * 1024 * 1024)
+        img = ImageProcessor.open_guarded(large_jpeg_bytes, max_size=512, limits=limits)
+        assert max(img.size) < 2000
+
+    def test_dimensions_of_a_bomb_are_refused(self):
+        with pytest.raises(ImageTooLargeError, match="megapixels"):
+            ImageProcessor.get_dimensions(_png_claiming(50_000, 50_000))
+
+    def test_resize_image_is_guarded(self):
+        with pytest.raises(ImageTooLargeError):
+            ImageProcessor.resize_image(_png_claiming(50_000, 50_000))
+
+
+class TestDecodeSandbox:
+    """Tests for decoding and encoding in memory-capped worker processes."""
+
+    @pytest.mark.asyncio
+    async def test_downscales_in_worker(self, large_jpeg_bytes: bytes):
+        sandbox = DecodeSandbox(workers=1)
+        try:
+            encoded = await sandbox.encode(large_jpeg_bytes, EncodeBudget(max_size=256))
+        finally:
+            sandbox.shutdown()
+        assert max(Image.open(io.BytesIO(encoded.data)).size) == 256
+
+    @pytest.mark.asyncio
+    async def test_encodes_in_worker(self, large_jpeg_bytes: bytes):
+        sandbox = DecodeSandbox(workers=1)
+        try:
+            encoded = await sandbox.encode(large_jpeg_bytes, EncodeBudget(max_size=512))
+        finally:
+            sandbox.shutdown()
+        assert encoded.format == "JPEG" and encoded.size == (512, 256)
+
+    def test_decodes_in_worker(self, large_jpeg_bytes: bytes):
+        sandbox = DecodeSandbox(workers=1)
+        try:
+            img = sandbox.decode(large_jpeg_bytes, max_size=500)
+        finally:
+            sandbox.shutdown()
+        local = decode_image(large_jpeg_bytes, 500, DECODE_LIMITS)
+        assert (img.size, img.mode) == (local.size, local.mode)
+        assert img.tobytes() == local.tobytes()
+
+    def test_pipeline_stages_decode_in_worker(self, large_jpeg_bytes: bytes):
+        """With the sandbox as decoder, no stage decompresses the upload in-process."""
+        sandbox = DecodeSandbox(workers=1)
+        pipeline = ImagePipeline(large_jpeg_bytes, decoder=sandbox.decode)
+        try:
+            with patch.object(ImageProcessor, "open_guarded") as in_process:
+                QualityGate().assess(pipeline)
+                CoinDetector().detect(pipeline)
+                pipeline.decoded()
+        finally:
+            sandbox.shutdown()
+        in_process.assert_not_called()
+        assert pipeline.decoded().size == (2000, 1000)
+
+    def test_worker_decode_refuses_bombs(self):
+        sandbox = DecodeSandbox(workers=1)
+        try:
+            with pytest.raises(ImageTooLargeError):
+                sandbox.decode(_png_claiming(50_000, 50_000))
+        finally:
+            sandbox.shutdown()
+
+    def test_service_pipelines_use_the_sandbox(self):
+        service = VLMService.__new__(VLMService)
+        assert service._decoder() is None
+        service.decode_sandbox = DecodeSandbox(workers=1)
+        assert service._decoder() == service.decode_sandbox.decode
+
+    @pytest.mark.asyncio
+    async def test_guard_errors_propagate(self):
+        sandbox = DecodeSandbox(workers=1)
+        try:
+            with pytest.raises(ImageTooLargeError):
+                await sandbox.encode(_png_claiming(50_000, 50_000), EncodeBudget())
+        finally:
+            sandbox.shutdown()
+
+
+class TestIdentifyRejectsBombs:
+    """Decompression bombs are refused before any provider call."""
+
+    @pytest.mark.asyncio
+    async def test_service_raises_before_provider(self):
+        provider = AsyncMock()
+        service = VLMService.__new__(VLMService)
+        service.model = "test-model"
+        service._provider = provider
+        with pytest.raises(ImageTooLargeError):
+            await service.identify_coins(_png_claiming(50_000, 50_000))
+        provider.identify.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_auto_tiling_size_check_is_guarded(self):
+        """TILE_AUTO_MIN_SIDE reads the header size before any budget check."""
+        provider = AsyncMock()
+        service = VLMService.__new__(VLMService)
+        service.model = "test-model"
+        service._provider = provider
+        with patch("app.services.vlm_service.TILING", TilingConfig(auto_min_side=3000)):
+            with pytest.raises(ImageTooLargeError):
+                await service.identify_coins(_png_claiming(20_000, 20_000))
+        provider.identify.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_endpoint_returns_413(self):
+        provider = AsyncMock()
+        service = VLMService.__new__(VLMService)
+        service.model = "test-model"
+        service._provider = provider
+        app.dependency_overrides[get_vlm_service] = lambda: service
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                resp = await client.post(
+                    "/api/v1/coins/identify",
+                    files={"image": ("bomb.png", _png_claiming(50_000, 50_000), "image/png")},
+                )
+        finally:
+            app.dependency_overrides.clear()
+        assert resp.status_code == 413
+        assert "megapixels" in resp.json()["detail"]
+        provider.identify.assert_not_called()
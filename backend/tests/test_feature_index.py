@@ -0,0 +1,190 @@
+"""Tests for app.services.feature_index (descriptors and nearest-neighbour search)."""
+
+import io
+import json
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.models.coin import Coin
+from app.services.coin_detector import CoinDetector
+from app.services.feature_index import CoinDescriptor, FeatureIndex
+from app.services.vlm_service import VLMService
+
+
+def _coin_image(fill: tuple[int, int, int], ring: tuple[int, int, int], angle: float = 0) -> bytes:
+    """Draw a synthetic 'coin' (disc with an off-centre mark) on a plain background."""
+    img = Image.new("RGB", (200, 200), color=(240, 240, 240))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((20, 20, 180, 180), fill=fill, outline=ring, width=8)
+    draw.rectangle((90, 40, 110, 100), fill=ring)
+    img = img.rotate(angle, fillcolor=(240, 240, 240))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _coin(name: str = "Quarter", confidence: float = 0.95) -> Coin:
+    return Coin(
+        name=name,
+        country="United States",
+        year=1999,
+        denomination="25 cents",
+        currency="USD",
+        confidence=confidence,
+        bbox=[0.1, 0.1, 0.9, 0.9],
+    )
+
+
+class TestCoinDescriptor:
+    """Tests for CoinDescriptor.compute."""
+
+    def test_unit_norm_and_size(self):
+        img = Image.open(io.BytesIO(_coin_image((200, 160, 60), (90, 70, 20))))
+        vec = CoinDescriptor.compute(img)
+        assert vec.shape == (CoinDescriptor.dimensions(),)
+        assert np.isclose(np.linalg.norm(vec), 1.0, atol=1e-5)
+
+    def test_rotation_invariant(self):
+        """A rotated coin should describe almost identically."""
+        a = CoinDescriptor.compute(Image.open(io.BytesIO(_coin_image((200, 160, 60), (90, 70, 20)))))
+        b = CoinDescriptor.compute(
+            Image.open(io.BytesIO(_coin_image((200, 160, 60), (90, 70, 20), angle=90)))
+        )
+        assert float(a @ b) > 0.98
+
+    def test_degenerate_box_returns_none(self):
+        img = Image.new("RGB", (100, 100))
+        assert CoinDescriptor.compute(img, (0.5, 0.5, 0.5, 0.9)) is None
+
+
+class TestFeatureIndex:
+    """Tests for indexing, matching and persistence."""
+
+    def test_empty_index_never_matches(self):
+        index = FeatureIndex(path=None, capacity=4)
+        assert index.match(_coin_image((200, 160, 60), (90, 70, 20))) is None
+
+    def test_confirmed_coin_matches_rescan(self):
+        index = FeatureIndex(path=None, capacity=16)
+        gold = _coin_image((200, 160, 60), (90, 70, 20))
+        assert index.add_confirmed(gold, [_coin()]) == 2
+
+        coins = index.match(_coin_image((200, 160, 60), (90, 70, 20), angle=45))
+        assert coins is not None
+        assert coins[0].name == "Quarter"
+        assert coins[0].bbox is not None
+
+    def test_different_coin_does_not_match(self):
+        index = FeatureIndex(path=None, capacity=16)
+        index.add_confirmed(_coin_image((200, 160, 60), (90, 70, 20)), [_coin()])
+        assert index.match(_coin_image((60, 90, 200), (230, 230, 255))) is None
+
+    def test_low_confidence_not_indexed(self):
+        index = FeatureIndex(path=None, capacity=16)
+        added = index.add_confirmed(_coin_image((200, 160, 60), (90, 70, 20)), [_coin(confidence=0.4)])
+        assert added == 0
+        assert len(index) == 0
+
+    def test_capacity_evicts_oldest(self):
+        index = FeatureIndex(path=None, capacity=3)
+        for i in range(5):
+            index.add(np.ones(CoinDescriptor.dimensions(), dtype=np.float32), {"name": str(i)})
+        assert len(index) == 3
+
+    def test_save_and_load_round_trip(self, tmp_path):
+        path = str(tmp_path / "index.npz")
+        index = FeatureIndex(path=path, capacity=16)
+        gold = _coin_image((200, 160, 60), (90, 70, 20))
+        index.add_confirmed(gold, [_coin()])
+        index.save()
+
+        reloaded = FeatureIndex(path=path, capacity=16)
+        reloaded.load()
+        assert len(reloaded) == 2
+        assert reloaded.match(gold)[0].name == "Quarter"
+
+    def test_answers_leave_out_what_the_descriptor_cannot_see(self):
+        index = FeatureIndex(path=None, capacity=16)
+        coin = _coin()
+        coin.obverse_description = "Washington, 1999 P"
+        index.add_confirmed(_coin_image((200, 160, 60), (90, 70, 20)), [coin])
+
+        matched = index.match(_coin_image((200, 160, 60), (90, 70, 20), angle=30))[0]
+        assert (matched.name, matched.denomination) == ("Quarter", "25 cents")
+        assert matched.year is None
+        assert matched.obverse_description is None
+
+
+class TestVLMServiceIntegration:
+    """The index should short-circuit the VLM on confident matches."""
+
+    @pytest.fixture
+    def service(self):
+        service = VLMService.__new__(VLMService)
+        service.model = "test-model"
+        service._provider = AsyncMock()
+        service.RETRY_DELAY_SECONDS = 0
+        service.feature_index = FeatureIndex(path=None, capacity=16)
+        return service
+
+    @pytest.mark.asyncio
+    async def test_first_scan_calls_vlm_then_rescan_is_local(self, service):
+        gold = _coin_image((200, 160, 60), (90, 70, 20))
+        service._provider.identify.return_value = json.dumps([_coin().model_dump()])
+
+        coins, model = await service.identify_coins(gold)
+        assert model == "test-model"
+        assert service._provider.identify.call_count == 1
+
+        coins, model = await service.identify_coins(gold)
+        assert model == FeatureIndex.MODEL_NAME
+        assert coins[0].name == "Quarter"
+        assert service._provider.identify.call_count == 1
+
+
+def _two_coin_scene() -> tuple[bytes, tuple[float, float], tuple[float, float]]:
+    """A gold and a blue coin on a dark background, with their centres."""
+    img = Image.new("RGB", (1600, 1200), color=(40, 40, 40))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((280, 280, 520, 520), fill=(200, 160, 60), outline=(90, 70, 20), width=10)
+    draw.ellipse((880, 580, 1120, 820), fill=(60, 90, 200), outline=(230, 230, 255), width=10)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue(), (400 / 1600, 400 / 1200), (1000 / 1600, 700 / 1200)
+
+
+class TestPerCoinMatching:
+    """With the detector, each candidate crop is matched separately."""
+
+    @pytest.mark.asyncio
+    async def test_only_unmatched_crops_reach_the_provider(self, sample_coin_data):
+        image_bytes, gold, blue = _two_coin_scene()
+        detector = CoinDetector()
+        boxes = detector.detect(image_bytes).boxes
+        gold_box = next(b for b in boxes if b[0] <= gold[0] <= b[2] and b[1] <= gold[1] <= b[3])
+
+        index = FeatureIndex(path=None, capacity=16)
+        pixels = Image.open(io.BytesIO(image_bytes))
+        index.add(CoinDescriptor.compute(pixels, gold_box), dict(_coin().model_dump(exclude={"id"}), bbox=None))
+
+        service = VLMService.__new__(VLMService)
+        service.model = "test-model"
+        service._provider = AsyncMock()
+        service._provider.identify.return_value = json.dumps([dict(sample_coin_data[0], bbox=[0, 0, 1, 1])])
+        service.RETRY_DELAY_SECONDS = 0
+        service.feature_index = index
+        service.coin_detector = detector
+
+        coins, model = await service.identify_coins(image_bytes)
+
+        assert model == "test-model"
+        payload = service._provider.identify.call_args.args[0]
+        sent = Image.open(io.BytesIO(payload.data))
+        assert sent.size[0] < 800  # the blue coin's crop, not both coins
+        names = sorted(c.name for c in coins)
+        assert names == sorted(["Quarter", sample_coin_data[0]["name"]])
+        provider_coin = next(c for c in coins if c.name != "Quarter")
+        assert provider_coin.bbox[0] <= blue[0] <= provider_coin.bbox[2]
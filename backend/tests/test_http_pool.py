@@ -0,0 +1,157 @@
+"""Tests for app.services.http_pool against a local stub HTTP server."""
+
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+
+from app.services import metrics
+from app.services.http_pool import HttpPool
+from app.services.payload import Payload
+from app.services.providers.litellm_provider import LiteLLMProvider
+
+OPENAI_RESPONSE = {
+    "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "[]"}}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+ANTHROPIC_RESPONSE = {
+    "id": "msg_1", "type": "message", "role": "assistant", "model": "claude-3-5-sonnet-latest",
+    "content": [{"type": "text", "text": "[]"}], "stop_reason": "end_turn",
+    "usage": {"input_tokens": 1, "output_tokens": 1},
+}
+
+
+class StubServer:
+    """Keep-alive HTTP/1.1 server answering every request with canned JSON."""
+
+    def __init__(self) -> None:
+        self.connections = 0
+        self.paths: list[str] = []
+        self._server = None
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = dict(
+                    line.split(":", 1) for line in header_lines if ":" in line
+                )
+                length = int(next((v for k, v in headers.items() if k.lower() == "content-length"), 0))
+                await reader.readexactly(length)
+                path = request_line.split()[1]
+                self.paths.append(path)
+                body = json.dumps(ANTHROPIC_RESPONSE if "messages" in path and "chat" not in path
+                                  else OPENAI_RESPONSE).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+@pytest_asyncio.fixture
+async def stub():
+    server = StubServer()
+    server.url = await server.start()
+    yield server
+    await server.stop()
+
+
+@pytest_asyncio.fixture
+async def pool():
+    pool = HttpPool(http2=False)
+    yield pool
+    await pool.aclose()
+
+
+class TestHttpPool:
+    """Tests for connection reuse and pool metrics."""
+
+    @pytest.mark.asyncio
+    async def test_requests_share_one_connection(self, stub, pool):
+        opened = metrics.HTTP_POOL_CONNECTIONS_OPENED.value(host="127.0.0.1")
+        for _ in range(3):
+            response = await pool.client.post(f"{stub.url}/v1/chat/completions", json={})
+            assert response.status_code == 200
+        assert stub.connections == 1
+        assert pool.requests == 3 and pool.connections_opened == 1
+        assert pool.in_flight == 0
+        assert metrics.HTTP_POOL_CONNECTIONS_OPENED.value(host="127.0.0.1") == opened + 1
+
+    @pytest.mark.asyncio
+    async def test_in_flight_until_body_is_closed(self, stub, pool):
+        async with pool.client.stream("GET", f"{stub.url}/v1/chat/completions") as response:
+            assert pool.in_flight == 1
+            await response.aread()
+        assert pool.in_flight == 0
+        assert metrics.HTTP_POOL_IN_FLIGHT.value() == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_open_separate_connections(self, stub, pool):
+        await asyncio.gather(*(pool.client.get(stub.url) for _ in range(3)))
+        await pool.client.get(stub.url)
+        assert pool.requests == 4
+        assert pool.connections_opened == stub.connections <= 3
+
+    @pytest.mark.asyncio
+    async def test_close_detaches_litellm_session(self, pool):
+        import litellm
+
+        pool.attach_litellm()
+        assert litellm.aclient_session is pool.client
+        await pool.aclose()
+        assert litellm.aclient_session is None
+
+    @pytest.mark.asyncio
+    async def test_providers_share_one_litellm_handler(self, pool, monkeypatch):
+        import litellm
+
+        monkeypatch.setattr(litellm, "aclient_session", None)
+        first = LiteLLMProvider("anthropic/claude-3-5-sonnet-latest", http_pool=pool)
+        second = LiteLLMProvider("anthropic/claude-3-5-sonnet-latest", http_pool=pool)
+        LiteLLMProvider("openai/gpt-4o", http_pool=pool)
+
+        assert first._client_kwargs["client"] is second._client_kwargs["client"] is pool.litellm_handler()
+        # Constructing providers leaves the process-wide session alone
+        assert litellm.aclient_session is None
+
+
+class TestProvidersUsePool:
+    """Provider calls go through the app-scoped pool."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "model, base_env",
+        [("openai/gpt-4o", "OPENAI_API_BASE"), ("anthropic/claude-3-5-sonnet-latest", "ANTHROPIC_API_BASE")],
+    )
+    async def test_retries_reuse_the_connection(self, stub, pool, monkeypatch, jpeg_bytes, model, base_env):
+        monkeypatch.setenv(base_env, f"{stub.url}/v1" if base_env == "OPENAI_API_BASE" else stub.url)
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+        pool.attach_litellm()
+        provider = LiteLLMProvider(model, http_pool=pool)
+        payload = Payload(jpeg_bytes)
+
+        for _ in range(3):
+            assert await provider.identify(payload, "prompt") == "[]"
+
+        assert len(stub.paths) == 3
+        assert pool.requests == 3
+        assert stub.connections == pool.connections_opened == 1
@@ -0,0 +1,129 @@
+"""Tests for app.services.image_encoder and budget-encoded payloads."""
+
+import io
+import json
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.image_encoder import (
+    EncodeBudget,
+    _save,
+    available_formats,
+    encode_to_budget,
+)
+from app.services.image_processor import ImagePipeline, ImageProcessor
+from app.services.vlm_service import VLMService
+
+
+def _textured(size=(1600, 1200)) -> Image.Image:
+    """A smooth gradient with noise, compressible but not trivially."""
+    width, height = size
+    gradient = np.add.outer(np.linspace(0, 120, height), np.linspace(0, 120, width))
+    noise = np.random.default_rng(0).normal(0, 12, (height, width))
+    gray = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(np.stack([gray, gray // 2 + 60, 255 - gray], axis=2))
+
+
+def _jpeg(img: Image.Image, **options) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=95, **options)
+    return buf.getvalue()
+
+
+class TestEncodeToBudget:
+    """Tests for the quality search."""
+
+    def test_fits_budget_at_highest_quality(self):
+        img = _textured((480, 360))  # small enough to search without a probe
+        budget = EncodeBudget(max_bytes=30_000, formats=("WEBP",))
+        encoded = encode_to_budget(img, budget)
+        assert encoded.format == "WEBP" and encoded.size == (480, 360)
+        assert len(encoded.data) <= budget.max_bytes
+        assert len(_save(img, "WEBP", encoded.quality + 1)) > budget.max_bytes
+
+    def test_probe_search_stays_within_budget(self):
+        budget = EncodeBudget(max_bytes=200_000, max_size=1024, formats=("WEBP",))
+        encoded = encode_to_budget(_textured(), budget)
+        assert encoded.size == (1024, 768)
+        assert len(encoded.data) <= budget.max_bytes
+        assert encoded.quality > budget.min_quality
+        assert ImageProcessor.get_media_type(encoded.data) == encoded.media_type == "image/webp"
+
+    def test_format_preference_order(self):
+        encoded = encode_to_budget(_textured((400, 300)), EncodeBudget(formats=("WEBP", "JPEG")))
+        assert encoded.format == "WEBP"
+        encoded = encode_to_budget(_textured((400, 300)), EncodeBudget())
+        assert ImageProcessor.get_media_type(encoded.data) == "image/jpeg"
+
+    def test_shrinks_when_no_quality_fits(self):
+        budget = EncodeBudget(max_bytes=20_000, max_size=2048, formats=("JPEG",))
+        encoded = encode_to_budget(_textured(), budget)
+        assert max(encoded.size) < 1600
+        assert len(encoded.data) <= budget.max_bytes
+
+    def test_unavailable_formats_are_skipped(self):
+        assert available_formats(("HEIC", "WEBP", "JPEG")) == ["WEBP", "JPEG"]
+
+    def test_avif_when_supported(self):
+        if "AVIF" not in available_formats(("AVIF",)):
+            pytest.skip("Pillow built without an AVIF encoder")
+        encoded = encode_to_budget(_textured((400, 300)), EncodeBudget(formats=("AVIF",)))
+        assert ImageProcessor.get_media_type(encoded.data) == "image/avif"
+
+    def test_budget_scaled_for_anthropic(self):
+        budget = EncodeBudget(max_bytes=400_000, max_size=2048)
+        claude = budget.for_model("anthropic/claude-sonnet")
+        assert claude.max_size == 1568 and claude.max_bytes < budget.max_bytes
+        assert budget.for_model("gemini/gemini-flash-latest") is budget
+
+
+class TestPipelineEncoded:
+    """Tests for ImagePipeline.encoded."""
+
+    def test_orientation_applied_and_metadata_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees clockwise
+        exif[0x010F] = "Camera maker"
+        pipeline = ImagePipeline(_jpeg(_textured((800, 600)), exif=exif))
+
+        encoded = pipeline.encoded(EncodeBudget())
+
+        img = Image.open(io.BytesIO(encoded.data))
+        assert img.size == (600, 800)
+        assert not img.getexif() and "icc_profile" not in img.info
+
+    def test_cached_per_budget(self, large_jpeg_bytes: bytes):
+        pipeline = ImagePipeline(large_jpeg_bytes)
+        assert pipeline.encoded(EncodeBudget()) is pipeline.encoded(EncodeBudget())
+
+
+class TestVLMServicePayload:
+    """Tests for choosing between the upload and its encoded copy."""
+
+    @pytest.fixture
+    def service(self, sample_coin_data):
+        service = VLMService.__new__(VLMService)
+        service.model = "test-model"
+        service._provider = AsyncMock()
+        service._provider.identify.return_value = json.dumps(sample_coin_data)
+        return service
+
+    @pytest.mark.asyncio
+    async def test_oversized_upload_sends_encoded_copy_first(self, service):
+        upload = _jpeg(_textured((2400, 1800)))
+        budget = EncodeBudget(max_bytes=150_000)
+        assert len(upload) > budget.max_bytes
+        with patch("app.services.vlm_service.ENCODE_BUDGET", budget):
+            await service.identify_coins(upload)
+        payload = service._provider.identify.call_args_list[0].args[0]
+        assert len(payload) <= budget.max_bytes
+        assert payload.media_type == "image/jpeg"
+        assert max(Image.open(io.BytesIO(payload.data)).size) == budget.max_size
+
+    @pytest.mark.asyncio
+    async def test_upload_within_budget_is_sent_as_is(self, service, jpeg_bytes: bytes):
+        await service.identify_coins(jpeg_bytes)
+        assert service._provider.identify.call_args.args[0].data == jpeg_bytes
@@ -1,12 +1,16 @@
-"""Tests for app.services.image_processor.ImageProcessor."""
+"""Tests for app.services.image_processor.ImageProcessor and ImagePipeline."""
 
-import base64
+import hashlib
 import io
+from unittest.mock import patch
 
 import pytest
 from PIL import Image
 
-from app.services.image_processor import ImageProcessor
+from app.services.coin_detector import CoinDetector
+from app.services.image_encoder import EncodeBudget
+from app.services.image_processor import ImagePipeline, ImageProcessor
+from app.services.image_quality import QualityGate
 
 
 class TestResizeImage:
@@ -59,22 +63,6 @@ class TestResizeImage:
         assert out.size[0] == int(500 * (1280 / 3000))
 
 
-class TestEncodeImage:
-    """Tests for ImageProcessor.encode_image."""
-
-    def test_base64_round_trip(self, jpeg_bytes: bytes):
-        """Encoding and then decoding should give back original bytes."""
-        encoded = ImageProcessor.encode_image(jpeg_bytes)
-        assert isinstance(encoded, str)
-        decoded = base64.b64decode(encoded)
-        assert decoded == jpeg_bytes
-
-    def test_returns_string(self, jpeg_bytes: bytes):
-        """encode_image must return a plain Python str, not bytes."""
-        result = ImageProcessor.encode_image(jpeg_bytes)
-        assert isinstance(result, str)
-
-
 class TestGetMediaType:
     """Tests for ImageProcessor.get_media_type."""
 
@@ -93,3 +81,66 @@ class TestGetMediaType:
     def test_unknown_defaults_to_jpeg(self):
         """Unknown magic bytes should default to image/jpeg."""
         assert ImageProcessor.get_media_type(b"\x00\x00\x00\x00") == "image/jpeg"
+
+
+class TestImagePipeline:
+    """Tests for the shared single-decode pipeline."""
+
+    @staticmethod
+    def _counting():
+        return patch.object(
+            ImageProcessor, "open_guarded", side_effect=ImageProcessor.open_guarded
+        )
+
+    def test_stages_share_one_decode(self, large_jpeg_bytes: bytes):
+        pipeline = ImagePipeline(large_jpeg_bytes)
+        with self._counting() as opened:
+            pipeline.check_budget()
+            pipeline.decoded()
+            QualityGate().assess(pipeline)
+            CoinDetector().detect(pipeline)
+            pipeline.encoded(EncodeBudget(max_size=1280))
+            pipeline.encoded(EncodeBudget(max_size=1280))
+        # One header-only budget check, one full decode serving every stage
+        assert opened.call_count == 2
+
+    def test_small_decode_then_larger_scale(self, large_jpeg_bytes: bytes):
+        pipeline = ImagePipeline(large_jpeg_bytes)
+        small = pipeline.decoded(250)
+        assert max(small.size) < 2000  # JPEG draft decoded at reduced scale
+        assert pipeline.decoded(200) is small
+        assert pipeline.decoded(1500).size == (2000, 1000)
+        assert pipeline.decoded() is pipeline.decoded(1500)
+
+    def test_small_image_decoded_in_full_serves_every_scale(self, jpeg_bytes: bytes):
+        pipeline = ImagePipeline(jpeg_bytes)
+        assert pipeline.decoded(64) is pipeline.decoded()
+
+    def test_encoded_is_cached_per_budget(self, large_jpeg_bytes: bytes):
+        pipeline = ImagePipeline(large_jpeg_bytes)
+        encoded = pipeline.encoded(EncodeBudget(max_size=500))
+        assert encoded.size == (500, 250)
+        assert pipeline.encoded(EncodeBudget(max_size=500)) is encoded
+
+    def test_exif_orientation_applied(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees clockwise
+        buf = io.BytesIO()
+        Image.new("RGB", (300, 100), (90, 90, 90)).save(buf, format="JPEG", exif=exif)
+        pipeline = ImagePipeline(buf.getvalue())
+        assert pipeline.size == (300, 100)  # header
+        assert pipeline.decoded().size == (100, 300)
+        assert pipeline.encoded(EncodeBudget(max_size=150)).size == (50, 150)
+
+    def test_rgba_decoded_as_rgb(self, rgba_png_bytes: bytes):
+        assert ImagePipeline(rgba_png_bytes).decoded().mode == "RGB"
+
+    def test_digest_and_media_type(self, png_bytes: bytes):
+        pipeline = ImagePipeline(png_bytes)
+        assert pipeline.digest == hashlib.sha256(png_bytes).hexdigest()
+        assert pipeline.media_type == "image/png"
+
+    def test_of_reuses_pipeline(self, jpeg_bytes: bytes):
+        pipeline = ImagePipeline(jpeg_bytes)
+        assert ImagePipeline.of(pipeline) is pipeline
+        assert ImagePipeline.of(jpeg_bytes).data == jpeg_bytes
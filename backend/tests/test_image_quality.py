@@ -0,0 +1,148 @@
+"""Tests for app.services.image_quality and the quality gate on /identify."""
+
+import asyncio
+import io
+import threading
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter
+
+from app.main import app
+from app.routers.coins import get_vlm_service
+from app.services.image_quality import QualityGate, laplacian_variance
+from app.services.vlm_service import VLMService
+
+
+def _jpeg(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, format="JPEG", quality=92)
+    return buf.getvalue()
+
+
+def _textured(size: int = 400, offset: int = 0) -> Image.Image:
+    """A sharp, well-exposed test scene (random 8px blocks, grey levels 40-215)."""
+    rng = np.random.default_rng(7)
+    blocks = rng.integers(40, 216, (size // 8, size // 8)).astype(np.int16)
+    pixels = np.kron(blocks, np.ones((8, 8), dtype=np.int16)) + offset
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+class TestLaplacianVariance:
+    """Tests for the sharpness measure."""
+
+    def test_blur_lowers_variance(self):
+        sharp = np.asarray(_textured(), dtype=np.float32)
+        blurred = np.asarray(_textured().filter(ImageFilter.GaussianBlur(4)), dtype=np.float32)
+        assert laplacian_variance(blurred) < laplacian_variance(sharp) / 10
+
+    def test_tiny_image_scores_zero(self):
+        assert laplacian_variance(np.zeros((1, 1), dtype=np.float32)) == 0.0
+
+
+class TestQualityGate:
+    """Tests for issue detection and modes."""
+
+    def test_good_image_is_usable(self):
+        quality = QualityGate().assess(_jpeg(_textured()))
+        assert quality.usable
+        assert quality.issues == []
+        assert 40 < quality.brightness < 215
+
+    def test_blurry_image_is_flagged(self):
+        quality = QualityGate().assess(_jpeg(_textured().filter(ImageFilter.GaussianBlur(6))))
+        assert "blurry" in quality.issues
+        assert not quality.usable
+
+    def test_dark_image_is_underexposed(self):
+        quality = QualityGate().assess(_jpeg(_textured(offset=-150)))
+        assert "underexposed" in quality.issues
+
+    def test_bright_image_is_overexposed(self):
+        quality = QualityGate().assess(_jpeg(_textured(offset=150)))
+        assert "overexposed" in quality.issues
+
+    def test_flat_image_has_low_contrast(self):
+        quality = QualityGate().assess(_jpeg(Image.new("L", (200, 200), 128)))
+        assert "low_contrast" in quality.issues
+
+    def test_only_reject_mode_rejects(self):
+        quality = QualityGate().assess(_jpeg(Image.new("L", (200, 200), 128)))
+        assert not QualityGate(mode="flag").rejects(quality)
+        assert QualityGate(mode="reject").rejects(quality)
+        assert "contrast" in QualityGate.retake_hint(quality)
+
+    def test_unknown_mode_is_an_error(self):
+        with pytest.raises(ValueError):
+            QualityGate(mode="strict")
+
+
+class TestIdentifyQualityGate:
+    """Tests for quality reporting on POST /api/v1/coins/identify."""
+
+    @pytest.fixture
+    def service(self):
+        service = AsyncMock(spec=VLMService)
+        service.identify_coins = AsyncMock(return_value=([], "test-model"))
+        app.dependency_overrides[get_vlm_service] = lambda: service
+        yield service
+        app.dependency_overrides.clear()
+
+    async def _identify(self, image_bytes: bytes) -> httpx.Response:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/api/v1/coins/identify",
+                files={"image": ("coin.jpg", image_bytes, "image/jpeg")},
+            )
+
+    @pytest.mark.asyncio
+    async def test_flag_mode_reports_quality(self, service):
+        blurry = _jpeg(_textured().filter(ImageFilter.GaussianBlur(6)))
+        resp = await self._identify(blurry)
+        assert resp.status_code == 200
+        assert resp.json()["quality"]["issues"] == ["blurry"]
+        service.identify_coins.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_reject_mode_skips_provider(self, service):
+        blurry = _jpeg(_textured().filter(ImageFilter.GaussianBlur(6)))
+        with patch("app.routers.coins.quality_gate", QualityGate(mode="reject")):
+            resp = await self._identify(blurry)
+        body = resp.json()
+        assert resp.status_code == 422
+        assert body["detail"].startswith("Image quality too low. The photo is blurry")
+        assert body["quality"]["usable"] is False
+        service.identify_coins.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_off_mode_omits_quality(self, service, jpeg_bytes: bytes):
+        with patch("app.routers.coins.quality_gate", QualityGate(mode="off")):
+            resp = await self._identify(jpeg_bytes)
+        assert resp.json()["quality"] is None
+
+    @pytest.mark.asyncio
+    async def test_assessment_leaves_the_event_loop_free(self, service):
+        """Other work on the loop keeps running while a large image is scored."""
+        loop_ran = threading.Event()
+        gate = QualityGate(mode="flag")
+        assess = gate.assess
+
+        def waiting_assess(image):
+            # Run on the loop itself, this would wait out the timeout and fail
+            assert loop_ran.wait(5), "event loop blocked during assessment"
+            return assess(image)
+
+        async def other_work():
+            await asyncio.sleep(0.01)
+            loop_ran.set()
+
+        gate.assess = waiting_assess
+        with patch("app.routers.coins.quality_gate", gate):
+            other = asyncio.create_task(other_work())
+            resp = await self._identify(_jpeg(_textured(2400)))
+            await other
+        assert resp.status_code == 200
+        assert resp.json()["quality"]["usable"] is True
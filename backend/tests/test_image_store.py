@@ -0,0 +1,149 @@
+"""Tests for app.database.image_store.ImageStore and the images API."""
+
+import io
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+from PIL import Image
+
+from app.database.image_store import ImageStore
+from app.main import app
+from app.routers.coins import get_vlm_service
+from app.routers.images import get_image_store
+from app.services.profiling import ADMIN_TOKEN_HEADER
+from app.services.vlm_service import VLMService
+
+
+TOKEN = "images-admin-token"
+ADMIN = {ADMIN_TOKEN_HEADER: TOKEN}
+
+
+@pytest.fixture
+def store(tmp_path) -> ImageStore:
+    return ImageStore(str(tmp_path / "images"))
+
+
+class TestImageStore:
+    """Tests for content-addressed storage."""
+
+    def test_save_writes_sharded_original(self, store: ImageStore, large_jpeg_bytes: bytes):
+        """Originals land under <root>/ab/cd/<digest>."""
+        digest = store.save(large_jpeg_bytes)
+        path = store.path_for(digest)
+        assert path.parent.name == digest[2:4]
+        assert path.parent.parent.name == digest[:2]
+        assert path.read_bytes() == large_jpeg_bytes
+
+    def test_thumbnail_is_downscaled(self, store: ImageStore, large_jpeg_bytes: bytes):
+        """A downscaled JPEG derivative is kept alongside the original."""
+        digest = store.save(large_jpeg_bytes)
+        thumb = Image.open(store.path_for(digest, "thumbnail"))
+        assert max(thumb.size) == ImageStore.THUMBNAIL_MAX_SIZE
+
+    def test_repeat_upload_is_deduplicated(self, store: ImageStore, jpeg_bytes: bytes):
+        """Saving the same bytes twice keeps a single file and the same digest."""
+        first = store.save(jpeg_bytes)
+        mtime = store.path_for(first).stat().st_mtime_ns
+        second = store.save(jpeg_bytes)
+        assert first == second
+        assert store.path_for(second).stat().st_mtime_ns == mtime
+
+    def test_no_temp_files_left_behind(self, store: ImageStore, jpeg_bytes: bytes):
+        digest = store.save(jpeg_bytes)
+        leftovers = [p for p in store.path_for(digest).parent.iterdir() if p.name.startswith(".tmp-")]
+        assert leftovers == []
+
+    def test_open_returns_memory_map(self, store: ImageStore, png_bytes: bytes):
+        digest = store.save(png_bytes)
+        mapped = store.open(digest)
+        assert mapped[:] == png_bytes
+        mapped.close()
+
+    def test_invalid_digest_rejected(self, store: ImageStore):
+        """Malformed digests (e.g. path traversal) must never reach the filesystem."""
+        with pytest.raises(ValueError):
+            store.path_for("../../etc/passwd")
+
+
+class TestImagesEndpoint:
+    """Tests for GET /api/v1/images/{digest}."""
+
+    @pytest.fixture
+    def override(self, store: ImageStore):
+        app.dependency_overrides[get_image_store] = lambda: store
+        app.state.admin_token = TOKEN
+        yield
+        app.state.admin_token = None
+        app.dependency_overrides.clear()
+
+    @pytest.mark.asyncio
+    async def test_serves_stored_image(self, override, store: ImageStore, png_bytes: bytes):
+        digest = store.save(png_bytes)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.get(f"/api/v1/images/{digest}", headers=ADMIN)
+
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "image/png"
+        assert resp.headers["cache-control"].startswith("private")
+        assert resp.content == png_bytes
+
+    @pytest.mark.asyncio
+    async def test_requires_admin_token(self, override, store: ImageStore, png_bytes: bytes):
+        digest = store.save(png_bytes)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            missing = await client.get(f"/api/v1/images/{digest}")
+            wrong = await client.get(f"/api/v1/images/{digest}", headers={ADMIN_TOKEN_HEADER: "guess"})
+            app.state.admin_token = None  # ADMIN_TOKEN unset
+            disabled = await client.get(f"/api/v1/images/{digest}", headers=ADMIN)
+
+        assert missing.status_code == 403
+        assert wrong.status_code == 403
+        assert disabled.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_serves_thumbnail(self, override, store: ImageStore, large_jpeg_bytes: bytes):
+        digest = store.save(large_jpeg_bytes)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.get(f"/api/v1/images/{digest}?variant=thumbnail", headers=ADMIN)
+
+        assert resp.status_code == 200
+        assert max(Image.open(io.BytesIO(resp.content)).size) == ImageStore.THUMBNAIL_MAX_SIZE
+
+    @pytest.mark.asyncio
+    async def test_missing_image_returns_404(self, override):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.get(f"/api/v1/images/{'0' * 64}", headers=ADMIN)
+
+        assert resp.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_malformed_digest_returns_400(self, override):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.get("/api/v1/images/not-a-digest", headers=ADMIN)
+
+        assert resp.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_identify_stores_upload_after_response(
+        self, override, store: ImageStore, jpeg_bytes: bytes
+    ):
+        """/identify should persist the upload via a background task."""
+        service = AsyncMock(spec=VLMService)
+        service.identify_coins = AsyncMock(return_value=([], "test-model"))
+        app.dependency_overrides[get_vlm_service] = lambda: service
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post(
+                "/api/v1/coins/identify",
+                files={"image": ("coin.jpg", jpeg_bytes, "image/jpeg")},
+            )
+
+        assert resp.status_code == 200
+        assert store.exists(ImageStore.digest(jpeg_bytes))
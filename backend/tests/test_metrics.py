@@ -0,0 +1,149 @@
+"""Tests for app.services.metrics and the /metrics endpoint."""
+
+import json
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from app.main import app
+from app.routers.coins import get_vlm_service
+from app.services import metrics
+from app.services.vlm_service import VLMService
+
+
+@pytest.fixture
+def service(monkeypatch) -> VLMService:
+    """A VLMService with a mock provider and no retry delay."""
+    monkeypatch.setattr(metrics, "KNOWN_MODELS", metrics.KNOWN_MODELS | {"metrics-test-model"})
+    service = VLMService.__new__(VLMService)
+    service.model = "metrics-test-model"
+    service._provider = AsyncMock()
+    service.RETRY_DELAY_SECONDS = 0
+    return service
+
+
+class TestPrimitives:
+    """Tests for Counter, Gauge and Histogram rendering."""
+
+    def test_counter_renders_labels(self):
+        counter = metrics.Counter("t_total", "Test counter.", ("kind",))
+        counter.inc(kind="a")
+        counter.inc(2, kind='q"uote')
+        text = "\n".join(counter.render())
+        assert "# TYPE t_total counter" in text
+        assert 't_total{kind="a"} 1' in text
+        assert 't_total{kind="q\\"uote"} 2' in text
+
+    def test_gauge_goes_up_and_down(self):
+        gauge = metrics.Gauge("t_gauge", "Test gauge.")
+        gauge.inc(3)
+        gauge.dec()
+        assert gauge.value() == 2
+        gauge.set(7)
+        assert gauge.value() == 7
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("t_seconds", "Test histogram.", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+        lines = histogram.render()
+        assert 't_seconds_bucket{le="0.1"} 1' in lines
+        assert 't_seconds_bucket{le="1"} 3' in lines
+        assert 't_seconds_bucket{le="+Inf"} 4' in lines
+        assert "t_seconds_count 4" in lines
+        assert histogram.count() == 4
+
+    def test_stage_records_outcome_and_context_model(self, monkeypatch):
+        monkeypatch.setattr(metrics, "KNOWN_MODELS", frozenset({"m"}))
+        before = metrics.STAGE_SECONDS.count(stage="t-stage", model="m", outcome="error")
+        with pytest.raises(RuntimeError):
+            with metrics.model_context("m"), metrics.stage("t-stage"):
+                raise RuntimeError("boom")
+        after = metrics.STAGE_SECONDS.count(stage="t-stage", model="m", outcome="error")
+        assert after == before + 1
+
+    def test_unconfigured_models_share_one_label(self, monkeypatch):
+        monkeypatch.setattr(metrics, "KNOWN_MODELS", frozenset({"m"}))
+        assert metrics.model_label("m") == "m"
+        assert metrics.model_label("attacker/model-123") == metrics.OTHER_MODEL
+        before = metrics.STAGE_SECONDS.count(stage="t-stage", model="other", outcome="ok")
+        with metrics.model_context("attacker/model-456"), metrics.stage("t-stage"):
+            pass
+        assert metrics.STAGE_SECONDS.count(stage="t-stage", model="other", outcome="ok") == before + 1
+
+    @patch.dict("os.environ", {
+        "VLM_MODEL": "openai/gpt-4o",
+        "MODEL_ROUTER_MODELS": "gemini/gemini-flash-latest, openai/gpt-4o-mini",
+        "METRICS_MODEL_ALLOWLIST": "anthropic/claude-3-5-haiku-latest",
+    })
+    def test_configured_models_come_from_the_environment(self):
+        assert metrics._configured_models() == {
+            "openai/gpt-4o",
+            "gemini/gemini-flash-latest",
+            "openai/gpt-4o-mini",
+            "anthropic/claude-3-5-haiku-latest",
+        }
+
+
+class TestPipelineInstrumentation:
+    """Tests for counters recorded by VLMService and its components."""
+
+    @pytest.mark.asyncio
+    async def test_retries_and_stages_are_counted(
+        self, service: VLMService, sample_coin_data: list[dict], jpeg_bytes: bytes
+    ):
+        model = service.model
+        retries = metrics.PROVIDER_RETRIES.value(model=model)
+        failed = metrics.STAGE_SECONDS.count(stage="provider", model=model, outcome="error")
+        service._provider.identify.side_effect = [
+            RuntimeError("transient"),
+            json.dumps(sample_coin_data),
+        ]
+
+        await service.identify_coins(jpeg_bytes)
+
+        assert metrics.PROVIDER_RETRIES.value(model=model) == retries + 1
+        assert metrics.STAGE_SECONDS.count(stage="provider", model=model, outcome="error") == failed + 1
+        assert metrics.STAGE_SECONDS.count(stage="identify", model=model, outcome="ok") >= 1
+        assert metrics.STAGE_SECONDS.count(stage="resize", model=model, outcome="ok") >= 1
+        assert metrics.STAGE_SECONDS.count(stage="parse_coins", model=model, outcome="ok") >= 1
+
+    @pytest.mark.asyncio
+    async def test_variant_escalation_is_counted(
+        self, service: VLMService, sample_coin_data: list[dict], large_jpeg_bytes: bytes
+    ):
+        model = service.model
+        escalations = metrics.VARIANT_ESCALATIONS.value(model=model, variant="resized")
+        service.MAX_RETRIES = 1
+        service._provider.identify.side_effect = ["[]", json.dumps(sample_coin_data)]
+
+        await service.identify_coins(large_jpeg_bytes)
+
+        assert metrics.VARIANT_ESCALATIONS.value(model=model, variant="resized") == escalations + 1
+
+
+class TestMetricsEndpoint:
+    """Tests for GET /metrics."""
+
+    @pytest.mark.asyncio
+    async def test_exposes_prometheus_text(self, jpeg_bytes: bytes):
+        mock = AsyncMock(spec=VLMService)
+        mock.identify_coins = AsyncMock(return_value=([], "endpoint-model"))
+        app.dependency_overrides[get_vlm_service] = lambda: mock
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await client.post(
+                    "/api/v1/coins/identify",
+                    files={"image": ("coin.jpg", jpeg_bytes, "image/jpeg")},
+                )
+                resp = await client.get("/metrics")
+        finally:
+            app.dependency_overrides.clear()
+
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain")
+        assert "# TYPE coinscope_stage_duration_seconds histogram" in resp.text
+        assert 'stage="read",model="",outcome="ok"' in resp.text
+        assert 'route="/api/v1/coins/identify"' in resp.text
@@ -0,0 +1,197 @@
+"""Tests for app.services.model_router and routing in VLMService."""
+
+import json
+import random
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from app.main import app
+from app.services.model_router import ModelRouter, RouterConfig, call_cost
+from app.services.providers import usage
+from app.services.providers.usage import CallUsage
+from app.services.quota import CostEstimator
+from app.services.vlm_service import VLMService
+
+
+def _router(*models: str, **config) -> ModelRouter:
+    config.setdefault("explore", 0.0)
+    return ModelRouter(RouterConfig(models=models, **config), rng=random.Random(7))
+
+
+def _warm(router: ModelRouter, model: str, seconds: float, ok: bool = True, calls: int = 1,
+          tokens: int = 0) -> None:
+    for _ in range(calls):
+        router.record(model, seconds, ok, CallUsage(input_tokens=tokens) if tokens else None)
+
+
+class TestRouterConfig:
+    """Tests for configuration from the environment."""
+
+    @patch.dict("os.environ", {
+        "MODEL_ROUTER_MODELS": "openai/gpt-4o, gemini/gemini-flash-latest",
+        "MODEL_ROUTER_POLICY": "Weighted",
+        "MODEL_ROUTER_WEIGHTS": "openai/gpt-4o=3,gemini/gemini-flash-latest=1",
+    })
+    def test_from_env(self):
+        router = ModelRouter.from_env()
+        assert tuple(router.stats) == ("openai/gpt-4o", "gemini/gemini-flash-latest")
+        assert router.config.policy == "weighted"
+        assert router.config.weights == {"openai/gpt-4o": 3.0, "gemini/gemini-flash-latest": 1.0}
+
+    @patch.dict("os.environ", {"MODEL_ROUTER_MODELS": ""})
+    def test_unset_models_disable_routing(self):
+        assert ModelRouter.from_env() is None
+
+    def test_unknown_policy_is_rejected(self):
+        with pytest.raises(ValueError):
+            _router("a", policy="random")
+
+
+class TestStatistics:
+    """Tests for the EWMA statistics and call cost."""
+
+    def test_ewma_latency_and_error_rate(self):
+        router = _router("a", alpha=0.5)
+        _warm(router, "a", 2.0)
+        _warm(router, "a", 4.0)
+        _warm(router, "a", 100.0, ok=False)
+        stats = router.stats["a"]
+        assert stats.latency == pytest.approx(3.0)  # failures do not move latency
+        assert stats.error_rate == pytest.approx(0.5)
+        assert stats.calls == 3
+
+    def test_models_outside_the_pool_are_ignored(self):
+        router = _router("a")
+        router.record("b", 1.0, True)
+        assert "b" not in router.stats
+
+    def test_call_cost_weights_output_and_cached_tokens(self):
+        cost = call_cost("openai/gpt-4o", CallUsage(input_tokens=1000, output_tokens=100, cached_tokens=500))
+        multiplier = CostEstimator.model_multiplier("openai/gpt-4o")
+        assert cost == pytest.approx((500 + 50 + 400) / 1000 * multiplier)
+        assert call_cost("openai/gpt-4o", CallUsage()) is None
+
+    def test_record_usage_fills_the_bound_call(self):
+        with usage.collect() as call_usage:
+            usage.record_usage("litellm", "router-test", 1200, 80, cached=1000)
+        usage.record_usage("litellm", "router-test", 5)  # outside the block
+        assert (call_usage.input_tokens, call_usage.output_tokens, call_usage.cached_tokens) == (1200, 80, 1000)
+
+
+class TestPolicies:
+    """Tests for model selection."""
+
+    def test_untried_models_come_first(self):
+        router = _router("a", "b")
+        _warm(router, "a", 1.0)
+        assert router.choose() == "b"
+
+    def test_fastest_healthy(self):
+        router = _router("a", "b", "c")
+        _warm(router, "a", 5.0)
+        _warm(router, "b", 1.0, ok=False, calls=5)
+        _warm(router, "c", 2.0)
+        assert router.choose() == "c"
+
+    def test_cheapest_within_slo(self):
+        router = _router("a", "b", "c", policy="cheapest", slo_seconds=3.0)
+        _warm(router, "a", 1.0, tokens=4000)
+        _warm(router, "b", 2.0, tokens=1000)
+        _warm(router, "c", 9.0, tokens=100)  # cheapest, but too slow
+        assert router.choose() == "b"
+
+    def test_cheapest_falls_back_to_fastest(self):
+        router = _router("a", "b", policy="cheapest", slo_seconds=0.5)
+        _warm(router, "a", 2.0, tokens=100)
+        _warm(router, "b", 1.0, tokens=4000)
+        assert router.choose() == "b"
+
+    def test_weighted_split(self):
+        router = _router("a", "b", policy="weighted", weights={"a": 3, "b": 1})
+        _warm(router, "a", 1.0)
+        _warm(router, "b", 1.0)
+        picks = [router.choose() for _ in range(2000)]
+        assert picks.count("a") / len(picks) == pytest.approx(0.75, abs=0.05)
+
+    def test_weighted_skips_unhealthy_models(self):
+        router = _router("a", "b", policy="weighted", weights={"a": 3, "b": 1})
+        _warm(router, "a", 1.0, ok=False, calls=5)
+        _warm(router, "b", 1.0)
+        assert {router.choose() for _ in range(50)} == {"b"}
+
+    def test_all_unhealthy_uses_the_least_failing(self):
+        router = _router("a", "b", alpha=0.5)
+        _warm(router, "a", 1.0, ok=False, calls=3)
+        _warm(router, "b", 1.0, ok=False)
+        assert router.choose() == "b"
+
+    def test_exploration_revisits_other_models(self):
+        router = _router("a", "b", explore=0.2)
+        _warm(router, "a", 1.0)
+        _warm(router, "b", 9.0)
+        picks = [router.choose() for _ in range(500)]
+        assert 0 < picks.count("b") < 100
+
+
+class TestVLMServiceRouting:
+    """Tests for routing and call reporting in VLMService."""
+
+    @pytest.fixture
+    def router(self):
+        router = _router("openai/gpt-4o", "anthropic/claude-3-5-sonnet-latest")
+        _warm(router, "openai/gpt-4o", 4.0)
+        _warm(router, "anthropic/claude-3-5-sonnet-latest", 1.0)
+        return router
+
+    @pytest.mark.asyncio
+    async def test_unpinned_request_is_routed_and_recorded(self, router, jpeg_bytes, sample_coin_data):
+        provider = AsyncMock()
+        provider.identify = AsyncMock(side_effect=[RuntimeError("busy"), json.dumps(sample_coin_data)])
+        service = VLMService()
+        service.model_router = router
+        service.RETRY_DELAY_SECONDS = 0
+
+        with patch.object(VLMService, "_build_provider", return_value=provider):
+            coins, model = await service.identify_coins(jpeg_bytes)
+
+        assert model == "anthropic/claude-3-5-sonnet-latest"
+        assert len(coins) == 2
+        stats = router.stats["anthropic/claude-3-5-sonnet-latest"]
+        assert stats.calls == 3
+        assert stats.error_rate > 0
+
+    def test_explicit_model_is_not_rerouted(self, router):
+        service = VLMService(model="openai/gpt-4o")
+        service.model_router = router
+        assert service.route() == "openai/gpt-4o"
+
+    def test_route_chooses_once(self, router):
+        service = VLMService()
+        service.model_router = router
+        first = service.route()
+        _warm(router, first, 60.0, ok=False, calls=10)
+        assert service.route() == first
+
+
+class TestProvidersEndpoint:
+    """Tests for routing scores on GET /api/v1/coins/providers."""
+
+    @pytest.mark.asyncio
+    async def test_scores_are_listed(self):
+        router = _router("openai/gpt-4o")
+        _warm(router, "openai/gpt-4o", 1.5, tokens=2000)
+        app.state.model_router = router
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                resp = await client.get("/api/v1/coins/providers")
+        finally:
+            app.state.model_router = None
+
+        routing = resp.json()["routing"]
+        assert routing["policy"] == "fastest"
+        assert routing["models"][0]["model"] == "openai/gpt-4o"
+        assert routing["models"][0]["latency_ms"] == 1500.0
+        assert routing["models"][0]["healthy"] is True
@@ -0,0 +1,73 @@
+"""Tests for app.services.payload and how providers consume payloads."""
+
+import base64
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.payload import Payload
+from app.services.providers.gemini import GeminiProvider
+from app.services.providers.litellm_provider import LiteLLMProvider
+from app.services.vlm_service import VLMService
+
+
+class TestPayload:
+    """Tests for the cached data URL."""
+
+    @pytest.mark.parametrize("size", [0, 1, 2, 3, 1000])
+    def test_data_url_matches_b64encode(self, size):
+        data = (bytes(range(256)) * 4)[:size]
+        url = Payload(data, "image/webp").data_url
+        assert url == "data:image/webp;base64," + base64.b64encode(data).decode("ascii")
+
+    def test_data_url_is_built_once(self, jpeg_bytes: bytes):
+        payload = Payload(jpeg_bytes)
+        assert payload.data_url is payload.data_url
+
+    def test_media_type_is_sniffed(self, png_bytes: bytes):
+        assert Payload(png_bytes).media_type == "image/png"
+        assert Payload(png_bytes, "image/x-test").media_type == "image/x-test"
+
+    def test_of_reuses_payload(self, jpeg_bytes: bytes):
+        payload = Payload(jpeg_bytes)
+        assert Payload.of(payload) is payload
+        assert Payload.of(jpeg_bytes).data is jpeg_bytes
+
+
+class TestProviderPayloads:
+    """Tests for the payload as each provider sends it."""
+
+    @pytest.mark.asyncio
+    async def test_litellm_retries_reuse_the_data_url(self, jpeg_bytes: bytes, sample_coin_data):
+        response = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(sample_coin_data)))]
+        )
+        completion = AsyncMock(side_effect=[RuntimeError("busy"), response])
+        service = VLMService.__new__(VLMService)
+        service.model = "openai/gpt-4o"
+        service._provider = LiteLLMProvider("openai/gpt-4o")
+        service.RETRY_DELAY_SECONDS = 0
+
+        with patch("litellm.acompletion", completion), \
+                patch.object(Payload, "_build_data_url", autospec=True,
+                             side_effect=lambda p: "data:" + p.media_type) as build:
+            coins, _ = await service.identify_coins(jpeg_bytes)
+
+        assert len(coins) == 2
+        assert completion.await_count == 2
+        build.assert_called_once()
+        urls = [call.kwargs["messages"][-1]["content"][-1]["image_url"]["url"] for call in completion.await_args_list]
+        assert urls[0] is urls[1]
+
+    @pytest.mark.asyncio
+    async def test_gemini_receives_the_payload_media_type(self, png_bytes: bytes):
+        genai = MagicMock()
+        genai.GenerativeModel.return_value.generate_content.return_value = SimpleNamespace(
+            text="[]", usage_metadata=None
+        )
+        with patch("app.services.providers.gemini.genai", genai):
+            await GeminiProvider("gemini-flash-latest").identify(Payload(png_bytes), "prompt")
+        prompt, image_part = genai.GenerativeModel.return_value.generate_content.call_args.args[0]
+        assert image_part == {"mime_type": "image/png", "data": png_bytes}
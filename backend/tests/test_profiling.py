@@ -0,0 +1,154 @@
+"""Tests for app.services.profiling, the profiling middleware and the admin API."""
+
+import threading
+import time
+
+import httpx
+import pytest
+
+from app.main import app
+from app.routers.admin import get_profiler
+from app.services.image_processor import ImagePipeline, ImageProcessor
+from app.services.profiling import (
+    Profiler,
+    SamplingProfiler,
+    allocations,
+    trace_allocations,
+)
+
+TOKEN = "test-admin-token"
+
+
+def _busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+@pytest.fixture
+def profiler():
+    """Attach a Profiler to the app for the duration of a test."""
+    profiler = Profiler(TOKEN)
+    app.state.admin_token = TOKEN
+    app.state.profiler = profiler
+    yield profiler
+    app.state.profiler = None
+    app.state.admin_token = None
+
+
+@pytest.fixture
+def client():
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+class TestSamplingProfiler:
+    """Tests for stack sampling."""
+
+    def test_samples_other_threads(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy-worker")
+        worker.start()
+        sampler = SamplingProfiler(interval=0.001)
+        sampler.start()
+        time.sleep(0.1)
+        report = sampler.stop()
+        stop.set()
+        worker.join()
+
+        assert sampler.samples > 0
+        busy = [line for line in report.splitlines() if line.startswith("busy-worker;")]
+        assert any("_busy_loop" in line for line in busy)
+        assert "coinscope-profiler" not in report
+
+
+class TestAllocationTracer:
+    """Tests for tracemalloc diffs around decorated calls."""
+
+    def test_inactive_tracer_is_bypassed(self, jpeg_bytes: bytes):
+        assert not allocations.active
+        ImageProcessor.resize_image(jpeg_bytes)
+        assert "ImageProcessor.resize_image" not in allocations.stop().content
+
+    def test_records_decorated_calls_and_auto_stops(self, large_jpeg_bytes: bytes):
+        allocations.start(max_calls=1)
+        ImageProcessor.resize_image(large_jpeg_bytes, max_size=256)
+        assert not allocations.active  # auto-stopped after max_calls
+        report = allocations.stop()
+        assert report.samples == 1
+        assert "ImageProcessor.resize_image: 1 call(s)" in report.content
+
+    def test_decorator_preserves_metadata(self):
+        @trace_allocations
+        def sample():
+            """Docstring."""
+        assert sample.__name__ == "sample"
+        assert sample.__doc__ == "Docstring."
+
+
+class TestAdminAPI:
+    """Tests for /api/v1/admin."""
+
+    @pytest.mark.asyncio
+    async def test_disabled_without_admin_token(self, client):
+        app.dependency_overrides[get_profiler] = lambda: None
+        try:
+            async with client:
+                resp = await client.get("/api/v1/admin/profiles")
+        finally:
+            app.dependency_overrides.clear()
+        assert resp.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_rejects_wrong_token(self, profiler, client):
+        async with client:
+            resp = await client.get("/api/v1/admin/profiles", headers={"X-Admin-Token": "nope"})
+        assert resp.status_code == 403
+
+    @pytest.mark.asyncio
+    async def test_timed_capture_is_downloadable(self, profiler, client):
+        headers = {"X-Admin-Token": TOKEN}
+        async with client:
+            resp = await client.post("/api/v1/admin/profile?seconds=0.05", headers=headers)
+            listing = await client.get("/api/v1/admin/profiles", headers=headers)
+            again = await client.get(
+                f"/api/v1/admin/profiles/{resp.headers['x-profile-id']}", headers=headers
+            )
+
+        assert resp.status_code == 200
+        assert "attachment" in resp.headers["content-disposition"]
+        assert listing.json()["profiles"][0]["kind"] == "capture"
+        assert again.text == resp.text
+
+    @pytest.mark.asyncio
+    async def test_allocation_trace_round_trip(self, profiler, client, jpeg_bytes: bytes):
+        headers = {"X-Admin-Token": TOKEN}
+        async with client:
+            start = await client.post("/api/v1/admin/allocations/start?max_calls=5", headers=headers)
+            ImagePipeline(jpeg_bytes).decoded()
+            stop = await client.post("/api/v1/admin/allocations/stop", headers=headers)
+
+        assert start.json()["allocations_active"] is True
+        assert "ImagePipeline.decoded: 1 call(s)" in stop.text
+        assert profiler.get(stop.headers["x-profile-id"]).kind == "allocations"
+
+
+class TestRequestProfiling:
+    """Tests for the X-Profile request header."""
+
+    @pytest.mark.asyncio
+    async def test_profiles_request_with_admin_token(self, profiler, client):
+        async with client:
+            resp = await client.get("/", headers={"X-Profile": "1", "X-Admin-Token": TOKEN})
+
+        report = profiler.get(resp.headers["x-profile-id"])
+        assert report.kind == "request"
+        assert report.label == "GET /"
+
+    @pytest.mark.asyncio
+    async def test_ignores_header_without_admin_token(self, profiler, client):
+        async with client:
+            resp = await client.get("/", headers={"X-Profile": "1"})
+
+        assert resp.status_code == 200
+        assert "x-profile-id" not in resp.headers
+        assert profiler.reports() == []
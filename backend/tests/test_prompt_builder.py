@@ -46,3 +46,13 @@ class TestPromptBuilder:
     def test_build_idempotent(self):
         """Calling build() multiple times should return the same string."""
         assert PromptBuilder.build() == PromptBuilder.build()
+
+    def test_every_prompt_starts_with_the_static_template(self):
+        """Per-request additions follow the template, so it can be cached as a prefix."""
+        single = PromptBuilder.build(single_coin=True)
+        assert single.startswith(PromptBuilder.TEMPLATE)
+        assert PromptBuilder.split(single) == (PromptBuilder.TEMPLATE, PromptBuilder.SINGLE_COIN_NOTE.strip())
+        assert PromptBuilder.split(PromptBuilder.build()) == (PromptBuilder.TEMPLATE, "")
+
+    def test_split_of_other_prompt_has_no_prefix(self):
+        assert PromptBuilder.split("Name this coin.") == ("", "Name this coin.")
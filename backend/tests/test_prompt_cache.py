@@ -0,0 +1,181 @@
+"""Tests for provider prompt caching (app.services.providers.prompt_cache)."""
+
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services import metrics
+from app.services.payload import Payload
+from app.services.prompt_builder import PromptBuilder
+from app.services.providers.gemini import GeminiProvider
+from app.services.providers.litellm_provider import LiteLLMProvider
+from app.services.providers.prompt_cache import PromptCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _tokens(provider: str, model: str, cache: str) -> float:
+    return metrics.PROVIDER_INPUT_TOKENS.value(provider=provider, model=model, cache=cache)
+
+
+class TestPromptCache:
+    """Tests for handle creation, refresh and back-off."""
+
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    @pytest.fixture
+    def cache(self, clock):
+        return PromptCache(ttl=100, refresh_margin=10, clock=clock)
+
+    def test_handle_is_created_once(self, cache):
+        create = MagicMock(return_value="h1")
+        assert cache.handle("k", create) == "h1"
+        assert cache.handle("k", create) == "h1"
+        create.assert_called_once_with(100)
+        assert len(cache) == 1
+
+    def test_handle_is_refreshed_before_expiry(self, cache, clock):
+        cache.handle("k", lambda ttl: "h1")
+        refresh = MagicMock(return_value="h1")
+        clock.now = 95
+        assert cache.handle("k", MagicMock(), refresh) == "h1"
+        refresh.assert_called_once_with("h1", 100)
+        clock.now = 180  # 85 s into the refreshed TTL: still fresh
+        assert cache.handle("k", MagicMock(side_effect=AssertionError), refresh) == "h1"
+
+    def test_failed_refresh_recreates(self, cache, clock):
+        cache.handle("k", lambda ttl: "h1")
+        clock.now = 95
+        assert cache.handle("k", lambda ttl: "h2", MagicMock(side_effect=RuntimeError)) == "h2"
+
+    def test_refusal_backs_off_for_a_ttl(self, cache, clock):
+        create = MagicMock(side_effect=RuntimeError("too few tokens"))
+        assert cache.handle("k", create) is None
+        assert cache.handle("k", create) is None
+        assert create.call_count == 1
+        clock.now = 95
+        create.side_effect, create.return_value = None, "h1"
+        assert cache.handle("k", create) == "h1"
+
+    def test_invalidate_forces_a_new_handle(self, cache):
+        cache.handle("k", lambda ttl: "h1")
+        cache.invalidate("k")
+        assert cache.handle("k", lambda ttl: "h2") == "h2"
+
+    def test_disabled_cache_never_creates(self):
+        create = MagicMock()
+        assert PromptCache(enabled=False).handle("k", create) is None
+        create.assert_not_called()
+
+
+class TestLiteLLMPromptCaching:
+    """Tests for the LiteLLM message layout and cache accounting."""
+
+    def test_anthropic_instructions_are_marked_cacheable(self):
+        provider = LiteLLMProvider("anthropic/claude-3-5-sonnet-latest", prompt_cache=PromptCache())
+        system, user = provider.build_messages(PromptBuilder.build(single_coin=True), "data:x")
+        assert system["role"] == "system"
+        assert system["content"] == [{
+            "type": "text", "text": PromptBuilder.TEMPLATE, "cache_control": {"type": "ephemeral"},
+        }]
+        assert user["content"][0] == {"type": "text", "text": PromptBuilder.SINGLE_COIN_NOTE.strip()}
+        assert user["content"][1]["image_url"]["url"] == "data:x"
+
+    def test_openai_instructions_come_first_unmarked(self):
+        provider = LiteLLMProvider("openai/gpt-4o", prompt_cache=PromptCache())
+        system, user = provider.build_messages(PromptBuilder.build(), "data:x")
+        assert system["content"] == [{"type": "text", "text": PromptBuilder.TEMPLATE}]
+        assert [part["type"] for part in user["content"]] == ["image_url"]
+
+    def test_disabled_cache_is_not_marked(self):
+        provider = LiteLLMProvider("anthropic/claude-3-5-sonnet-latest", prompt_cache=PromptCache(enabled=False))
+        system, _ = provider.build_messages(PromptBuilder.build(), "data:x")
+        assert "cache_control" not in system["content"][0]
+
+    @pytest.mark.asyncio
+    async def test_cached_tokens_are_counted(self, jpeg_bytes, monkeypatch):
+        model = "anthropic/claude-cache-test"
+        monkeypatch.setattr(metrics, "KNOWN_MODELS", frozenset({model}))
+        usage = SimpleNamespace(
+            prompt_tokens=1500,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=1000),
+            cache_creation_input_tokens=100,
+        )
+        response = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="[]"))], usage=usage
+        )
+        with patch("litellm.acompletion", AsyncMock(return_value=response)):
+            await LiteLLMProvider(model).identify(Payload(jpeg_bytes), PromptBuilder.build())
+        assert _tokens("litellm", model, "read") == 1000
+        assert _tokens("litellm", model, "write") == 100
+        assert _tokens("litellm", model, "none") == 400
+
+
+class TestGeminiPromptCaching:
+    """Tests for Gemini cached content handles."""
+
+    @pytest.fixture
+    def genai(self):
+        genai = MagicMock()
+        usage = SimpleNamespace(prompt_token_count=1300, cached_content_token_count=1000)
+        response = SimpleNamespace(text=json.dumps([]), usage_metadata=usage)
+        genai.GenerativeModel.return_value.generate_content.return_value = response
+        genai.GenerativeModel.from_cached_content.return_value.generate_content.return_value = response
+        return genai
+
+    @pytest.mark.asyncio
+    async def test_instructions_are_cached_once_per_process(self, genai, png_bytes, monkeypatch):
+        monkeypatch.setattr(metrics, "KNOWN_MODELS", frozenset({"gemini-cache-test"}))
+        caching = MagicMock()
+        prompt_cache = PromptCache()
+        with patch("app.services.providers.gemini.genai", genai), \
+                patch("app.services.providers.gemini.caching", caching):
+            # Providers are built per request; the handle outlives them
+            for _ in range(2):
+                provider = GeminiProvider("gemini-cache-test", prompt_cache=prompt_cache)
+                await provider.identify(Payload(png_bytes), PromptBuilder.build())
+
+        caching.CachedContent.create.assert_called_once()
+        assert caching.CachedContent.create.call_args.kwargs["system_instruction"] == PromptBuilder.TEMPLATE
+        cached_model = genai.GenerativeModel.from_cached_content.return_value
+        contents = cached_model.generate_content.call_args.args[0]
+        assert contents == [{"mime_type": "image/png", "data": png_bytes}]
+        assert _tokens("gemini", "gemini-cache-test", "read") == 2000
+        assert _tokens("gemini", "gemini-cache-test", "none") == 600
+
+    @pytest.mark.asyncio
+    async def test_refused_cache_sends_instructions_inline(self, genai, png_bytes):
+        caching = MagicMock()
+        caching.CachedContent.create.side_effect = RuntimeError("below minimum token count")
+        prompt = PromptBuilder.build()
+        with patch("app.services.providers.gemini.genai", genai), \
+                patch("app.services.providers.gemini.caching", caching):
+            await GeminiProvider("gemini-small", prompt_cache=PromptCache()).identify(Payload(png_bytes), prompt)
+        contents = genai.GenerativeModel.return_value.generate_content.call_args.args[0]
+        assert contents[0] == prompt
+
+    @pytest.mark.asyncio
+    async def test_failed_call_drops_the_handle(self, genai, png_bytes):
+        caching = MagicMock()
+        prompt_cache = PromptCache()
+        cached_model = genai.GenerativeModel.from_cached_content.return_value
+        cached_model.generate_content.side_effect = RuntimeError("cached content not found")
+        provider = GeminiProvider("gemini-expired", prompt_cache=prompt_cache)
+        with patch("app.services.providers.gemini.genai", genai), \
+                patch("app.services.providers.gemini.caching", caching):
+            with pytest.raises(RuntimeError):
+                await provider.identify(Payload(png_bytes), PromptBuilder.build())
+            assert len(prompt_cache) == 0
+            with pytest.raises(RuntimeError):
+                await provider.identify(Payload(png_bytes), PromptBuilder.build())
+        assert caching.CachedContent.create.call_count == 2
@@ -0,0 +1,66 @@
+"""Tests for app.services.providers.registry."""
+
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app.main import app, lifespan
+from app.services.providers import registry as provider_registry
+from app.services.providers.base import BaseVLMProvider
+from app.services.providers.registry import ProviderRegistry, ProviderSpec
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+class TestProviderRegistry:
+    """Tests for lazy provider loading."""
+
+    def test_load_returns_provider_class(self):
+        registry = ProviderRegistry()
+        provider_cls = registry.load("litellm")
+        assert issubclass(provider_cls, BaseVLMProvider)
+        assert registry.is_loaded("litellm")
+        assert registry.load("litellm") is provider_cls
+
+    def test_missing_sdk_is_unavailable(self):
+        registry = ProviderRegistry(
+            {"ghost": ProviderSpec("ghost", ".ghost", "GhostProvider", "no_such_sdk_module")}
+        )
+        assert not registry.is_available("ghost")
+        assert registry.warm_up() == []
+
+    def test_unknown_provider_raises(self):
+        with pytest.raises(KeyError):
+            ProviderRegistry().load("nope")
+
+    def test_importing_app_does_not_import_sdks(self):
+        """`import app.main` must not pull in litellm or the Gemini SDK."""
+        code = (
+            "import sys, app.main; "
+            "print(sorted(m for m in ('litellm', 'google.generativeai') if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        )
+        assert result.stdout.strip() == "[]"
+
+    @pytest.mark.asyncio
+    async def test_shutdown_waits_for_warmup(self, monkeypatch):
+        """The warmup thread must not outlive the app (or a test client's loop)."""
+        finished = threading.Event()
+
+        def slow_warm_up(*names):
+            time.sleep(0.2)
+            finished.set()
+            return list(names)
+
+        monkeypatch.setenv("PROVIDER_WARMUP", "true")
+        monkeypatch.setattr(provider_registry, "warm_up", slow_warm_up)
+        async with lifespan(app):
+            pass
+        assert finished.is_set()
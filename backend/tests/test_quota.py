@@ -0,0 +1,163 @@
+"""Tests for app.services.quota (API-key tiers and cost-weighted budgets)."""
+
+import json
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+from starlette.requests import Request
+
+from app.main import app
+from app.routers.coins import get_vlm_service
+from app.services.quota import (
+    CostEstimator,
+    InvalidAPIKeyError,
+    QuotaExceededError,
+    QuotaManager,
+    QuotaTier,
+)
+from app.services.vlm_service import VLMService
+
+
+def _request(headers: dict[str, str] | None = None) -> Request:
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "headers": raw, "client": ("10.0.0.1", 1234)})
+
+
+@pytest.fixture
+def manager() -> QuotaManager:
+    return QuotaManager(
+        api_keys={"secret-pro": "pro", "secret-free": "free"},
+        tiers={
+            "anonymous": QuotaTier("anonymous", requests_per_minute=10, cost_per_minute=10),
+            "free": QuotaTier("free", requests_per_minute=20, cost_per_minute=20),
+            "pro": QuotaTier("pro", requests_per_minute=100, cost_per_minute=1000),
+        },
+    )
+
+
+class TestCostEstimator:
+    """Tests for CostEstimator."""
+
+    def test_bigger_images_cost_more(self):
+        assert CostEstimator.estimate(20_000_000, "gemini-flash") > CostEstimator.estimate(
+            40_000, "gemini-flash"
+        )
+
+    def test_model_tiers(self):
+        assert CostEstimator.model_multiplier("gemini/gemini-2.0-flash-lite") == 0.5
+        assert CostEstimator.model_multiplier("gemini-3-pro-preview") == 4.0
+        assert CostEstimator.model_multiplier("gemini/gemini-flash-latest") == 1.0
+        assert CostEstimator.model_multiplier("some-unknown-model") == CostEstimator.DEFAULT_MULTIPLIER
+
+    def test_minimum_cost_is_one(self):
+        assert CostEstimator.estimate(0, "gpt-4o-mini") >= 1
+
+
+class TestQuotaManager:
+    """Tests for identification and budget enforcement."""
+
+    def test_anonymous_keyed_by_address(self, manager: QuotaManager):
+        client = manager.identify(_request())
+        assert client.key == "10.0.0.1"
+        assert client.tier.name == "anonymous"
+
+    def test_api_key_maps_to_tier_without_storing_secret(self, manager: QuotaManager):
+        client = manager.identify(_request({"X-API-Key": "secret-pro"}))
+        assert client.tier.name == "pro"
+        assert "secret" not in client.key
+        assert manager.request_limit(client.key) == "100/minute"
+
+    def test_unknown_key_rejected(self, manager: QuotaManager):
+        with pytest.raises(InvalidAPIKeyError):
+            manager.identify(_request({"X-API-Key": "nope"}))
+        assert manager.client_key(_request({"X-API-Key": "nope"})) == "10.0.0.1"
+
+    def test_budget_exhaustion_raises_with_retry_after(self, manager: QuotaManager):
+        client = manager.identify(_request({"X-API-Key": "secret-free"}))
+        manager.charge(client, 15)
+        with pytest.raises(QuotaExceededError) as exc_info:
+            manager.charge(client, 10)
+        assert exc_info.value.retry_after >= 1
+
+    def test_tiers_are_independent(self, manager: QuotaManager):
+        free = manager.identify(_request({"X-API-Key": "secret-free"}))
+        pro = manager.identify(_request({"X-API-Key": "secret-pro"}))
+        manager.charge(free, 20)
+        manager.charge(pro, 500)
+
+    def test_oversized_call_capped_at_budget(self, manager: QuotaManager):
+        """A single call larger than the whole budget still runs on a fresh window."""
+        client = manager.identify(_request())
+        manager.charge(client, 10_000)
+        with pytest.raises(QuotaExceededError):
+            manager.charge(client, 1)
+
+    def test_from_env(self, monkeypatch):
+        monkeypatch.setenv("API_KEYS", "k1:pro, k2")
+        monkeypatch.setenv("QUOTA_TIERS", json.dumps({"pro": {"requests_per_minute": 5, "cost_per_minute": 50}}))
+        manager = QuotaManager.from_env()
+        assert manager.identify(_request({"X-API-Key": "k1"})).tier.cost_per_minute == 50
+        assert manager.identify(_request({"X-API-Key": "k2"})).tier.name == "free"
+
+
+class TestVLMServiceCharging:
+    """Every provider attempt should be charged before it is made."""
+
+    @pytest.mark.asyncio
+    async def test_retries_are_charged_and_stop_when_budget_runs_out(
+        self, manager: QuotaManager, jpeg_bytes: bytes
+    ):
+        service = VLMService.__new__(VLMService)
+        service.model = "test-model"
+        service.RETRY_DELAY_SECONDS = 0
+        service._provider = AsyncMock()
+        service._provider.identify.side_effect = RuntimeError("flaky")
+        service.quota = manager.account(manager.identify(_request()))  # budget 10, cost 4/call
+
+        with pytest.raises(QuotaExceededError):
+            await service.identify_coins(jpeg_bytes)
+
+        assert service._provider.identify.call_count == 2
+        assert service.quota.charged == 8
+
+
+class TestIdentifyEndpointQuota:
+    """HTTP mapping of quota errors."""
+
+    @pytest.mark.asyncio
+    async def test_quota_exceeded_returns_429(self, jpeg_bytes: bytes):
+        service = AsyncMock(spec=VLMService)
+        client = QuotaManager().identify(_request())
+        service.identify_coins = AsyncMock(side_effect=QuotaExceededError(client, 17))
+        app.dependency_overrides[get_vlm_service] = lambda: service
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                resp = await http.post(
+                    "/api/v1/coins/identify",
+                    files={"image": ("coin.jpg", jpeg_bytes, "image/jpeg")},
+                )
+        finally:
+            app.dependency_overrides.clear()
+
+        assert resp.status_code == 429
+        assert resp.headers["Retry-After"] == "17"
+
+    @pytest.mark.asyncio
+    async def test_invalid_api_key_returns_401(self, jpeg_bytes: bytes):
+        service = AsyncMock(spec=VLMService)
+        app.dependency_overrides[get_vlm_service] = lambda: service
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                resp = await http.post(
+                    "/api/v1/coins/identify",
+                    files={"image": ("coin.jpg", jpeg_bytes, "image/jpeg")},
+                    headers={"X-API-Key": "definitely-not-configured"},
+                )
+        finally:
+            app.dependency_overrides.clear()
+
+        assert resp.status_code == 401
+        service.identify_coins.assert_not_called()
@@ -0,0 +1,80 @@
+"""Tests for app.database.rate_limit_storage.SQLiteStorage."""
+
+import multiprocessing
+
+import pytest
+from limits import RateLimitItemPerMinute
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+
+from app.database.rate_limit_storage import SQLiteStorage
+
+
+def _hammer(uri: str, hits: int, results) -> None:
+    """Worker process: try *hits* requests against a shared 10/minute limit."""
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(uri))
+    item = RateLimitItemPerMinute(10)
+    results.put(sum(limiter.hit(item, "client") for _ in range(hits)))
+
+
+@pytest.fixture
+def uri(tmp_path) -> str:
+    return f"sqlite:///{tmp_path}/ratelimit.db"
+
+
+class TestSQLiteStorage:
+    """Tests for the shared SQLite rate-limit backend."""
+
+    def test_scheme_registered(self, uri: str):
+        assert isinstance(storage_from_string(uri), SQLiteStorage)
+
+    def test_path_from_uri(self):
+        assert SQLiteStorage.path_from_uri("sqlite:///data/rl.db") == "data/rl.db"
+        assert SQLiteStorage.path_from_uri("sqlite:////app/data/rl.db") == "/app/data/rl.db"
+
+    def test_incr_and_get(self, uri: str):
+        storage = SQLiteStorage(uri)
+        assert storage.incr("k", 60) == 1
+        assert storage.incr("k", 60, amount=4) == 5
+        assert storage.get("k") == 5
+        storage.clear("k")
+        assert storage.get("k") == 0
+
+    def test_expired_counter_restarts(self, uri: str):
+        storage = SQLiteStorage(uri)
+        storage.incr("k", -1)
+        assert storage.get("k") == 0
+        assert storage.incr("k", 60) == 1
+
+    def test_sliding_window_enforces_limit(self, uri: str):
+        limiter = SlidingWindowCounterRateLimiter(SQLiteStorage(uri))
+        item = RateLimitItemPerMinute(3)
+        assert [limiter.hit(item, "a") for _ in range(5)] == [True, True, True, False, False]
+        assert limiter.hit(item, "b")
+
+    def test_limit_shared_across_processes(self, uri: str):
+        """Several worker processes together must not exceed the limit."""
+        SQLiteStorage(uri)  # create schema up front
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        ctx = multiprocessing.get_context(method)
+        results = ctx.Queue()
+        workers = [ctx.Process(target=_hammer, args=(uri, 8, results)) for _ in range(3)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join(timeout=60)
+        allowed = sum(results.get(timeout=5) for _ in workers)
+        assert allowed == 10
+
+    def test_held_lock_fails_open(self, uri: str):
+        """A write lock held by another worker lets hits through instead of blocking."""
+        storage = SQLiteStorage(uri)
+        blocker = SQLiteStorage(uri)._transaction()
+        try:
+            limiter = SlidingWindowCounterRateLimiter(storage)
+            item = RateLimitItemPerMinute(1)
+            assert [limiter.hit(item, "a") for _ in range(3)] == [True, True, True]
+            assert storage.incr("k", 60) == 1
+        finally:
+            blocker.execute("ROLLBACK")
+        assert storage.get("k") == 0
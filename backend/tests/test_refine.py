@@ -0,0 +1,96 @@
+"""Tests for app.services.refine and the refine pass in VLMService."""
+
+import io
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from PIL import Image
+
+from app.services.prompt_builder import PromptBuilder
+from app.services.refine import RefineConfig, crop_coins
+from app.services.vlm_service import VLMService
+
+
+def _entry(name: str, confidence: float, bbox=None) -> dict:
+    return {
+        "name": name, "country": "United States", "denomination": "1 cent",
+        "currency": "USD", "confidence": confidence, "bbox": bbox,
+    }
+
+
+class TestCropCoins:
+    """Tests for cutting refine crops."""
+
+    def test_crops_are_padded_and_clamped(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (2000, 1000), (90, 90, 90)).save(buf, format="JPEG")
+        config = RefineConfig(padding=0.25)
+        inner, edge = crop_coins(buf.getvalue(), [(0.4, 0.4, 0.6, 0.6), (0.0, 0.0, 0.1, 0.2)], config)
+        assert Image.open(io.BytesIO(inner)).size == (600, 300)
+        assert Image.open(io.BytesIO(edge)).size == (250, 250)
+
+    def test_large_crops_are_downscaled(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (4000, 3000), (90, 90, 90)).save(buf, format="JPEG")
+        [crop] = crop_coins(buf.getvalue(), [(0.0, 0.0, 1.0, 1.0)], RefineConfig(max_size=800))
+        assert max(Image.open(io.BytesIO(crop)).size) == 800
+
+
+class TestVLMServiceRefine:
+    """Tests for re-identifying low-confidence coins from crops."""
+
+    @pytest.fixture
+    def service(self):
+        service = VLMService.__new__(VLMService)
+        service.model = "test-model"
+        service._provider = AsyncMock()
+        service.RETRY_DELAY_SECONDS = 0
+        return service
+
+    @pytest.mark.asyncio
+    async def test_only_uncertain_coins_are_refined(self, service, large_jpeg_bytes):
+        first = [
+            _entry("Penny", 0.95, [0.1, 0.2, 0.3, 0.6]),
+            _entry("Unknown", 0.3, [0.6, 0.2, 0.8, 0.6]),
+        ]
+        responses = iter([json.dumps(first), json.dumps([_entry("Buffalo Nickel", 0.9, [0.1, 0.1, 0.9, 0.9])])])
+        service._provider.identify.side_effect = lambda payload, prompt, timeout=None: next(responses)
+
+        coins, _ = await service.identify_coins(large_jpeg_bytes)
+
+        assert service._provider.identify.await_count == 2
+        crop, prompt = service._provider.identify.call_args.args
+        assert prompt == PromptBuilder.build(single_coin=True)
+        assert Image.open(io.BytesIO(crop.data)).size == (520, 520)  # 400x400 bbox, 15% padding
+        assert [c.name for c in coins] == ["Penny", "Buffalo Nickel"]
+        assert coins[1].confidence == 0.9
+        assert coins[1].bbox == [0.6, 0.2, 0.8, 0.6]
+
+    @pytest.mark.asyncio
+    async def test_less_confident_refinement_is_ignored(self, service, large_jpeg_bytes):
+        responses = iter([
+            json.dumps([_entry("Penny", 0.4, [0.1, 0.2, 0.3, 0.6])]),
+            json.dumps([_entry("Dime", 0.2)]),
+        ])
+        service._provider.identify.side_effect = lambda payload, prompt, timeout=None: next(responses)
+        coins, _ = await service.identify_coins(large_jpeg_bytes)
+        assert coins[0].name == "Penny" and coins[0].confidence == 0.4
+
+    @pytest.mark.asyncio
+    async def test_failed_refinement_keeps_original(self, service, large_jpeg_bytes):
+        async def identify(payload, prompt, timeout=None):
+            if prompt == PromptBuilder.build(single_coin=True):
+                raise RuntimeError("boom")
+            return json.dumps([_entry("Penny", 0.4, [0.1, 0.2, 0.3, 0.6])])
+
+        service._provider.identify.side_effect = identify
+        coins, _ = await service.identify_coins(large_jpeg_bytes)
+        assert coins[0].name == "Penny"
+
+    @pytest.mark.asyncio
+    async def test_disabled_below_zero_confidence(self, service, large_jpeg_bytes):
+        service._provider.identify.return_value = json.dumps([_entry("Penny", 0.1, [0.1, 0.2, 0.3, 0.6])])
+        with patch("app.services.vlm_service.REFINE", RefineConfig(below_confidence=0)):
+            await service.identify_coins(large_jpeg_bytes)
+        assert service._provider.identify.await_count == 1
@@ -0,0 +1,104 @@
+"""Tests for app.services.request_timing and the Server-Timing header."""
+
+import json
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from app.main import app
+from app.routers.coins import get_vlm_service
+from app.services import metrics, request_timing
+from app.services.request_timing import RequestTimings
+from app.services.vlm_service import VLMService
+
+
+@pytest.fixture
+def service() -> VLMService:
+    """A VLMService with a mock provider and no retry delay."""
+    service = VLMService.__new__(VLMService)
+    service.model = "timing-test-model"
+    service._provider = AsyncMock()
+    service.RETRY_DELAY_SECONDS = 0
+    return service
+
+
+class TestRequestTimings:
+    """Tests for the request-scoped timing context."""
+
+    def test_nothing_collected_when_unbound(self):
+        assert request_timing.current() is None
+        with metrics.stage("read"):
+            pass
+        assert request_timing.current() is None
+
+    def test_stages_are_grouped(self):
+        with request_timing.collect() as timings:
+            timings.add("resize", 0.010)
+            timings.add("encode", 0.005)
+            timings.add("parse_json", 0.001)
+        groups = timings.group_ms()
+        assert groups["preprocess"] == pytest.approx(15.0)
+        assert groups["parse"] == pytest.approx(1.0)
+        assert groups["total"] >= 0
+        assert request_timing.current() is None
+
+    def test_server_timing_header_format(self):
+        timings = RequestTimings()
+        timings.add("provider", 0.25)
+        timings.finish()
+        header = timings.server_timing()
+        assert header.startswith("read;dur=0.0, preprocess;dur=0.0, provider;dur=250.0")
+        assert "total;dur=" in header
+
+    @pytest.mark.asyncio
+    async def test_attempts_and_winning_variant(
+        self, service: VLMService, sample_coin_data: list[dict], jpeg_bytes: bytes
+    ):
+        service._provider.identify.side_effect = [
+            RuntimeError("transient"),
+            json.dumps(sample_coin_data),
+        ]
+        with request_timing.collect() as timings:
+            await service.identify_coins(jpeg_bytes)
+
+        assert [a["ok"] for a in timings.attempts] == [False, True]
+        assert timings.variant == "original"
+        assert "provider" in timings.stages
+        assert "parse_coins" in timings.stages
+
+
+class TestIdentifyTimingHeaders:
+    """Tests for timing output on POST /api/v1/coins/identify."""
+
+    @pytest.fixture
+    def override(self):
+        service = AsyncMock(spec=VLMService)
+        service.identify_coins = AsyncMock(return_value=([], "test-model"))
+        app.dependency_overrides[get_vlm_service] = lambda: service
+        yield
+        app.dependency_overrides.clear()
+
+    async def _identify(self, jpeg_bytes: bytes) -> httpx.Response:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/api/v1/coins/identify",
+                files={"image": ("coin.jpg", jpeg_bytes, "image/jpeg")},
+            )
+
+    @pytest.mark.asyncio
+    async def test_server_timing_header(self, override, jpeg_bytes: bytes):
+        resp = await self._identify(jpeg_bytes)
+        assert resp.status_code == 200
+        entries = [e.split(";")[0] for e in resp.headers["server-timing"].split(", ")]
+        assert entries == ["read", "preprocess", "provider", "parse", "total"]
+        assert resp.json()["timings"] is None
+
+    @pytest.mark.asyncio
+    async def test_debug_timing_block(self, override, jpeg_bytes: bytes):
+        with patch("app.routers.coins.DEBUG_TIMINGS", True):
+            resp = await self._identify(jpeg_bytes)
+        timings = resp.json()["timings"]
+        assert set(timings) >= {"read_ms", "total_ms", "stages_ms", "attempts", "variant"}
+        assert "read" in timings["stages_ms"]
@@ -192,3 +192,52 @@ class TestParseCoins:
         ]
         coins = ResponseParser.parse_coins(data)
         assert coins[0].name == "Unknown"
+
+
+def _entry(bbox, confidence=0.8, name="Coin") -> dict:
+    return {
+        "name": name, "country": "US", "denomination": "1c",
+        "currency": "USD", "confidence": confidence, "bbox": bbox,
+    }
+
+
+class TestPostprocessBoxes:
+    """Tests for bbox clipping and duplicate-coin suppression."""
+
+    def test_bbox_clipped_and_ordered(self):
+        coins = ResponseParser.parse_coins([_entry([0.5, 1.2, -0.1, 0.3])])
+        assert coins[0].bbox == [0.0, 0.3, 0.5, 1.0]
+
+    def test_degenerate_bbox_dropped_but_coin_kept(self):
+        coins = ResponseParser.parse_coins([
+            _entry([1.2, 0.1, 1.5, 0.4]),
+            _entry([0.2, 0.2, 0.2, 0.6]),
+            _entry([0.1, float("nan"), 0.2, 0.3]),
+        ])
+        assert len(coins) == 3
+        assert all(coin.bbox is None for coin in coins)
+
+    def test_duplicate_coin_keeps_higher_confidence(self):
+        coins = ResponseParser.parse_coins([
+            _entry([0.1, 0.1, 0.3, 0.3], confidence=0.6, name="First"),
+            _entry([0.6, 0.6, 0.8, 0.8], confidence=0.7, name="Other"),
+            _entry([0.11, 0.1, 0.31, 0.3], confidence=0.9, name="Second"),
+            _entry(None, confidence=0.5, name="Unboxed"),
+        ])
+        assert [coin.name for coin in coins] == ["Other", "Second", "Unboxed"]
+
+    def test_adjacent_coins_are_not_merged(self, sample_coin_data: list[dict]):
+        assert len(ResponseParser.parse_coins(sample_coin_data)) == 2
+
+    def test_hundreds_of_boxes(self):
+        grid = [
+            _entry([i / 20, j / 10, (i + 0.8) / 20, (j + 0.8) / 10], confidence=0.5)
+            for i in range(20) for j in range(10)
+        ]
+        # Every coin reported twice, the second time slightly shifted and more confident
+        shifted = [
+            _entry([b + 0.002 for b in e["bbox"]], confidence=0.9, name="Dup") for e in grid
+        ]
+        coins = ResponseParser.parse_coins(grid + shifted)
+        assert len(coins) == 200
+        assert all(coin.name == "Dup" for coin in coins)
@@ -0,0 +1,197 @@
+"""Tests for app.database.scan_history.ScanHistoryStore and the history API."""
+
+import io
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+import pytest_asyncio
+from PIL import Image
+
+from app.database.scan_history import ScanHistoryStore
+from app.main import app
+from app.models.coin import Coin
+from app.models.history import ScanRecord
+from app.routers.coins import get_vlm_service
+from app.routers.history import get_scan_history
+from app.services.profiling import ADMIN_TOKEN_HEADER
+from app.services.vlm_service import VLMService
+
+
+def _record(client_id: str = "client-a", created_at: float = 1000.0) -> ScanRecord:
+    return ScanRecord(
+        client_id=client_id,
+        created_at=created_at,
+        image_digest="ab" * 32,
+        model="test-model",
+        coins=[{"name": "Lincoln Penny", "confidence": 0.95}],
+        timings={"total_ms": 12.5},
+    )
+
+
+TOKEN = "history-admin-token"
+
+
+@pytest.fixture
+def admin():
+    """Enable the admin API; returns the headers that pass its check."""
+    app.state.admin_token = TOKEN
+    yield {ADMIN_TOKEN_HEADER: TOKEN}
+    app.state.admin_token = None
+
+
+@pytest_asyncio.fixture
+async def store(tmp_path):
+    """A started store writing to a temporary database."""
+    s = ScanHistoryStore(db_path=str(tmp_path / "history.db"), max_buffer=10)
+    s.FLUSH_INTERVAL_SECONDS = 0.01
+    await s.start()
+    yield s
+    await s.stop()
+
+
+class TestScanHistoryStore:
+    """Tests for buffering, flushing and querying."""
+
+    @pytest.mark.asyncio
+    async def test_flush_persists_records(self, store: ScanHistoryStore):
+        """Records enqueued and flushed should be readable back."""
+        assert store.record(_record())
+        await store.stop()
+        records, cursor = await store.recent()
+        assert len(records) == 1
+        assert records[0].coins[0]["name"] == "Lincoln Penny"
+        assert records[0].timings == {"total_ms": 12.5}
+        assert cursor is None
+
+    @pytest.mark.asyncio
+    async def test_bounded_buffer_drops_when_full(self, tmp_path):
+        """record() must never block; overflow is dropped and counted."""
+        s = ScanHistoryStore(db_path=str(tmp_path / "h.db"), max_buffer=2)
+        assert s.record(_record())
+        assert s.record(_record())
+        assert not s.record(_record())
+        assert s.dropped == 1
+
+    @pytest.mark.asyncio
+    async def test_stop_flushes_buffered_records(self, tmp_path):
+        """Records still buffered at shutdown should be written by stop()."""
+        s = ScanHistoryStore(db_path=str(tmp_path / "h.db"))
+        await s.start()
+        for i in range(5):
+            s.record(_record(created_at=1000.0 + i))
+        await s.stop()
+        records, _ = await s.recent()
+        assert len(records) == 5
+
+    @pytest.mark.asyncio
+    async def test_pagination_newest_first(self, store: ScanHistoryStore):
+        """Pages should be newest-first and chain via next_cursor."""
+        for i in range(5):
+            store.record(_record(created_at=1000.0 + i))
+        await store.stop()
+
+        page1, cursor = await store.recent(limit=2)
+        assert [r.created_at for r in page1] == [1004.0, 1003.0]
+        page2, cursor = await store.recent(limit=2, cursor=cursor)
+        assert [r.created_at for r in page2] == [1002.0, 1001.0]
+        page3, cursor = await store.recent(limit=2, cursor=cursor)
+        assert [r.created_at for r in page3] == [1000.0]
+        assert cursor is None
+
+    @pytest.mark.asyncio
+    async def test_client_filter(self, store: ScanHistoryStore):
+        """client_id should restrict results to a single client."""
+        store.record(_record(client_id="a", created_at=1.0))
+        store.record(_record(client_id="b", created_at=2.0))
+        await store.stop()
+
+        records, _ = await store.recent(client_id="a")
+        assert [r.client_id for r in records] == ["a"]
+
+    @pytest.mark.asyncio
+    async def test_malformed_cursor_raises(self, store: ScanHistoryStore):
+        with pytest.raises(ValueError):
+            await store.recent(cursor="not-a-cursor")
+
+
+class TestHistoryEndpoint:
+    """Tests for GET /api/v1/history."""
+
+    @pytest.mark.asyncio
+    async def test_returns_page(self, store: ScanHistoryStore, admin):
+        store.record(_record())
+        await store.stop()
+        app.dependency_overrides[get_scan_history] = lambda: store
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                resp = await client.get("/api/v1/history?limit=10", headers=admin)
+        finally:
+            app.dependency_overrides.clear()
+
+        assert resp.status_code == 200
+        data = resp.json()
+        assert len(data["items"]) == 1
+        assert data["next_cursor"] is None
+
+    @pytest.mark.asyncio
+    async def test_disabled_returns_503(self, admin):
+        app.dependency_overrides[get_scan_history] = lambda: None
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                resp = await client.get("/api/v1/history", headers=admin)
+        finally:
+            app.dependency_overrides.clear()
+
+        assert resp.status_code == 503
+
+    @pytest.mark.asyncio
+    async def test_requires_admin_token(self, store: ScanHistoryStore, admin):
+        """Other clients' scans are never listed without the admin token."""
+        app.dependency_overrides[get_scan_history] = lambda: store
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                missing = await client.get("/api/v1/history")
+                wrong = await client.get("/api/v1/history", headers={ADMIN_TOKEN_HEADER: "guess"})
+                app.state.admin_token = None  # ADMIN_TOKEN unset
+                disabled = await client.get("/api/v1/history", headers=admin)
+        finally:
+            app.dependency_overrides.clear()
+
+        assert missing.status_code == 403
+        assert wrong.status_code == 403
+        assert disabled.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_identify_enqueues_record(self, store: ScanHistoryStore):
+        """A successful /identify call should be recorded for its client."""
+        service = AsyncMock(spec=VLMService)
+        service.model = "test-model"
+        coin = Coin(name="Penny", country="US", denomination="1c", currency="USD", confidence=0.9)
+        service.identify_coins = AsyncMock(return_value=([coin], "test-model"))
+        app.dependency_overrides[get_vlm_service] = lambda: service
+        app.dependency_overrides[get_scan_history] = lambda: store
+
+        buf = io.BytesIO()
+        Image.new("RGB", (10, 10)).save(buf, format="JPEG")
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                resp = await client.post(
+                    "/api/v1/coins/identify",
+                    files={"image": ("coin.jpg", buf.getvalue(), "image/jpeg")},
+                    headers={"X-Client-Id": "phone-1"},
+                )
+        finally:
+            app.dependency_overrides.clear()
+        await store.stop()
+
+        assert resp.status_code == 200
+        records, _ = await store.recent(client_id="phone-1")
+        assert len(records) == 1
+        assert records[0].model == "test-model"
+        assert len(records[0].image_digest) == 64
+        assert "total_ms" in records[0].timings
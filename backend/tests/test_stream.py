@@ -0,0 +1,210 @@
+"""Tests for app.services.frame_gate and the /stream WebSocket."""
+
+import asyncio
+import io
+import json
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.main import app
+from app.models.coin import Coin
+from app.routers import coins as coins_router
+from app.routers.coins import get_vlm_service
+from app.services.admission import AdmissionRejected
+from app.services.deadline import DeadlineExceededError
+from app.services.frame_gate import BLURRY, MOVING, READY, UNCHANGED, FrameGate
+from app.services.image_processor import ImageTooLargeError
+from app.services.quota import DEFAULT_TIERS, ClientIdentity, QuotaExceededError
+from app.services.vlm_service import VLMService
+
+
+def _frame(seed: int, size: int = 160) -> bytes:
+    """A sharp, textured JPEG frame; different seeds give different scenes."""
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, (size // 8, size // 8), dtype=np.uint8)
+    pixels = np.kron(blocks, np.ones((8, 8), dtype=np.uint8))
+    buf = io.BytesIO()
+    Image.fromarray(pixels).convert("RGB").save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _flat_frame() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (160, 160), (120, 120, 120)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+class TestFrameGate:
+    """Tests for blur, stability and change decisions."""
+
+    def test_blurry_frame_is_dropped(self):
+        gate = FrameGate()
+        assert gate.analyse(_flat_frame()).state == BLURRY
+
+    def test_ready_once_settled(self):
+        gate = FrameGate(settle_frames=2)
+        states = [gate.analyse(_frame(1)).state for _ in range(3)]
+        assert states == [MOVING, MOVING, READY]
+
+    def test_motion_resets_stability(self):
+        gate = FrameGate(settle_frames=1)
+        gate.analyse(_frame(1))
+        assert gate.analyse(_frame(1)).state == READY
+        assert gate.analyse(_frame(2)).state == MOVING
+
+    def test_unchanged_after_identification(self):
+        gate = FrameGate(settle_frames=1)
+        gate.analyse(_frame(1))
+        assert gate.analyse(_frame(1)).state == READY
+        gate.mark_identified()
+        assert gate.analyse(_frame(1)).state == UNCHANGED
+        gate.forget()
+        assert gate.analyse(_frame(1)).state == READY
+
+    def test_exposure_shift_is_not_motion(self):
+        gate = FrameGate()
+        pixels = np.asarray(Image.open(io.BytesIO(_frame(1))), dtype=np.int16)
+        brighter = io.BytesIO()
+        Image.fromarray(np.clip(pixels + 20, 0, 255).astype(np.uint8)).save(brighter, format="JPEG")
+        gate.analyse(_frame(1))
+        assert gate.analyse(brighter.getvalue()).motion < gate.motion_threshold
+
+
+@pytest.fixture
+def stream_service(sample_coin_data: list[dict]):
+    service = VLMService.__new__(VLMService)
+    service.model = "test-model"
+    service.identify_coins = AsyncMock(
+        return_value=([Coin(**sample_coin_data[0])], "test-model")
+    )
+    app.dependency_overrides[get_vlm_service] = lambda: service
+    yield service
+    app.dependency_overrides.clear()
+
+
+class WebSocketSession:
+    """Minimal in-process WebSocket client speaking ASGI to the app."""
+
+    def __init__(self, path: str = "/api/v1/coins/stream", headers: dict[str, str] | None = None) -> None:
+        self.scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+            "client": ("testclient", 50000),
+            "server": ("test", 80),
+            "subprotocols": [],
+        }
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self._from_app: asyncio.Queue = asyncio.Queue()
+        self.close_code: int | None = None
+
+    async def __aenter__(self) -> "WebSocketSession":
+        self._task = asyncio.create_task(app(self.scope, self._to_app.get, self._from_app.put))
+        await self._to_app.put({"type": "websocket.connect"})
+        message = await asyncio.wait_for(self._from_app.get(), 5)
+        if message["type"] == "websocket.close":
+            self.close_code = message["code"]
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self._task, 5)
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self._to_app.put({"type": "websocket.receive", "bytes": data})
+
+    async def send_text(self, text: str) -> None:
+        await self._to_app.put({"type": "websocket.receive", "text": text})
+
+    async def receive_json(self) -> dict | None:
+        """Next JSON message, or None once the server closed the socket."""
+        message = await asyncio.wait_for(self._from_app.get(), 5)
+        if message["type"] == "websocket.close":
+            self.close_code = message["code"]
+            return None
+        return json.loads(message["text"])
+
+    async def receive_until(self, message_type: str) -> list[dict]:
+        messages = [await self.receive_json()]
+        while messages[-1]["type"] != message_type:
+            messages.append(await self.receive_json())
+        return messages
+
+
+class TestStreamEndpoint:
+    """Tests for /api/v1/coins/stream."""
+
+    @pytest.mark.asyncio
+    async def test_identifies_settled_changed_scenes_only(self, stream_service):
+        async with WebSocketSession() as ws:
+            for _ in range(5):
+                await ws.send_bytes(_frame(1))
+            first = await ws.receive_until("result")
+            for _ in range(3):
+                await ws.send_bytes(_frame(1))
+            for _ in range(5):
+                await ws.send_bytes(_frame(2))
+            second = await ws.receive_until("result")
+
+        assert first[0] == {"type": "status", "frame": 1, "state": MOVING}
+        assert {"type": "status", "frame": 4, "state": READY} in first
+        assert first[-1]["frame"] == 4
+        assert first[-1]["coins"][0]["name"] == "Lincoln Penny"
+        assert any(m.get("state") == UNCHANGED for m in second)
+        assert second[-1]["frame"] > 8
+        assert stream_service.identify_coins.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_invalid_frame_reports_error(self, stream_service):
+        async with WebSocketSession() as ws:
+            await ws.send_bytes(b"not an image")
+            await ws.send_text("hello")
+            errors = [await ws.receive_json(), await ws.receive_json()]
+        assert errors[0] == {"type": "error", "frame": 1, "detail": "Invalid frame."}
+        assert errors[1]["frame"] == 2
+        stream_service.identify_coins.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_oversized_frame_closes_socket(self, stream_service, monkeypatch):
+        monkeypatch.setattr("app.routers.coins.STREAM_MAX_FRAME_BYTES", 1024)
+        async with WebSocketSession() as ws:
+            await ws.send_bytes(b"\xff" * 2048)
+            assert await ws.receive_json() is None
+        assert ws.close_code == 1009
+
+    @pytest.mark.asyncio
+    async def test_rejects_invalid_api_key(self, stream_service):
+        async with WebSocketSession(headers={"X-API-Key": "bogus"}) as ws:
+            pass
+        assert ws.close_code == 1008
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("error", [
+        AdmissionRejected("interactive", "queue_full", 1),
+        QuotaExceededError(ClientIdentity("testclient", DEFAULT_TIERS["anonymous"]), 5),
+        ImageTooLargeError("too big"),
+        DeadlineExceededError("no time"),
+        RuntimeError("upstream 500"),
+    ])
+    async def test_failed_frame_is_retried(self, stream_service, error):
+        """A failed identification forgets the scene, so it is tried again."""
+        gate = FrameGate(settle_frames=1)
+        gate.analyse(_frame(1))
+        gate.analyse(_frame(1))
+        gate.mark_identified()
+        stream_service.identify_coins.side_effect = error
+        websocket = AsyncMock()
+        websocket.app = app
+
+        await coins_router._identify_frame(websocket, stream_service, gate, 2, _frame(1), "interactive")
+
+        assert websocket.send_json.await_args.args[0]["type"] in ("busy", "error")
+        assert gate.analyse(_frame(1)).state == READY
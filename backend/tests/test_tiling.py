@@ -0,0 +1,150 @@
+"""Tests for app.services.tiling, app.services.bbox and tiled identification."""
+
+import asyncio
+import io
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from PIL import Image
+
+from app.models.coin import Coin
+import numpy as np
+
+from app.services.bbox import nms, pairwise_overlaps, sanitize, to_full_frame
+from app.services.tiling import TilingConfig, cut_tiles, plan_tiles
+from app.services.vlm_service import VLMService
+
+
+def _coin(bbox, confidence=0.9, name="Lincoln Penny") -> Coin:
+    return Coin(
+        name=name, country="United States", denomination="1 cent",
+        currency="USD", confidence=confidence, bbox=bbox,
+    )
+
+
+class TestPlanTiles:
+    """Tests for tile geometry."""
+
+    def test_small_image_is_one_tile(self):
+        assert plan_tiles(800, 600, 1536, 0.15) == [(0, 0, 800, 600)]
+
+    def test_tiles_cover_image_with_overlap(self):
+        tiles = plan_tiles(4000, 3000, 1536, 0.15)
+        assert len(tiles) == 3 * 3
+        assert tiles[0][:2] == (0, 0) and tiles[-1][2:] == (4000, 3000)
+        xs = sorted({t[0] for t in tiles})
+        assert all(b - a <= 1536 - int(1536 * 0.15) for a, b in zip(xs, xs[1:]))
+
+    def test_cut_tiles_returns_normalised_boxes(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (3000, 1000), (90, 90, 90)).save(buf, format="JPEG")
+        tiles = cut_tiles(buf.getvalue(), TilingConfig(tile_size=1200, overlap=0.1))
+        assert len(tiles) == 3
+        assert tiles[0][1] == (0.0, 0.0, 0.4, 1.0)
+        assert Image.open(io.BytesIO(tiles[1][0])).size == (1200, 1000)
+
+
+class TestBoxes:
+    """Tests for bbox mapping and non-maximum suppression."""
+
+    def test_to_full_frame(self):
+        assert to_full_frame([0.0, 0.5, 0.5, 1.0], (0.5, 0.0, 1.0, 0.5)) == [0.5, 0.25, 0.75, 0.5]
+
+    def test_nms_keeps_most_confident_duplicate(self):
+        boxes = [[0.1, 0.1, 0.3, 0.3], [0.11, 0.1, 0.31, 0.3], [0.6, 0.6, 0.8, 0.8]]
+        assert nms(boxes, [0.7, 0.9, 0.8]) == [1, 2]
+
+    def test_ios_merges_partial_box_inside_full_one(self):
+        boxes = [[0.1, 0.1, 0.3, 0.3], [0.1, 0.1, 0.18, 0.3]]
+        assert nms(boxes, [0.9, 0.95], metric="iou") == [1, 0]
+        assert nms(boxes, [0.9, 0.95], metric="ios") == [1]
+
+    def test_pairwise_overlaps_matrix(self):
+        boxes = np.array([[0.0, 0.0, 0.2, 0.2], [0.1, 0.0, 0.3, 0.2], [0.5, 0.5, 0.6, 0.6]])
+        matrix = pairwise_overlaps(boxes)
+        assert matrix.shape == (3, 3)
+        assert np.diag(matrix) == pytest.approx(1.0)
+        assert matrix[0, 1] == pytest.approx(1 / 3) and matrix[1, 0] == matrix[0, 1]
+        assert matrix[0, 2] == 0.0
+
+    def test_sanitize_flags_boxes_outside_image(self):
+        clipped, valid = sanitize([[0.4, 0.4, -0.2, 0.9], [1.1, 0.0, 1.3, 0.5]])
+        assert clipped[0].tolist() == [0.0, 0.4, 0.4, 0.9]
+        assert valid.tolist() == [True, False]
+
+
+class TestTiledIdentification:
+    """Tests for VLMService tiled mode."""
+
+    @pytest.fixture
+    def service(self):
+        service = VLMService.__new__(VLMService)
+        service.model = "test-model"
+        service._provider = AsyncMock()
+        service.RETRY_DELAY_SECONDS = 0
+        return service
+
+    @pytest.fixture
+    def tray_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        Image.new("RGB", (3000, 1000), (90, 90, 90)).save(buf, format="JPEG")
+        return buf.getvalue()
+
+    @pytest.mark.asyncio
+    async def test_tiles_identified_concurrently_and_merged(self, service, tray_bytes):
+        in_flight = peak = 0
+
+        async def identify(payload, prompt, timeout=None):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            # Every tile reports one coin filling its right edge region
+            return json.dumps([{
+                "name": "Lincoln Penny", "country": "United States",
+                "denomination": "1 cent", "currency": "USD",
+                "confidence": 0.9, "bbox": [0.9, 0.4, 1.0, 0.6],
+            }])
+
+        service._provider.identify.side_effect = identify
+        config = TilingConfig(tile_size=1200, overlap=0.1, concurrency=2)
+        with patch("app.services.vlm_service.TILING", config):
+            coins, model = await service.identify_coins(tray_bytes, tiled=True)
+
+        assert service._provider.identify.await_count == 3
+        assert peak == 2
+        assert model == "test-model"
+        assert len(coins) == 3
+        assert coins[0].bbox[0] == pytest.approx(0.36)  # 0.9 of the first 0-0.4 tile
+
+    @pytest.mark.asyncio
+    async def test_failed_tile_does_not_sink_the_lot(self, service, tray_bytes):
+        responses = iter([RuntimeError("boom")] * 3 + ["[]"] * 10)
+
+        async def identify(payload, prompt, timeout=None):
+            result = next(responses)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        service._provider.identify.side_effect = identify
+        config = TilingConfig(tile_size=1200, overlap=0.1, concurrency=1)
+        with patch("app.services.vlm_service.TILING", config):
+            coins, _ = await service.identify_coins(tray_bytes, tiled=True)
+        assert coins == []
+
+    def test_merge_tiles_dedupes_overlap(self):
+        full = _coin([0.38, 0.4, 0.42, 0.5], confidence=0.9)
+        cut = _coin([0.38, 0.4, 0.40, 0.5], confidence=0.95)
+        other = _coin([0.7, 0.4, 0.74, 0.5])
+        unboxed = _coin(None)
+        merged = VLMService.merge_tiles([full, cut, other, unboxed])
+        assert merged == [cut, other, unboxed]
+
+    @pytest.mark.asyncio
+    async def test_small_images_are_not_tiled_by_default(self, service, jpeg_bytes):
+        service._provider.identify.return_value = "[]"
+        await service.identify_coins(jpeg_bytes)
+        assert service._provider.identify.call_args_list[0].args[0].data == jpeg_bytes
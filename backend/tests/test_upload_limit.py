@@ -0,0 +1,129 @@
+"""Tests for app.middleware.upload_limit and streamed upload validation."""
+
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from starlette.formparsers import MultiPartParser
+
+from app.main import app
+from app.middleware.upload_limit import UploadLimitMiddleware
+from app.routers.coins import get_vlm_service
+from app.services.vlm_service import VLMService
+
+
+def _small_app(limit: int) -> FastAPI:
+    """A minimal upload endpoint behind the middleware, with a tiny limit."""
+    small = FastAPI()
+
+    @small.post("/upload")
+    async def upload(image: UploadFile = File(...)):
+        spooled = image.file._rolled
+        data = await image.read()
+        return {"size": len(data), "spooled": spooled}
+
+    small.add_middleware(UploadLimitMiddleware, max_body_bytes=limit)
+    return small
+
+
+class TestUploadLimitMiddleware:
+    """Tests for 413 responses on oversized bodies."""
+
+    @pytest.mark.asyncio
+    async def test_declared_length_rejected_up_front(self):
+        transport = httpx.ASGITransport(app=_small_app(1024))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post("/upload", files={"image": ("a.jpg", b"x" * 4096)})
+        assert resp.status_code == 413
+        assert resp.json()["detail"].startswith("Image too large")
+
+    @pytest.mark.asyncio
+    async def test_streamed_body_rejected_as_it_arrives(self):
+        chunks_sent = 0
+
+        async def body():
+            nonlocal chunks_sent
+            yield b"--b\r\nContent-Disposition: form-data; name=\"image\"; filename=\"a.jpg\"\r\n\r\n"
+            for _ in range(100):
+                chunks_sent += 1
+                yield b"x" * 512
+
+        transport = httpx.ASGITransport(app=_small_app(2048))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post(
+                "/upload",
+                content=body(),
+                headers={"content-type": "multipart/form-data; boundary=b"},
+            )
+        assert resp.status_code == 413
+        assert chunks_sent < 100  # stopped reading early
+
+    @pytest.mark.asyncio
+    async def test_small_body_passes(self):
+        transport = httpx.ASGITransport(app=_small_app(4096))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post("/upload", files={"image": ("a.jpg", b"x" * 100)})
+        assert resp.json() == {"size": 100, "spooled": False}
+
+    @pytest.mark.asyncio
+    async def test_large_parts_spool_to_disk(self, monkeypatch):
+        # The spool threshold is process-wide, on the parser class
+        monkeypatch.setattr(MultiPartParser, "max_file_size", 1024)
+        transport = httpx.ASGITransport(app=_small_app(8192))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            small = await client.post("/upload", files={"image": ("a.jpg", b"x" * 512)})
+            large = await client.post("/upload", files={"image": ("a.jpg", b"x" * 4096)})
+        assert small.json()["spooled"] is False
+        assert large.json() == {"size": 4096, "spooled": True}
+
+
+class TestIdentifyUploadValidation:
+    """Tests for first-chunk and spooled-size checks on /identify."""
+
+    @pytest.fixture
+    def service(self):
+        service = AsyncMock(spec=VLMService)
+        service.identify_coins = AsyncMock(return_value=([], "test-model"))
+        app.dependency_overrides[get_vlm_service] = lambda: service
+        yield service
+        app.dependency_overrides.clear()
+
+    @pytest.mark.asyncio
+    async def test_spooled_size_over_limit_rejected(self, service, jpeg_bytes: bytes):
+        transport = httpx.ASGITransport(app=app)
+        with patch("app.routers.coins.MAX_UPLOAD_BYTES", len(jpeg_bytes) - 1):
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                resp = await client.post(
+                    "/api/v1/coins/identify",
+                    files={"image": ("coin.jpg", jpeg_bytes, "image/jpeg")},
+                )
+        assert resp.status_code == 400
+        assert "too large" in resp.json()["detail"]
+        service.identify_coins.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_non_image_rejected_from_first_chunk(self, service):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post(
+                "/api/v1/coins/identify",
+                files={"image": ("notes.bin", b"\x00" * 200_000, "application/octet-stream")},
+            )
+        assert resp.status_code == 400
+        assert "Invalid file type" in resp.json()["detail"]
+        service.identify_coins.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_valid_upload_read_in_full(self, service, large_jpeg_bytes: bytes):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post(
+                "/api/v1/coins/identify",
+                files={"image": ("coin.jpg", large_jpeg_bytes, "image/jpeg")},
+            )
+        assert resp.status_code == 200
+        service.identify_coins.assert_called_once()
+        pipeline = service.identify_coins.call_args.args[0]
+        assert pipeline.data == large_jpeg_bytes
+        assert service.identify_coins.call_args.kwargs == {"tiled": None}
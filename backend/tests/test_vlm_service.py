@@ -39,18 +39,37 @@ class TestVLMServiceInit:
     """Tests for VLMService initialisation."""
 
     @patch.dict("os.environ", {"VLM_MODEL": "openai/gpt-4o"}, clear=False)
-    @patch("app.services.vlm_service.LiteLLMProvider")
-    def test_default_model_from_env(self, mock_litellm_cls):
+    @patch("app.services.vlm_service.registry")
+    def test_default_model_from_env(self, mock_registry):
         """VLMService should read VLM_MODEL from the environment."""
         service = VLMService()
         assert service.model == "openai/gpt-4o"
 
-    @patch("app.services.vlm_service.LiteLLMProvider")
-    def test_explicit_model_override(self, mock_litellm_cls):
+    @patch("app.services.vlm_service.registry")
+    def test_explicit_model_override(self, mock_registry):
         """An explicit model argument should override the env var."""
         service = VLMService(model="anthropic/claude-3")
         assert service.model == "anthropic/claude-3"
 
+    @patch("app.services.vlm_service.registry")
+    def test_construction_does_not_load_provider(self, mock_registry):
+        """Provider SDKs are imported on first identification, not at construction."""
+        VLMService(model="openai/gpt-4o")
+        mock_registry.load.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch("app.services.vlm_service.registry")
+    async def test_provider_built_once_on_first_use(self, mock_registry):
+        """Non-Gemini models are routed to the LiteLLM provider, built lazily once."""
+        service = VLMService(model="openai/gpt-4o")
+        first = await service._get_provider()
+        second = await service._get_provider()
+        assert first is second
+        mock_registry.load.assert_called_once_with("litellm")
+        mock_registry.load.return_value.assert_called_once_with(
+            "openai/gpt-4o", http_pool=None, prompt_cache=mock_registry.prompt_cache
+        )
+
 
 class TestIdentifyCoins:
     """Tests for VLMService.identify_coins."""